@@ -8,7 +8,7 @@ from flask_cors import CORS
 
 # 导入业务模块
 from crypto_db import CryptoDatabase
-from simple_redis_manager import CryptoCacheManager
+from simple_redis_manager import get_cache_manager
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -20,7 +20,7 @@ CORS(backend_app)
 
 # 初始化组件
 db = CryptoDatabase()
-cache_manager = CryptoCacheManager()
+cache_manager = get_cache_manager()
 
 # 初始化模块
 if db.connect():
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+缓存值编解码器
+为Redis缓存提供 JSON / msgpack / 列式打包 三种编码，并在超过阈值时压缩
+
+存储格式: 0x00 + 编码标记(1字节) + 压缩标记(1字节) + 负载
+不带 0x00 前缀的值按旧版JSON文本处理，保证升级前写入的缓存仍可读取
+"""
+
+import json
+import os
+import sys
+import zlib
+import logging
+from array import array
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'\x00'
+
+# 编码标记
+CODEC_TEXT = b's'
+CODEC_JSON = b'j'
+CODEC_MSGPACK = b'm'
+CODEC_COLUMNAR = b'c'
+
+# 压缩标记
+COMPRESS_NONE = b'-'
+COMPRESS_ZLIB = b'z'
+COMPRESS_LZ4 = b'l'
+
+# 列式打包的表标记键，以及转换为列式所需的最少行数
+TABLE_MARKER = '\x00cols'
+MIN_TABLE_ROWS = 8
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class JsonCodec:
+    """JSON编码（无额外依赖）"""
+    tag = CODEC_JSON
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def decode(self, payload: bytes) -> Any:
+        return json.loads(payload.decode('utf-8'))
+
+
+class MsgpackCodec:
+    """msgpack二进制编码"""
+    tag = CODEC_MSGPACK
+
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, payload: bytes) -> Any:
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+class ColumnarCodec(MsgpackCodec):
+    """
+    列式打包编码（基于msgpack）
+    将字段相同的字典列表（如OHLCV K线）转为按列存储，数值列打包为连续的float64/int64数组，
+    只处理顶层列表和顶层字典的直接取值，避免对整个对象做深度遍历
+    """
+    tag = CODEC_COLUMNAR
+
+    @staticmethod
+    def is_table(value: Any) -> bool:
+        """判断是否为字段一致的字典列表"""
+        if not isinstance(value, list) or len(value) < MIN_TABLE_ROWS:
+            return False
+        first = value[0]
+        if not isinstance(first, dict):
+            return False
+        keys = tuple(first.keys())
+        return all(isinstance(row, dict) and tuple(row.keys()) == keys for row in value)
+
+    @classmethod
+    def can_encode(cls, value: Any) -> bool:
+        if cls.is_table(value):
+            return True
+        if isinstance(value, dict):
+            return any(cls.is_table(v) for v in value.values())
+        return False
+
+    @staticmethod
+    def _pack_column(values: list) -> dict:
+        if all(type(v) is float for v in values):
+            arr = array('d', values)
+            kind = 'f8'
+        elif all(type(v) is int for v in values) and all(-2**63 <= v < 2**63 for v in values):
+            arr = array('q', values)
+            kind = 'i8'
+        else:
+            return {'t': 'o', 'v': values}
+        if not _LITTLE_ENDIAN:
+            arr.byteswap()
+        return {'t': kind, 'b': arr.tobytes()}
+
+    @staticmethod
+    def _unpack_column(column: dict) -> list:
+        kind = column['t']
+        if kind == 'o':
+            return column['v']
+        arr = array('d' if kind == 'f8' else 'q')
+        arr.frombytes(column['b'])
+        if not _LITTLE_ENDIAN:
+            arr.byteswap()
+        return arr.tolist()
+
+    def _pack_table(self, rows: list) -> dict:
+        names = list(rows[0].keys())
+        columns = [self._pack_column([row[name] for row in rows]) for name in names]
+        return {TABLE_MARKER: names, 'c': columns}
+
+    def _unpack_table(self, table: dict) -> list:
+        names = table[TABLE_MARKER]
+        columns = [self._unpack_column(column) for column in table['c']]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    def _is_packed_table(self, value: Any) -> bool:
+        return isinstance(value, dict) and TABLE_MARKER in value
+
+    def encode(self, value: Any) -> bytes:
+        if self.is_table(value):
+            value = self._pack_table(value)
+        elif isinstance(value, dict):
+            value = {k: self._pack_table(v) if self.is_table(v) else v for k, v in value.items()}
+        return super().encode(value)
+
+    def decode(self, payload: bytes) -> Any:
+        value = super().decode(payload)
+        if self._is_packed_table(value):
+            return self._unpack_table(value)
+        if isinstance(value, dict):
+            return {k: self._unpack_table(v) if self._is_packed_table(v) else v for k, v in value.items()}
+        return value
+
+
+class CacheSerializer:
+    """缓存序列化器：选择编码、按阈值压缩，并根据标记解码"""
+
+    def __init__(self, codec: Optional[str] = None, compression: Optional[str] = None,
+                 compress_threshold: Optional[int] = None):
+        self.codec_name = (codec or os.getenv('CACHE_CODEC', 'auto')).lower()
+        self.compression = (compression or os.getenv('CACHE_COMPRESSION', 'zlib')).lower()
+        self.compress_threshold = int(compress_threshold if compress_threshold is not None
+                                      else os.getenv('CACHE_COMPRESS_THRESHOLD', 1024))
+
+        if self.codec_name in ('auto', 'msgpack', 'columnar') and msgpack is None:
+            logger.warning("msgpack未安装，缓存编码回退为JSON")
+            self.codec_name = 'json'
+        if self.compression == 'lz4' and lz4_frame is None:
+            logger.warning("lz4未安装，缓存压缩回退为zlib")
+            self.compression = 'zlib'
+
+        self._json = JsonCodec()
+        self._decoders = {CODEC_JSON: self._json}
+        if msgpack is not None:
+            self._msgpack = MsgpackCodec()
+            self._columnar = ColumnarCodec()
+            self._decoders[CODEC_MSGPACK] = self._msgpack
+            self._decoders[CODEC_COLUMNAR] = self._columnar
+
+    def _select_codec(self, value: Any):
+        if self.codec_name == 'json':
+            return self._json
+        if self.codec_name in ('auto', 'columnar') and ColumnarCodec.can_encode(value):
+            return self._columnar
+        return self._msgpack
+
+    def _compress(self, payload: bytes):
+        if self.compression == 'none' or len(payload) < self.compress_threshold:
+            return COMPRESS_NONE, payload
+        if self.compression == 'lz4':
+            return COMPRESS_LZ4, lz4_frame.compress(payload)
+        return COMPRESS_ZLIB, zlib.compress(payload, 3)
+
+    @staticmethod
+    def _decompress(flag: bytes, payload: bytes) -> bytes:
+        if flag == COMPRESS_NONE:
+            return payload
+        if flag == COMPRESS_ZLIB:
+            return zlib.decompress(payload)
+        if flag == COMPRESS_LZ4:
+            if lz4_frame is None:
+                raise ValueError("缓存值使用lz4压缩，但lz4未安装")
+            return lz4_frame.decompress(payload)
+        raise ValueError(f"未知的压缩标记: {flag!r}")
+
+    def dumps(self, value: Any) -> bytes:
+        """编码缓存值"""
+        if isinstance(value, str):
+            codec_tag, payload = CODEC_TEXT, value.encode('utf-8')
+        else:
+            codec = self._select_codec(value)
+            codec_tag, payload = codec.tag, codec.encode(value)
+
+        compress_tag, payload = self._compress(payload)
+        return MAGIC + codec_tag + compress_tag + payload
+
+    def loads(self, raw) -> Any:
+        """解码缓存值"""
+        if raw is None:
+            return None
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8')
+
+        if not raw.startswith(MAGIC) or len(raw) < 3:
+            return self._loads_legacy(raw)
+
+        codec_tag, compress_tag = raw[1:2], raw[2:3]
+        payload = self._decompress(compress_tag, raw[3:])
+        if codec_tag == CODEC_TEXT:
+            return payload.decode('utf-8')
+
+        codec = self._decoders.get(codec_tag)
+        if codec is None:
+            raise ValueError(f"无法解码缓存值，编码标记: {codec_tag!r}")
+        return codec.decode(payload)
+
+    @staticmethod
+    def _loads_legacy(raw: bytes) -> Any:
+        """解码旧版本写入的JSON文本"""
+        text = raw.decode('utf-8', errors='replace')
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return text
+
+
+# 全局序列化器实例
+_serializer = None
+
+def get_serializer() -> CacheSerializer:
+    """获取全局缓存序列化器"""
+    global _serializer
+    if _serializer is None:
+        _serializer = CacheSerializer()
+    return _serializer
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+缓存指标统计
+按命名空间（price / chart / realtime / func 等）记录命中、未命中、旧值返回、
+读写字节数，以及编码、解码和Redis往返延迟的直方图
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+# 延迟直方图的桶上界（毫秒）
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+# 键的命名空间归组，未列出的直接使用键的第二段
+NAMESPACE_GROUPS = {
+    'latest_prices': 'price',
+    'realtime_prices': 'realtime',
+    'ticks': 'realtime',
+    'idx': 'meta',
+    'lock': 'meta',
+    'version': 'meta',
+}
+
+
+def namespace_of(key, grouped: bool = True) -> str:
+    """
+    根据缓存键确定命名空间，如 crypto:chart:BTC:hour -> chart
+    grouped 为 True 时按 NAMESPACE_GROUPS 归组（用于统计），否则返回键的第二段（用于缓存索引）
+    """
+    if isinstance(key, bytes):
+        key = key.decode('utf-8', errors='replace')
+    parts = key.split(':', 2)
+    namespace = parts[1] if len(parts) > 1 and parts[0] == 'crypto' else 'other'
+    return NAMESPACE_GROUPS.get(namespace, namespace) if grouped else namespace
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def _percentile(self, q: float) -> Optional[float]:
+        """按桶上界估算分位数"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else round(self.max_ms, 3)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> Dict:
+        buckets = {f"<={bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)}
+        buckets[f">{LATENCY_BUCKETS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 4) if self.count else None,
+            'p50_ms': self._percentile(0.5),
+            'p95_ms': self._percentile(0.95),
+            'p99_ms': self._percentile(0.99),
+            'max_ms': round(self.max_ms, 3),
+            'buckets': buckets
+        }
+
+
+class NamespaceMetrics:
+    """单个命名空间的计数器和直方图"""
+
+    COUNTERS = ('hits', 'local_hits', 'misses', 'stale_serves', 'loads', 'bytes_read', 'bytes_written', 'errors')
+    TIMERS = ('encode', 'decode', 'rtt', 'load')
+
+    def __init__(self):
+        self.counters = {name: 0 for name in self.COUNTERS}
+        self.timers = {name: LatencyHistogram() for name in self.TIMERS}
+
+    def to_dict(self) -> Dict:
+        lookups = self.counters['hits'] + self.counters['local_hits'] + self.counters['misses']
+        result = dict(self.counters)
+        result['hit_rate'] = round((lookups - self.counters['misses']) / lookups, 4) if lookups else 0.0
+        result['latency'] = {name: histogram.to_dict() for name, histogram in self.timers.items() if histogram.count}
+        return result
+
+
+class CacheMetrics:
+    """缓存指标汇总（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._namespaces: Dict[str, NamespaceMetrics] = {}
+        self.started_at = time.time()
+
+    def _get(self, namespace: str) -> NamespaceMetrics:
+        metrics = self._namespaces.get(namespace)
+        if metrics is None:
+            metrics = self._namespaces.setdefault(namespace, NamespaceMetrics())
+        return metrics
+
+    def incr(self, namespace: str, counter: str, amount: int = 1):
+        with self._lock:
+            self._get(namespace).counters[counter] += amount
+
+    def observe(self, namespace: str, timer: str, seconds: float):
+        with self._lock:
+            self._get(namespace).timers[timer].observe(seconds * 1000)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            namespaces = {name: metrics.to_dict() for name, metrics in sorted(self._namespaces.items())}
+        return {
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'namespaces': namespaces
+        }
+
+    def reset(self):
+        with self._lock:
+            self._namespaces.clear()
+            self.started_at = time.time()
+
+
+# 全局指标实例
+_metrics = CacheMetrics()
+
+def get_cache_metrics() -> CacheMetrics:
+    """获取全局缓存指标实例"""
+    return _metrics
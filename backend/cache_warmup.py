@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+缓存预热
+服务启动后预先加载最新价格、各币种各时间粒度的默认图表和K线视图，
+避免重启后第一批请求同时回源数据库。预热完成前 /api/health 返回 warming
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+# 预热的时间粒度和默认视图条数（与 /api/chart_data、/api/kline_data 的默认参数一致）
+WARMUP_TIMEFRAMES = ['minute', 'hour', 'day']
+DEFAULT_CHART_LIMIT = 100
+DEFAULT_KLINE_LIMIT = 100
+
+
+class CacheWarmer:
+    """启动时的缓存预热"""
+
+    def __init__(self, web_app, timeframes=None, chart_limit=DEFAULT_CHART_LIMIT,
+                 kline_limit=DEFAULT_KLINE_LIMIT):
+        self.web_app = web_app
+        self.timeframes = timeframes or WARMUP_TIMEFRAMES
+        self.chart_limit = chart_limit
+        self.kline_limit = kline_limit
+        self._lock = threading.Lock()
+        self._status = {
+            'state': 'pending',
+            'total_steps': 1 + len(self.timeframes),
+            'completed_steps': 0,
+            'current_step': None,
+            'symbols': [],
+            'entries_written': 0,
+            'errors': [],
+            'started_at': None,
+            'finished_at': None,
+            'duration_seconds': None
+        }
+
+    def _update(self, **changes):
+        with self._lock:
+            self._status.update(changes)
+
+    def _step_done(self, written):
+        with self._lock:
+            self._status['completed_steps'] += 1
+            self._status['entries_written'] += written
+
+    def _error(self, message):
+        logging.warning(f"缓存预热: {message}")
+        with self._lock:
+            self._status['errors'].append(message)
+
+    def get_status(self):
+        """预热进度"""
+        with self._lock:
+            status = dict(self._status, errors=list(self._status['errors']))
+        status['progress'] = round(status['completed_steps'] / status['total_steps'] * 100, 1)
+        return status
+
+    def is_ready(self):
+        """预热已结束（完成、失败或跳过）"""
+        with self._lock:
+            return self._status['state'] in ('done', 'failed', 'skipped')
+
+    def skip(self, reason):
+        """不执行预热"""
+        logging.info(f"跳过缓存预热: {reason}")
+        self._update(state='skipped', current_step=reason)
+
+    def start(self):
+        """在后台线程中执行预热，已开始或已结束时不重复执行"""
+        with self._lock:
+            if self._status['state'] != 'pending':
+                return
+            self._status['state'] = 'running'
+        threading.Thread(target=self.run, name='cache-warmup', daemon=True).start()
+
+    def run(self):
+        """执行预热"""
+        cache_manager = self.web_app.redis_manager
+        if not cache_manager or not cache_manager.redis.is_connected():
+            self.skip('Redis缓存不可用')
+            return
+
+        started = time.time()
+        self._update(state='running', started_at=datetime.now().isoformat())
+        logging.info("🔥 开始缓存预热")
+
+        connection = None
+        try:
+            connection = self.web_app.db.get_connection()
+            if not connection:
+                raise RuntimeError("数据库连接失败")
+
+            # 1. 已登记的币种和最新价格
+            self._update(current_step='latest_prices')
+            symbols = self.web_app.db.get_symbols(connection=connection)
+            self._update(symbols=symbols)
+            prices = self.web_app.load_latest_prices_from_db()
+            written = cache_manager.write_entries([cache_manager.latest_prices_entry(prices)]) if prices else 0
+            if not prices:
+                self._error("没有最新价格数据")
+            self._step_done(written)
+
+            # 2. 每个时间粒度一次批量查询所有币种，图表和K线视图一次管道写入
+            for timeframe in self.timeframes:
+                self._update(current_step=timeframe)
+                try:
+                    written = self._warm_timeframe(cache_manager, timeframe, symbols, connection)
+                except Exception as e:
+                    written = 0
+                    self._error(f"{timeframe} 预热失败: {e}")
+                self._step_done(written)
+
+            state = 'done'
+        except Exception as e:
+            self._error(str(e))
+            state = 'failed'
+        finally:
+            if connection:
+                try:
+                    connection.close()
+                except:
+                    pass
+
+        duration = round(time.time() - started, 3)
+        self._update(state=state, current_step=None, finished_at=datetime.now().isoformat(),
+                     duration_seconds=duration)
+        status = self.get_status()
+        logging.info(f"✅ 缓存预热结束: {state}，写入 {status['entries_written']} 个条目，耗时 {duration}s")
+
+    def _warm_timeframe(self, cache_manager, timeframe, symbols, connection):
+        """预热一个时间粒度下所有币种的图表和K线视图"""
+        from kline_backend import kline_backend
+
+        grouped = self.web_app.db.get_historical_data_batch(timeframe, symbols, self.chart_limit,
+                                                            connection=connection)
+        # K线视图（默认指标）同样一次查询所有币种，键和数据与 /api/kline_data 未命中时一致
+        kline_entries = kline_backend.kline_cache_entries(timeframe, symbols, self.kline_limit,
+                                                          connection=connection)
+
+        entries = []
+        for symbol in symbols:
+            rows = grouped.get(symbol)
+            if not rows:
+                self._error(f"{symbol} 没有 {timeframe} 级数据")
+                continue
+
+            entries.append(cache_manager.chart_entry(
+                symbol, timeframe, self.web_app.format_chart_rows(rows[:self.chart_limit])))
+            if symbol in kline_entries:
+                entries.append(kline_entries[symbol])
+
+        return cache_manager.write_entries(entries)
+
+
+def warmup_enabled():
+    """是否在启动时预热（CACHE_WARMUP，默认开启）"""
+    return os.getenv('CACHE_WARMUP', 'true').lower() not in ('0', 'false', 'no', 'off')
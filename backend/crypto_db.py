@@ -18,6 +18,24 @@ logging.basicConfig(
     ]
 )
 
+# indicator_data 表的指标列（顺序即写入和关联查询的列顺序）
+INDICATOR_COLUMNS = [
+    'ma5', 'ma10', 'ma20', 'ma50', 'rsi', 'macd', 'macd_signal', 'macd_hist',
+    'bb_upper', 'bb_middle', 'bb_lower', 'volume_ma', 'volatility', 'kdj_k', 'kdj_d', 'kdj_j'
+]
+
+
+def kline_numeric_columns(alias=''):
+    """
+    K线数值列的SELECT片段：时间戳（毫秒，date 按UTC解释）+ OHLCV，均在SQL中转换，
+    结果为 int/float，不经过 datetime 和 Decimal
+    """
+    prefix = f"{alias}." if alias else ''
+    return (f"TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', {prefix}date) * 1000, "
+            f"CAST({prefix}open_price AS DOUBLE), CAST({prefix}high_price AS DOUBLE), "
+            f"CAST({prefix}low_price AS DOUBLE), CAST({prefix}close_price AS DOUBLE), "
+            f"CAST(COALESCE({prefix}volume, 0) AS DOUBLE)")
+
 class CryptoDatabase:
     def __init__(self):
         """初始化数据库连接池"""
@@ -359,12 +377,41 @@ class CryptoDatabase:
         )
         """
         
+        # 创建技术指标表（入库时按K线增量计算，K线接口直接关联读取）
+        indicator_data_table = """
+        CREATE TABLE IF NOT EXISTS indicator_data (
+            symbol VARCHAR(10) NOT NULL,
+            timeframe VARCHAR(10) NOT NULL,
+            date TIMESTAMP NOT NULL,
+            ma5 DOUBLE NULL,
+            ma10 DOUBLE NULL,
+            ma20 DOUBLE NULL,
+            ma50 DOUBLE NULL,
+            rsi DOUBLE NULL,
+            macd DOUBLE NULL,
+            macd_signal DOUBLE NULL,
+            macd_hist DOUBLE NULL,
+            bb_upper DOUBLE NULL,
+            bb_middle DOUBLE NULL,
+            bb_lower DOUBLE NULL,
+            volume_ma DOUBLE NULL,
+            volatility DOUBLE NULL,
+            kdj_k DOUBLE NULL,
+            kdj_d DOUBLE NULL,
+            kdj_j DOUBLE NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (symbol, timeframe, date),
+            FOREIGN KEY (symbol) REFERENCES crypto_info(symbol) ON DELETE CASCADE
+        )
+        """
+        
         tables = [
             ("crypto_info", crypto_info_table),
             ("current_prices", current_prices_table),
             ("minute_data", minute_data_table),
             ("hour_data", hour_data_table),
-            ("day_data", day_data_table)
+            ("day_data", day_data_table),
+            ("indicator_data", indicator_data_table)
         ]
         
         for table_name, table_sql in tables:
@@ -495,7 +542,240 @@ class CryptoDatabase:
         else:
             # 使用原有的execute_query方法（向后兼容）
             return self.execute_query(query, params, fetch=True)
+
+    def get_symbols(self, connection=None):
+        """获取已登记的加密货币代码"""
+        query = "SELECT symbol FROM crypto_info ORDER BY symbol"
+
+        if connection:
+            try:
+                cursor = connection.cursor()
+                cursor.execute(query)
+                result = cursor.fetchall()
+                cursor.close()
+            except Exception as e:
+                logging.error(f"使用连接池执行查询失败: {str(e)}")
+                return []
+        else:
+            result = self.execute_query(query, fetch=True)
+
+        return [row[0] for row in result or []]
+
+    def get_historical_data_batch(self, timeframe, symbols, limit=100, connection=None):
+        """
+        一次查询获取多个币种的历史数据
+        每个币种各取最近 limit 条（UNION ALL 各自走 symbol+date 索引），返回 {symbol: 按时间倒序的行}
+        """
+        table_map = {
+            'minute': 'minute_data',
+            'hour': 'hour_data',
+            'day': 'day_data'
+        }
+
+        if timeframe not in table_map or not symbols:
+            return {}
+
+        table_name = table_map[timeframe]
+        subquery = f"""
+            (SELECT symbol, date, open_price, high_price, low_price, close_price, volume
+             FROM {table_name}
+             WHERE symbol = %s
+             ORDER BY date DESC
+             LIMIT %s)
+        """
+        query = " UNION ALL ".join([subquery] * len(symbols))
+        params = []
+        for symbol in symbols:
+            params.extend([symbol, limit])
+
+        if connection:
+            try:
+                cursor = connection.cursor()
+                cursor.execute(query, tuple(params))
+                result = cursor.fetchall()
+                cursor.close()
+            except Exception as e:
+                logging.error(f"使用连接池执行查询失败: {str(e)}")
+                return {}
+        else:
+            result = self.execute_query(query, tuple(params), fetch=True)
+
+        # UNION ALL 不保证整体顺序，分组后按时间倒序排列，与 get_historical_data 一致
+        grouped = {symbol: [] for symbol in symbols}
+        for row in result or []:
+            grouped.setdefault(row[0], []).append(row)
+        for rows in grouped.values():
+            rows.sort(key=lambda row: row[1], reverse=True)
+        return grouped
+
+    def upsert_indicator_data(self, timeframe, symbol, rows, overwrite=True, connection=None):
+        """
+        写入技术指标，rows 为 (date, {列名: 值}) 列表
+        overwrite=False 时已存在的行保持不变（用于重建状态时的回填）
+        """
+        if not rows:
+            return True
+        
+        columns = ', '.join(INDICATOR_COLUMNS)
+        placeholders = ', '.join(['%s'] * (len(INDICATOR_COLUMNS) + 3))
+        if overwrite:
+            updates = ', '.join(f"{column} = VALUES({column})" for column in INDICATOR_COLUMNS)
+            query = f"""
+            INSERT INTO indicator_data (symbol, timeframe, date, {columns})
+            VALUES ({placeholders})
+            ON DUPLICATE KEY UPDATE {updates}
+            """
+        else:
+            query = f"""
+            INSERT IGNORE INTO indicator_data (symbol, timeframe, date, {columns})
+            VALUES ({placeholders})
+            """
+        params = [
+            (symbol, timeframe, date) + tuple(values.get(column) for column in INDICATOR_COLUMNS)
+            for date, values in rows
+        ]
+        
+        connection = connection or self.connection
+        try:
+            cursor = connection.cursor()
+            cursor.executemany(query, params)
+            connection.commit()
+            cursor.close()
+            return True
+        except Exception as e:
+            logging.error(f"写入技术指标失败 {symbol} {timeframe}: {str(e)}")
+            return False
     
+    def get_kline_rows(self, timeframe, symbol, limit=100, connection=None):
+        """
+        获取数值形式的K线 (时间戳毫秒, open, high, low, close, volume)，按时间倒序
+        类型转换在SQL中完成，适合直接构造 NumPy 数组
+        """
+        table_map = {
+            'minute': 'minute_data',
+            'hour': 'hour_data',
+            'day': 'day_data'
+        }
+        
+        if timeframe not in table_map:
+            return []
+        
+        table_name = table_map[timeframe]
+        query = f"""
+        SELECT {kline_numeric_columns()}
+        FROM {table_name}
+        WHERE symbol = %s
+        ORDER BY date DESC
+        LIMIT %s
+        """
+        params = (symbol, limit)
+        
+        if connection:
+            try:
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+                result = cursor.fetchall()
+                cursor.close()
+                return result
+            except Exception as e:
+                logging.error(f"使用连接池执行查询失败: {str(e)}")
+                return []
+        else:
+            return self.execute_query(query, params, fetch=True)
+    
+    def get_historical_data_with_indicators(self, timeframe, symbol, limit=100, connection=None):
+        """
+        获取历史数据并关联技术指标表
+        每行为 数值K线6列（同 get_kline_rows）+ 是否有指标行（0/1）+ INDICATOR_COLUMNS，按时间倒序
+        """
+        table_map = {
+            'minute': 'minute_data',
+            'hour': 'hour_data',
+            'day': 'day_data'
+        }
+        
+        if timeframe not in table_map:
+            return []
+        
+        table_name = table_map[timeframe]
+        indicator_columns = ', '.join(f"i.{column}" for column in INDICATOR_COLUMNS)
+        query = f"""
+        SELECT {kline_numeric_columns('h')},
+               i.date IS NOT NULL, {indicator_columns}
+        FROM {table_name} h
+        LEFT JOIN indicator_data i
+            ON i.symbol = h.symbol AND i.timeframe = %s AND i.date = h.date
+        WHERE h.symbol = %s
+        ORDER BY h.date DESC
+        LIMIT %s
+        """
+        params = (timeframe, symbol, limit)
+        
+        if connection:
+            try:
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+                result = cursor.fetchall()
+                cursor.close()
+                return result
+            except Exception as e:
+                logging.error(f"使用连接池执行查询失败: {str(e)}")
+                return []
+        else:
+            return self.execute_query(query, params, fetch=True)
+    
+    def get_historical_data_with_indicators_batch(self, timeframe, symbols, limit=100, connection=None):
+        """
+        一次查询获取多个币种的历史数据和关联的技术指标
+        每个币种各取最近 limit 条（UNION ALL 各自走 symbol+date 索引），返回 {symbol: 按时间倒序的行}，
+        行格式同 get_historical_data_with_indicators
+        """
+        table_map = {
+            'minute': 'minute_data',
+            'hour': 'hour_data',
+            'day': 'day_data'
+        }
+
+        if timeframe not in table_map or not symbols:
+            return {}
+
+        table_name = table_map[timeframe]
+        indicator_columns = ', '.join(f"i.{column}" for column in INDICATOR_COLUMNS)
+        subquery = f"""
+            (SELECT h.symbol, {kline_numeric_columns('h')},
+                    i.date IS NOT NULL, {indicator_columns}
+             FROM {table_name} h
+             LEFT JOIN indicator_data i
+                 ON i.symbol = h.symbol AND i.timeframe = %s AND i.date = h.date
+             WHERE h.symbol = %s
+             ORDER BY h.date DESC
+             LIMIT %s)
+        """
+        query = " UNION ALL ".join([subquery] * len(symbols))
+        params = []
+        for symbol in symbols:
+            params.extend([timeframe, symbol, limit])
+
+        if connection:
+            try:
+                cursor = connection.cursor()
+                cursor.execute(query, tuple(params))
+                result = cursor.fetchall()
+                cursor.close()
+            except Exception as e:
+                logging.error(f"使用连接池执行查询失败: {str(e)}")
+                return {}
+        else:
+            result = self.execute_query(query, tuple(params), fetch=True)
+
+        # UNION ALL 不保证整体顺序，分组后按时间倒序排列
+        grouped = {symbol: [] for symbol in symbols}
+        for row in result or []:
+            grouped.setdefault(row[0], []).append(row[1:])
+        for rows in grouped.values():
+            rows.sort(key=lambda row: row[0], reverse=True)
+        return grouped
+
     def get_latest_price(self, symbol):
         """获取单个加密货币的最新价格"""
         query = """
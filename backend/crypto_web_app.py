@@ -4,7 +4,9 @@ from datetime import datetime
 import os
 from crypto_db import CryptoDatabase
 from crypto_analyzer import CryptoAnalyzer
-from simple_redis_manager import CryptoCacheManager
+from simple_redis_manager import get_cache_manager
+from cache_warmup import CacheWarmer, warmup_enabled
+import resample
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -32,13 +34,23 @@ class CryptoWebApp:
         
         # 初始化Redis缓存管理器
         try:
-            self.redis_manager = CryptoCacheManager()
+            self.redis_manager = get_cache_manager()
             logging.info("Redis缓存管理器初始化成功")
         except Exception as e:
             logging.warning(f"Redis缓存管理器初始化失败: {e}")
             self.redis_manager = None
             
         self.setup_routes()
+        
+        # 缓存预热在服务启动时（数据库初始化之后）开始，完成前健康检查返回 warming
+        self.cache_warmer = CacheWarmer(self)
+    
+    def start_cache_warmup(self):
+        """启动缓存预热（只执行一次）；导入模块时不预热，避免与数据库重建同时进行"""
+        if warmup_enabled():
+            self.cache_warmer.start()
+        else:
+            self.cache_warmer.skip('CACHE_WARMUP 已关闭')
     
     def setup_routes(self):
         """设置路由"""
@@ -51,6 +63,8 @@ class CryptoWebApp:
         self.app.route('/api/btc_data')(self.api_btc_data)
         self.app.route('/api/eth_data')(self.api_eth_data)
         self.app.route('/api/kline_data')(self.api_kline_data)
+        self.app.route('/api/recent_ticks')(self.api_recent_ticks)
+        self.app.route('/api/indicators/latest')(self.api_latest_indicators)
         self.app.route('/api/refresh_charts', methods=['POST'])(self.api_refresh_charts)
         
         # 健康检查API
@@ -162,19 +176,17 @@ class CryptoWebApp:
 
     def get_latest_prices(self):
         """从缓存或数据库获取最新价格"""
-        # 首先尝试从Redis缓存获取
+        # 通过Redis缓存获取，缓存失效时只有一个请求回源数据库
         if self.redis_manager:
             try:
-                cached_prices = self.redis_manager.get_latest_prices()
-                if cached_prices:
-                    logging.info("从Redis缓存获取最新价格数据")
-                    return cached_prices
-                else:
-                    logging.info("Redis缓存中没有最新价格数据，从数据库获取")
+                return self.redis_manager.get_or_load_latest_prices(self.load_latest_prices_from_db)
             except Exception as e:
                 logging.warning(f"从Redis缓存获取价格数据失败: {e}")
         
-        # 从数据库获取数据
+        return self.load_latest_prices_from_db()
+    
+    def load_latest_prices_from_db(self):
+        """从数据库获取最新价格"""
         connection = None
         try:
             # 从连接池获取连接
@@ -210,14 +222,6 @@ class CryptoWebApp:
                     'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S') if hasattr(timestamp, 'strftime') else str(timestamp)
                 })
             
-            # 将数据缓存到Redis（缓存60秒）
-            if self.redis_manager and result:
-                try:
-                    self.redis_manager.cache_latest_prices(result)
-                    logging.info("最新价格数据已缓存到Redis")
-                except Exception as e:
-                    logging.warning(f"缓存价格数据到Redis失败: {e}")
-            
             return result
         except Exception as e:
             logging.error(f"获取最新价格时出错: {str(e)}")
@@ -234,19 +238,20 @@ class CryptoWebApp:
     
     def get_chart_data(self, timeframe, symbol=None, limit=100):
         """从缓存或数据库获取图表数据"""
-        # 首先尝试从Redis缓存获取
+        # 通过Redis缓存获取，缓存失效时只有一个请求回源数据库
         if self.redis_manager and symbol:
             try:
-                cached_data = self.redis_manager.get_chart_data(symbol, timeframe)
-                if cached_data:
-                    logging.info(f"从Redis缓存获取{symbol}的{timeframe}图表数据")
-                    return cached_data
-                else:
-                    logging.info(f"Redis缓存中没有{symbol}的{timeframe}图表数据，从数据库获取")
+                return self.redis_manager.get_or_load_chart_data(
+                    symbol, timeframe,
+                    lambda: self.load_chart_data_from_db(timeframe, symbol, limit)
+                )
             except Exception as e:
                 logging.warning(f"从Redis缓存获取图表数据失败: {e}")
         
-        # 从数据库获取数据
+        return self.load_chart_data_from_db(timeframe, symbol, limit)
+    
+    def load_chart_data_from_db(self, timeframe, symbol=None, limit=100):
+        """从数据库获取图表数据"""
         connection = None
         try:
             # 从连接池获取连接
@@ -255,37 +260,15 @@ class CryptoWebApp:
                 logging.error("数据库连接失败")
                 return []
             
-            # 获取历史数据
-            data = self.db.get_historical_data(timeframe, symbol, limit, connection=connection)
+            # 获取历史数据（非数据表粒度从更细的表重采样）
+            data = resample.load_history(self.db, timeframe, symbol, limit, connection=connection)
             
             if not data or len(data) == 0:
                 logging.warning(f"数据库中没有{timeframe}级数据")
                 return []
             
             # 转换数据格式
-            result = []
-            for item in data:
-                # 数据库返回的是tuple格式: (symbol, date, open_price, high_price, low_price, close_price, volume)
-                symbol_name, date, open_price, high_price, low_price, close_price, volume = item
-                result.append({
-                    'symbol': symbol_name,
-                    'date': date.strftime('%Y-%m-%d %H:%M:%S') if hasattr(date, 'strftime') else str(date),
-                    'open': float(open_price),
-                    'high': float(high_price),
-                    'low': float(low_price),
-                    'close': float(close_price),
-                    'volume': float(volume) if volume is not None else 0.0
-                })
-            
-            # 将数据缓存到Redis（缓存5分钟）
-            if self.redis_manager and result and symbol:
-                try:
-                    self.redis_manager.cache_chart_data(symbol, timeframe, result)
-                    logging.info(f"{symbol}的{timeframe}图表数据已缓存到Redis")
-                except Exception as e:
-                    logging.warning(f"缓存图表数据到Redis失败: {e}")
-            
-            return result
+            return self.format_chart_rows(data)
         except Exception as e:
             logging.error(f"获取图表数据时出错: {str(e)}")
             return []
@@ -297,6 +280,24 @@ class CryptoWebApp:
                 except:
                     pass
     
+    @staticmethod
+    def format_chart_rows(data):
+        """将数据库行转换为图表数据格式"""
+        result = []
+        for item in data:
+            # 数据库返回的是tuple格式: (symbol, date, open_price, high_price, low_price, close_price, volume)
+            symbol_name, date, open_price, high_price, low_price, close_price, volume = item
+            result.append({
+                'symbol': symbol_name,
+                'date': date.strftime('%Y-%m-%d %H:%M:%S') if hasattr(date, 'strftime') else str(date),
+                'open': float(open_price),
+                'high': float(high_price),
+                'low': float(low_price),
+                'close': float(close_price),
+                'volume': float(volume) if volume is not None else 0.0
+            })
+        return result
+    
     def get_cache_stats(self):
         """获取缓存统计信息"""
         if not self.redis_manager:
@@ -384,10 +385,18 @@ class CryptoWebApp:
     def api_chart_data(self):
         """API: 获取图表数据"""
         try:
-            timeframe = request.args.get('timeframe', 'hour')
             symbol = request.args.get('symbol')
             limit = int(request.args.get('limit', 100))
             
+            # 支持 minute/hour/day 及 5m、15m、4h、1w 等重采样周期
+            try:
+                timeframe = resample.normalize_timeframe(request.args.get('timeframe', 'hour'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            
             data = self.get_chart_data(timeframe, symbol, limit)
             return jsonify({
                 'success': True,
@@ -512,14 +521,19 @@ class CryptoWebApp:
                 except Exception as e:
                     redis_status = f'error: {str(e)}'
             
+            # 缓存预热完成前不报告健康，避免流量在缓存为空时涌入
+            warmup = self.cache_warmer.get_status()
+            ready = self.cache_warmer.is_ready()
+            
             return jsonify({
-                'status': 'healthy',
+                'status': 'healthy' if ready else 'warming',
                 'timestamp': datetime.now().isoformat(),
                 'services': {
                     'database': db_status,
                     'redis': redis_status
-                }
-            })
+                },
+                'warmup': warmup
+            }), 200 if ready else 503
         except Exception as e:
             logging.error(f"健康检查失败: {str(e)}")
             return jsonify({
@@ -588,14 +602,35 @@ class CryptoWebApp:
     def api_kline_data(self):
         """API: 获取K线数据"""
         try:
-            from kline_backend import kline_backend
+            from kline_backend import kline_backend, parse_indicator_spec, COLUMNAR_DTYPES
             
             symbol = request.args.get('symbol', 'BTC')
-            timeframe = request.args.get('timeframe', 'hour')
             limit = int(request.args.get('limit', 100))
             
+            # 指标选择和参数：indicators=ma,rsi&ma=7,25,99&rsi=14；timeframe 支持 15m、4h、1w 等重采样周期
+            try:
+                timeframe = resample.normalize_timeframe(request.args.get('timeframe', 'hour'))
+                spec = parse_indicator_spec(request.args)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            
+            # 列式格式（format=columnar，可选 dtype=float32）：缓存中是已编码的文本，直接拼接响应
+            if request.args.get('format') == 'columnar':
+                dtype = request.args.get('dtype', 'float64')
+                if dtype not in COLUMNAR_DTYPES:
+                    return jsonify({
+                        'success': False,
+                        'error': f'不支持的数值类型: {dtype}'
+                    }), 400
+                result = kline_backend.get_kline_columnar(symbol, timeframe, limit, spec, dtype)
+                return self.app.response_class('{"success":true,"data":' + result['body'] + '}',
+                                               mimetype='application/json')
+            
             # 使用新的后端处理模块获取数据
-            data = kline_backend.get_kline_data_with_indicators(symbol, timeframe, limit)
+            data = kline_backend.get_kline_data_with_indicators(symbol, timeframe, limit, spec)
             
             return jsonify({
                 'success': True,
@@ -608,6 +643,63 @@ class CryptoWebApp:
                 'error': str(e)
             }), 500
     
+    def api_latest_indicators(self):
+        """API: 获取最新一根K线的技术指标（增量计算）"""
+        try:
+            from kline_backend import kline_backend
+            
+            symbol = request.args.get('symbol', 'BTC')
+            try:
+                timeframe = resample.normalize_timeframe(request.args.get('timeframe', 'hour'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            
+            data = kline_backend.get_latest_indicators(symbol, timeframe)
+            if data is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'没有找到{symbol}的{timeframe}级数据'
+                }), 404
+            
+            return jsonify({
+                'success': True,
+                'data': data
+            })
+        except Exception as e:
+            logging.error(f"API获取最新技术指标时出错: {str(e)}")
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    def api_recent_ticks(self):
+        """API: 获取最近的实时报价序列（直接从Redis tick缓冲读取）"""
+        try:
+            symbol = request.args.get('symbol', 'BTC')
+            seconds = int(request.args.get('seconds', 3600))
+            limit = request.args.get('limit')
+            
+            if not self.redis_manager:
+                return jsonify({
+                    'success': False,
+                    'error': 'Redis缓存未启用'
+                }), 503
+            
+            ticks = self.redis_manager.get_recent_ticks(symbol, seconds, int(limit) if limit else None)
+            return jsonify({
+                'success': True,
+                'data': ticks
+            })
+        except Exception as e:
+            logging.error(f"API获取实时报价序列时出错: {str(e)}")
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
     def get_local_ip(self):
         """获取本机局域网IP地址"""
         try:
@@ -641,6 +733,7 @@ class CryptoWebApp:
         logging.info(f"启动Web应用，本地地址: http://127.0.0.1:{port}")
         logging.info(f"启动Web应用，局域网地址: http://{local_ip}:{port}")
         
+        self.start_cache_warmup()
         self.app.run(debug=debug, host=host, port=port)
 
 # 创建全局应用实例，供其他模块导入
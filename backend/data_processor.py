@@ -2,10 +2,23 @@ import logging
 from crypto_scraper import scrape_all_crypto_data
 from crypto_db import CryptoDatabase
 from timestamp_manager import get_timestamp_manager
-from datetime import datetime, timedelta
+from simple_redis_manager import get_cache_manager
+from indicator_stream import IndicatorStateStore
+from datetime import datetime, timedelta, timezone
 import pandas as pd
 import time
 
+# 增量指标状态不存在时，用于重建的历史K线条数
+INDICATOR_HISTORY = 200
+# 增量指标字段 -> indicator_data 表列名（其余字段同名）
+INDICATOR_COLUMN_NAMES = {
+    'signal': 'macd_signal',
+    'histogram': 'macd_hist',
+    'k': 'kdj_k',
+    'd': 'kdj_d',
+    'j': 'kdj_j'
+}
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -19,7 +32,72 @@ logging.basicConfig(
 class DataProcessor:
     def __init__(self):
         self.db = CryptoDatabase()
+        self.cache_manager = get_cache_manager()
         self.timestamp_manager = get_timestamp_manager()
+        self.indicator_store = IndicatorStateStore(self.cache_manager)
+    
+    @staticmethod
+    def format_cache_time(value):
+        """与图表/价格接口一致的时间格式"""
+        return value.strftime('%Y-%m-%d %H:%M:%S') if hasattr(value, 'strftime') else str(value)
+    
+    def write_through_cache(self, stored_prices, stored_candles):
+        """入库成功后把新数据写穿到价格和图表缓存"""
+        try:
+            if stored_prices:
+                self.cache_manager.write_through_prices(stored_prices)
+            
+            for (symbol, timeframe), candles in stored_candles.items():
+                self.cache_manager.write_through_candles(symbol, timeframe, candles)
+                self.advance_indicators(symbol, timeframe, candles)
+            
+            if stored_prices or stored_candles:
+                logging.info(f"缓存写穿完成: {len(stored_prices)} 条价格, {len(stored_candles)} 组K线")
+        except Exception as e:
+            logging.warning(f"缓存写穿失败: {str(e)}")
+    
+    def to_timestamp_ms(self, value):
+        """时间转换为毫秒时间戳（与K线接口一致，无时区按UTC）"""
+        return self.timestamp_manager.to_timestamp(self.timestamp_manager.ensure_utc(value))
+    
+    @staticmethod
+    def from_timestamp_ms(ts):
+        """毫秒时间戳转换为与K线表一致的 UTC 无时区时间"""
+        return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).replace(tzinfo=None)
+    
+    def load_indicator_history(self, symbol, timeframe):
+        """读取重建增量指标所需的历史K线（时间升序）"""
+        rows = self.db.get_historical_data(timeframe, symbol, INDICATOR_HISTORY) or []
+        return [
+            [self.to_timestamp_ms(date), float(open_price), float(high_price), float(low_price),
+             float(close_price), float(volume) if volume is not None else 0.0]
+            for _, date, open_price, high_price, low_price, close_price, volume in reversed(rows)
+        ]
+    
+    def advance_indicators(self, symbol, timeframe, candles):
+        """
+        用新入库的K线推进该币种/时间粒度的增量指标状态，并把新增或更新的K线的指标写入 indicator_data
+        重建状态时回放的历史K线只补写缺失的行，不覆盖已有指标
+        """
+        bars = [
+            [self.to_timestamp_ms(candle['date']), candle['open'], candle['high'], candle['low'],
+             candle['close'], candle['volume']]
+            for candle in candles
+        ]
+        rows = {True: [], False: []}
+        
+        def collect(ts, latest, replay):
+            values = {INDICATOR_COLUMN_NAMES.get(name, name): value for name, value in latest.items()}
+            rows[replay].append((self.from_timestamp_ms(ts), values))
+        
+        self.indicator_store.advance(symbol, timeframe, bars,
+                                     history_loader=lambda: self.load_indicator_history(symbol, timeframe),
+                                     on_bar=collect)
+        
+        if rows[True]:
+            self.db.upsert_indicator_data(timeframe, symbol, rows[True], overwrite=False)
+        if rows[False]:
+            self.db.upsert_indicator_data(timeframe, symbol, rows[False])
     
     def process_and_store_data(self):
         """处理并存储抓取的数据"""
@@ -35,6 +113,10 @@ class DataProcessor:
             logging.info("开始抓取加密货币数据")
             current_data, historical_data = scrape_all_crypto_data()
             
+            # 记录成功入库的数据，用于写穿缓存
+            stored_prices = []
+            stored_candles = {}
+            
             # 存储当前价格数据
             if current_data:
                 logging.info("开始存储当前价格数据")
@@ -46,6 +128,11 @@ class DataProcessor:
                         data['timestamp']
                     )
                     if success:
+                        stored_prices.append({
+                            'symbol': data['symbol'],
+                            'price': float(data['price']),
+                            'timestamp': self.format_cache_time(data['timestamp'])
+                        })
                         logging.info(f"成功存储 {data['name']} 当前价格: ${data['price']:,.2f}")
                     else:
                         logging.error(f"存储 {data['name']} 当前价格失败")
@@ -68,11 +155,23 @@ class DataProcessor:
                             row['quote_volume']
                         )
                         
-                        if not success:
+                        if success:
+                            stored_candles.setdefault((row['symbol'], timeframe), []).append({
+                                'symbol': row['symbol'],
+                                'date': self.format_cache_time(row['date']),
+                                'open': float(row['open']),
+                                'high': float(row['high']),
+                                'low': float(row['low']),
+                                'close': float(row['close']),
+                                'volume': float(row['volume']) if row['volume'] is not None else 0.0
+                            })
+                        else:
                             logging.error(f"存储历史数据失败: {row['symbol']} - {row['date']}")
                     
                     logging.info(f"完成存储 {timeframe} 级历史数据")
             
+            self.write_through_cache(stored_prices, stored_candles)
+            
             logging.info("数据处理和存储完成")
             return True
             
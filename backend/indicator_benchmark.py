@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+技术指标性能基准
+对 KlineBackend / KlineProcessor 使用的每个指标，分别在合成序列（几何布朗运动）和
+data/kline_data 中记录的K线序列上测量 100、1万、100万根K线的耗时（纳秒/根）和峰值内存，
+覆盖 NumPy、TA-Lib（已安装时）两个批量后端和增量计算（IndicatorStream），结果输出为JSON便于对比
+
+用法: python indicator_benchmark.py [输出文件] [规模,规模,...]
+"""
+
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+import indicators
+from indicator_parity import DEFAULT_DATA_DIR, load_fixture
+from indicator_stream import IndicatorStream
+from kline_processor import compute_indicator_arrays
+
+DEFAULT_SIZES = [100, 10000, 1000000]
+# 每个用例的最短计时（秒）和最多重复次数
+MIN_BENCH_SECONDS = 0.5
+MAX_REPEATS = 50
+# 增量计算逐根K线推进，只测到该规模
+STREAM_MAX_SIZE = 10000
+SEED = 20240101
+
+
+def gbm_ohlcv(n, seed=SEED, start_price=30000.0, sigma=0.02):
+    """几何布朗运动生成的K线：收盘价为对数正态随机游走，开盘价为上一根收盘价"""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(-0.5 * sigma ** 2, sigma, n)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    wick = np.abs(rng.normal(0, sigma / 2, (2, n)))
+    return {
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + wick[0]),
+        'low': np.minimum(open_, close) * (1 - wick[1]),
+        'close': close,
+        'volume': rng.lognormal(10, 1, n)
+    }
+
+
+def recorded_ohlcv(n, data_dir=DEFAULT_DATA_DIR):
+    """
+    由 data/kline_data 中的K线拼接成 n 根的序列，不足时循环使用
+    各段缩放到同一开盘价后拼接（逐段首尾相接会累积各段的涨跌，长序列的价格会溢出）
+    """
+    segments = [load_fixture(path) for path in sorted(glob.glob(os.path.join(data_dir, '*_kline_*.json')))]
+    segments = [segment for segment in segments if len(segment['close']) and segment['open'][0] > 0]
+    if not segments:
+        return None
+
+    base_price = segments[0]['open'][0]
+    columns = {name: [] for name in ('open', 'high', 'low', 'close', 'volume')}
+    total, index = 0, 0
+    while total < n:
+        segment = segments[index % len(segments)]
+        scale = base_price / segment['open'][0]
+        for name in ('open', 'high', 'low', 'close'):
+            columns[name].append(segment[name] * scale)
+        columns['volume'].append(segment['volume'])
+        total += len(segment['close'])
+        index += 1
+    return {name: np.concatenate(parts)[:n] for name, parts in columns.items()}
+
+
+# 批量指标：名称 -> 以 OHLCV 列为输入的计算函数
+BATCH_INDICATORS = {
+    'sma5': lambda data: indicators.sma(data['close'], 5),
+    'sma10': lambda data: indicators.sma(data['close'], 10),
+    'sma20': lambda data: indicators.sma(data['close'], 20),
+    'sma50': lambda data: indicators.sma(data['close'], 50),
+    'ema12': lambda data: indicators.ema(data['close'], 12),
+    'rsi14': lambda data: indicators.rsi(data['close'], 14),
+    'macd': lambda data: indicators.macd(data['close'], 12, 26, 9),
+    'bollinger': lambda data: indicators.bollinger_bands(data['close'], 20, 2),
+    'volume_ma': lambda data: indicators.sma(data['volume'], 20),
+    'volatility': lambda data: indicators.volatility(data['close'], 20),
+    'kdj': lambda data: indicators.kdj(data['high'], data['low'], data['close'], 9, 3, 3),
+    # KlineProcessor 的一次完整计算
+    'all': lambda data: compute_indicator_arrays(data['high'], data['low'], data['close'], data['volume'])
+}
+
+
+def stream_all(data):
+    """增量计算：逐根K线推进全部指标"""
+    stream = IndicatorStream()
+    for ts, candle in enumerate(zip(data['open'].tolist(), data['high'].tolist(), data['low'].tolist(),
+                                    data['close'].tolist(), data['volume'].tolist())):
+        stream.update(ts, *candle)
+    return stream.latest
+
+
+def measure(func, data, size):
+    """测量一个用例：返回耗时（中位数和最快，纳秒/根）、重复次数和峰值内存（字节）"""
+    timings = []
+    budget_started = time.perf_counter()
+    while len(timings) < MAX_REPEATS:
+        started = time.perf_counter_ns()
+        func(data)
+        timings.append(time.perf_counter_ns() - started)
+        if time.perf_counter() - budget_started >= MIN_BENCH_SECONDS:
+            break
+
+    # 峰值内存单独测一次（开启跟踪会影响计时）
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    func(data)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return {
+        'ns_per_candle': round(float(np.median(timings)) / size, 2),
+        'best_ns_per_candle': round(min(timings) / size, 2),
+        'repeats': len(timings),
+        'peak_memory_bytes': peak
+    }
+
+
+def run_benchmark(sizes=None):
+    """运行全部用例，返回可JSON化的结果"""
+    sizes = sizes or DEFAULT_SIZES
+    backends = ['numpy'] + (['talib'] if indicators.talib is not None else [])
+    sources = {'gbm': gbm_ohlcv, 'recorded': recorded_ohlcv}
+
+    results = []
+    previous = indicators.BACKEND
+    try:
+        for source, generate in sources.items():
+            for size in sizes:
+                data = generate(size)
+                if data is None:
+                    print(f"跳过 {source}: 没有K线文件", file=sys.stderr)
+                    break
+                cases = [(backend, name, func) for backend in backends for name, func in BATCH_INDICATORS.items()]
+                if size <= STREAM_MAX_SIZE:
+                    cases.append(('stream', 'all', stream_all))
+
+                for backend, name, func in cases:
+                    if backend != 'stream':
+                        indicators.set_backend(backend)
+                    result = dict(source=source, size=size, backend=backend, indicator=name,
+                                  **measure(func, data, size))
+                    results.append(result)
+                    print(f"{source:9s} {size:>8d} {backend:6s} {name:11s} "
+                          f"{result['ns_per_candle']:>12.2f} ns/根  峰值 {result['peak_memory_bytes']:>12d} B",
+                          file=sys.stderr)
+    finally:
+        indicators.set_backend(previous)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'talib': getattr(indicators.talib, '__version__', None),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sizes': sizes,
+            'seed': SEED
+        },
+        'results': results
+    }
+
+
+if __name__ == "__main__":
+    output = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1] != '-' else None
+    sizes = [int(size) for size in sys.argv[2].split(',')] if len(sys.argv) > 2 else None
+    report = json.dumps(run_benchmark(sizes), ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(report)
+        print(f"基准结果已保存到: {output}", file=sys.stderr)
+    else:
+        print(report)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+技术指标后端一致性检查
+在 data/kline_data 的K线文件上分别用 TA-Lib 和 NumPy 后端计算全部指标，
+逐点比较（相对误差容限 RTOL，NaN 位置必须一致），有不一致时以非0状态退出
+
+用法: python indicator_parity.py [K线文件目录]
+"""
+
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+import indicators
+
+# 相对误差容限（以序列的最大绝对值为量级）
+RTOL = 1e-8
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'kline_data')
+
+
+def load_fixture(path):
+    """读取K线文件为按列的数组"""
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f).get('kline_data', [])
+    items = sorted(items, key=lambda item: item['date'])
+    return {
+        column: np.array([float(item.get(column) or 0.0) for item in items], dtype=np.float64)
+        for column in ('open', 'high', 'low', 'close', 'volume')
+    }
+
+
+def compute_all(ohlcv):
+    """用当前后端计算所有指标，返回 {名称: 数组}"""
+    high, low, close = ohlcv['high'], ohlcv['low'], ohlcv['close']
+    results = {}
+    for period in (5, 10, 20, 50):
+        results[f"sma{period}"] = indicators.sma(close, period)
+    for period in (12, 26):
+        results[f"ema{period}"] = indicators.ema(close, period)
+    results['rsi'] = indicators.rsi(close)
+    results['macd'], results['macd_signal'], results['macd_hist'] = indicators.macd(close)
+    results['bb_upper'], results['bb_middle'], results['bb_lower'] = indicators.bollinger_bands(close)
+    results['highest'] = indicators.rolling_max(high, 9)
+    results['lowest'] = indicators.rolling_min(low, 9)
+    results['k'], results['d'], results['j'] = indicators.kdj(high, low, close)
+    results['volatility'] = indicators.volatility(close)
+    return results
+
+
+def compare(expected, actual):
+    """比较两个序列，返回 (是否一致, 最大相对误差)"""
+    if not np.array_equal(np.isnan(expected), np.isnan(actual)):
+        return False, float('inf')
+    valid = ~np.isnan(expected)
+    if not valid.any():
+        return True, 0.0
+    scale = max(np.abs(expected[valid]).max(), 1.0)
+    error = float(np.abs(expected[valid] - actual[valid]).max() / scale)
+    return error <= RTOL, error
+
+
+def check_fixture(ohlcv):
+    """返回该K线序列上不一致的指标 {名称: 最大相对误差}"""
+    previous = indicators.set_backend('numpy')
+    try:
+        expected = compute_all(ohlcv)
+        indicators.set_backend('talib')
+        actual = compute_all(ohlcv)
+    finally:
+        indicators.set_backend(previous)
+
+    failures = {}
+    for name in expected:
+        ok, error = compare(expected[name], actual[name])
+        if not ok:
+            failures[name] = error
+    return failures
+
+
+def flat_fixture(length=60, price=100.0):
+    """价格完全不变的序列（RSI 等指标的边界情况）"""
+    values = np.full(length, price)
+    return {'open': values, 'high': values, 'low': values, 'close': values, 'volume': np.ones(length)}
+
+
+def run_parity_check(data_dir=DEFAULT_DATA_DIR):
+    """检查所有K线文件，返回是否全部一致"""
+    if indicators.talib is None:
+        print("TA-Lib 未安装，无法进行一致性检查")
+        return False
+
+    files = sorted(glob.glob(os.path.join(data_dir, '*_kline_*.json')))
+    if not files:
+        print(f"没有找到K线文件: {data_dir}")
+        return False
+
+    cases = [(os.path.basename(path), load_fixture(path)) for path in files]
+    cases.append(('flat_series', flat_fixture()))
+
+    failed = 0
+    for name, ohlcv in cases:
+        failures = check_fixture(ohlcv)
+        if failures:
+            failed += 1
+            details = ', '.join(f"{indicator}={error:.3g}" for indicator, error in failures.items())
+            print(f"❌ {name} ({len(ohlcv['close'])} 条): {details}")
+        else:
+            print(f"✅ {name} ({len(ohlcv['close'])} 条)")
+
+    print(f"\n共 {len(cases)} 组数据，{len(cases) - failed} 组一致，{failed} 组不一致（容限 {RTOL}）")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DATA_DIR
+    sys.exit(0 if run_parity_check(data_dir) else 1)
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+增量技术指标
+每个指标保存运行状态（EMA/RSI/MACD/KDJ 的平滑值、滚动窗口缓冲），新K线到达时 O(1) 推进，
+结果与 indicators 模块的批量计算一致。状态可序列化，按 (币种, 时间粒度) 保存在缓存中，
+数据入库时推进，读取最新指标时无需重算整段序列
+"""
+
+import logging
+import math
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+from indicators import ANNUALIZATION, KDJ_SEED
+
+NAN = float('nan')
+
+
+class _State:
+    """
+    可快照的指标状态基类：属性为数值、deque 或嵌套状态
+    push 前把 UNDO_FIELDS 中的标量记入 undo，rollback 撤销最近一次 push（只支持一步）
+    """
+
+    UNDO_FIELDS = ()
+
+    def get_state(self) -> Dict:
+        state = {}
+        for name, value in self.__dict__.items():
+            if isinstance(value, _State):
+                state[name] = value.get_state()
+            elif isinstance(value, deque):
+                state[name] = list(value)
+            else:
+                state[name] = value
+        return state
+
+    def set_state(self, state: Dict):
+        for name, value in state.items():
+            current = self.__dict__.get(name)
+            if isinstance(current, _State):
+                current.set_state(value)
+            elif isinstance(current, deque):
+                self.__dict__[name] = deque((tuple(item) if isinstance(item, list) else item for item in value),
+                                            maxlen=current.maxlen)
+            else:
+                self.__dict__[name] = value
+
+    def _mark(self, *extra):
+        self.undo = [getattr(self, name) for name in self.UNDO_FIELDS] + list(extra)
+
+    def rollback(self):
+        for name, value in zip(self.UNDO_FIELDS, self.undo):
+            setattr(self, name, value)
+
+
+class RollingWindow(_State):
+    """定长滚动窗口：增量维护均值和离差平方和（滑动 Welford），每满一轮按缓冲重算一次以消除累积误差"""
+
+    # updates 不回退：同一K线反复更新时也按推进次数定期重算，而不是每次都重算
+    UNDO_FIELDS = ('mean', 'm2')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.values = deque(maxlen=period)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+        self.undo = None
+
+    @property
+    def full(self) -> bool:
+        return len(self.values) == self.period
+
+    def push(self, value: float):
+        # 记下被挤出窗口的值，回退时放回
+        self._mark(self.values[0] if self.full else None)
+        if self.full:
+            old = self.values[0]
+            self.values.append(value)
+            delta = value - old
+            old_mean = self.mean
+            self.mean += delta / self.period
+            self.m2 += delta * (value - self.mean + old - old_mean)
+        else:
+            self.values.append(value)
+            count = len(self.values)
+            delta = value - self.mean
+            self.mean += delta / count
+            self.m2 += delta * (value - self.mean)
+
+        self.updates += 1
+        if self.updates >= self.period:
+            self._recompute()
+
+    def rollback(self):
+        dropped = self.undo[-1]
+        self.values.pop()
+        if dropped is not None:
+            self.values.appendleft(dropped)
+        super().rollback()
+
+    def _recompute(self):
+        count = len(self.values)
+        self.mean = sum(self.values) / count
+        self.m2 = sum((value - self.mean) ** 2 for value in self.values)
+        self.updates = 0
+
+    def average(self) -> float:
+        return self.mean if self.full else NAN
+
+    def std(self, ddof: int = 0) -> float:
+        if not self.full or self.period <= ddof:
+            return NAN
+        return math.sqrt(max(self.m2, 0.0) / (self.period - ddof))
+
+
+class RollingExtreme(_State):
+    """滚动最大/最小值：单调队列保存 (序号, 值)，每个值最多入队出队一次"""
+
+    def __init__(self, period: int, largest: bool = True):
+        self.period = period
+        self.largest = largest
+        self.queue = deque()
+        self.index = -1
+        self.undo = None
+
+    def push(self, value: float):
+        self.index += 1
+        # 记下被弹出的元素，回退时按原顺序放回（均摊 O(1)）
+        popped = []
+        if self.largest:
+            while self.queue and self.queue[-1][1] <= value:
+                popped.append(self.queue.pop())
+        else:
+            while self.queue and self.queue[-1][1] >= value:
+                popped.append(self.queue.pop())
+        self.queue.append((self.index, value))
+        expired = self.queue.popleft() if self.queue[0][0] <= self.index - self.period else None
+        self.undo = [popped, expired]
+
+    def rollback(self):
+        popped, expired = self.undo
+        if expired is not None:
+            self.queue.appendleft(tuple(expired))
+        self.queue.pop()
+        self.queue.extend(tuple(item) for item in reversed(popped))
+        self.index -= 1
+
+    def value(self) -> float:
+        return self.queue[0][1] if self.index >= self.period - 1 else NAN
+
+
+class EMAState(_State):
+    """指数移动平均：前 period 个值的简单平均作为初值"""
+
+    UNDO_FIELDS = ('count', 'seed_sum', 'current')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.count = 0
+        self.seed_sum = 0.0
+        self.current = NAN
+        self.undo = None
+
+    def push(self, value: float) -> float:
+        self._mark()
+        self.count += 1
+        if self.count < self.period:
+            self.seed_sum += value
+        elif self.count == self.period:
+            self.current = (self.seed_sum + value) / self.period
+        else:
+            self.current += self.alpha * (value - self.current)
+        return self.current
+
+
+class RSIState(_State):
+    """RSI（Wilder 平滑）"""
+
+    UNDO_FIELDS = ('prev_close', 'count', 'avg_gain', 'avg_loss', 'current')
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.current = NAN
+        self.undo = None
+
+    def push(self, close: float) -> float:
+        self._mark()
+        if self.prev_close is None:
+            self.prev_close = close
+            return self.current
+
+        delta = close - self.prev_close
+        self.prev_close = close
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        self.count += 1
+        if self.count <= self.period:
+            # 预热期先累加，满 period 个变化后取平均作为初值
+            self.avg_gain += gain
+            self.avg_loss += loss
+            if self.count < self.period:
+                return self.current
+            self.avg_gain /= self.period
+            self.avg_loss /= self.period
+        else:
+            self.avg_gain += (gain - self.avg_gain) / self.period
+            self.avg_loss += (loss - self.avg_loss) / self.period
+
+        self.current = 100.0 if self.avg_loss == 0 else 100.0 - 100.0 / (1.0 + self.avg_gain / self.avg_loss)
+        return self.current
+
+
+class MACDState(_State):
+    """MACD：慢线就绪后才开始计算信号线"""
+
+    UNDO_FIELDS = ('current',)
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = EMAState(fast)
+        self.slow = EMAState(slow)
+        self.signal = EMAState(signal)
+        self.current = (NAN, NAN, NAN)
+        self.undo = None
+
+    def push(self, close: float):
+        fast = self.fast.push(close)
+        slow = self.slow.push(close)
+        if slow != slow:
+            self._mark(False)
+            return self.current
+        self._mark(True)
+        macd_line = fast - slow
+        signal_line = self.signal.push(macd_line)
+        self.current = (macd_line, signal_line, macd_line - signal_line)
+        return self.current
+
+    def rollback(self):
+        if self.undo[-1]:
+            self.signal.rollback()
+        self.fast.rollback()
+        self.slow.rollback()
+        super().rollback()
+
+
+class VolatilityState(_State):
+    """年化波动率（小数）：最近 period 个简单收益率的样本标准差"""
+
+    UNDO_FIELDS = ('prev_close',)
+
+    def __init__(self, period: int = 20, annualization: int = ANNUALIZATION):
+        self.returns = RollingWindow(period)
+        self.scale = math.sqrt(annualization)
+        self.prev_close = None
+        self.undo = None
+
+    def push(self, close: float) -> float:
+        self._mark()
+        if self.prev_close is not None:
+            self.returns.push(close / self.prev_close - 1.0)
+        self.prev_close = close
+        return self.returns.std(ddof=1) * self.scale
+
+    def rollback(self):
+        super().rollback()
+        if self.prev_close is not None:
+            self.returns.rollback()
+
+
+class KDJState(_State):
+    """KDJ：K、D 从 50 起算"""
+
+    UNDO_FIELDS = ('k', 'd', 'current')
+
+    def __init__(self, period: int = 9, k_smooth: int = 3, d_smooth: int = 3):
+        self.highest = RollingExtreme(period, largest=True)
+        self.lowest = RollingExtreme(period, largest=False)
+        self.k_smooth = k_smooth
+        self.d_smooth = d_smooth
+        self.k = KDJ_SEED
+        self.d = KDJ_SEED
+        self.current = (NAN, NAN, NAN)
+        self.undo = None
+
+    def push(self, high: float, low: float, close: float):
+        self._mark()
+        self.highest.push(high)
+        self.lowest.push(low)
+        highest, lowest = self.highest.value(), self.lowest.value()
+        if highest != highest:
+            return self.current
+        span = highest - lowest
+        rsv = 50.0 if span == 0 else (close - lowest) / span * 100.0
+        self.k += (rsv - self.k) / self.k_smooth
+        self.d += (self.k - self.d) / self.d_smooth
+        self.current = (self.k, self.d, 3 * self.k - 2 * self.d)
+        return self.current
+
+    def rollback(self):
+        self.highest.rollback()
+        self.lowest.rollback()
+        super().rollback()
+
+
+class IndicatorStream(_State):
+    """
+    一个 (币种, 时间粒度) 的全部增量指标，输出字段与 KlineProcessor 的技术指标一致
+    同一时间戳的K线重复到达（未收盘K线被更新）时，撤销最后一根K线的推进再重新推进
+    """
+
+    VERSION = 2
+
+    def __init__(self):
+        self.ma = {str(period): RollingWindow(period) for period in (5, 10, 20, 50)}
+        self.volume_ma = RollingWindow(20)
+        self.bollinger = RollingWindow(20)
+        self.rsi = RSIState(14)
+        self.macd = MACDState(12, 26, 9)
+        self.volatility = VolatilityState(20)
+        self.kdj = KDJState(9, 3, 3)
+        self.last_ts = None
+        self.count = 0
+        self.latest = {}
+        # 最后一根K线推进前的 last_ts/count/latest，各指标自身保存一步撤销记录，用于同一时间戳的K线更新
+        self.before_last = None
+
+    def get_state(self) -> Dict:
+        state = super().get_state()
+        state['ma'] = {period: window.get_state() for period, window in self.ma.items()}
+        state['version'] = self.VERSION
+        return state
+
+    def set_state(self, state: Dict):
+        state = dict(state)
+        state.pop('version', None)
+        for period, window_state in state.pop('ma').items():
+            self.ma[period].set_state(window_state)
+        super().set_state(state)
+
+    @classmethod
+    def from_state(cls, state: Dict) -> Optional['IndicatorStream']:
+        """从快照恢复，版本不符时返回None（需重建）"""
+        if not state or state.get('version') != cls.VERSION:
+            return None
+        stream = cls()
+        stream.set_state(state)
+        return stream
+
+    def _advance(self, ts, high: float, low: float, close: float, volume: float):
+        for window in self.ma.values():
+            window.push(close)
+        self.volume_ma.push(volume)
+        self.bollinger.push(close)
+        rsi = self.rsi.push(close)
+        macd_line, signal_line, histogram = self.macd.push(close)
+        volatility = self.volatility.push(close)
+        k, d, j = self.kdj.push(high, low, close)
+
+        middle = self.bollinger.average()
+        width = self.bollinger.std() * 2
+        latest = {f"ma{period}": window.average() for period, window in self.ma.items()}
+        latest.update({
+            'rsi': rsi,
+            'macd': macd_line,
+            'signal': signal_line,
+            'histogram': histogram,
+            'bb_upper': middle + width,
+            'bb_middle': middle,
+            'bb_lower': middle - width,
+            'volume_ma': self.volume_ma.average(),
+            'volatility': volatility,
+            'k': k,
+            'd': d,
+            'j': j
+        })
+        # NaN 转为 None，便于JSON输出
+        self.latest = {name: None if value != value else value for name, value in latest.items()}
+        self.last_ts = ts
+        self.count += 1
+
+    def update(self, ts, open_price: float, high: float, low: float, close: float, volume: float) -> bool:
+        """
+        推进一根K线，返回是否被采用
+        早于最后一根的K线被忽略；与最后一根同一时间戳时替换最后一根
+        """
+        if self.last_ts is not None and ts < self.last_ts:
+            return False
+        if self.last_ts is not None and ts == self.last_ts:
+            if self.before_last is None:
+                return False
+            self.rollback()
+        # latest 每次推进都换成新字典，这里只需保存引用
+        before = {'last_ts': self.last_ts, 'count': self.count, 'latest': self.latest}
+        self._advance(ts, high, low, close, volume)
+        self.before_last = before
+        return True
+
+    def rollback(self):
+        """撤销最后一根K线的推进（O(1)），只支持一步"""
+        for window in self.ma.values():
+            window.rollback()
+        self.volume_ma.rollback()
+        self.bollinger.rollback()
+        self.rsi.rollback()
+        self.macd.rollback()
+        self.volatility.rollback()
+        self.kdj.rollback()
+        self.last_ts = self.before_last['last_ts']
+        self.count = self.before_last['count']
+        self.latest = self.before_last['latest']
+        self.before_last = None
+
+    def update_many(self, candles: Iterable, on_bar=None) -> int:
+        """
+        按时间顺序推进多根K线 [timestamp, open, high, low, close, volume]，返回采用的条数
+        on_bar(timestamp, latest) 在每根被采用的K线推进后调用
+        """
+        adopted = 0
+        for candle in sorted(candles, key=lambda c: c[0]):
+            if self.update(*candle[:6]):
+                adopted += 1
+                if on_bar is not None:
+                    on_bar(self.last_ts, self.latest)
+        return adopted
+
+
+class IndicatorStateStore:
+    """按 (币种, 时间粒度) 保存在缓存中的指标状态"""
+
+    def __init__(self, cache_manager=None):
+        if cache_manager is None:
+            from simple_redis_manager import get_cache_manager
+            cache_manager = get_cache_manager()
+        self.cache_manager = cache_manager
+
+    def load(self, symbol: str, timeframe: str) -> Optional[IndicatorStream]:
+        return IndicatorStream.from_state(self.cache_manager.get_indicator_state(symbol, timeframe))
+
+    def save(self, symbol: str, timeframe: str, stream: IndicatorStream) -> bool:
+        return self.cache_manager.save_indicator_state(symbol, timeframe, stream.get_state())
+
+    def advance(self, symbol: str, timeframe: str, candles: list, history_loader=None,
+                on_bar=None) -> Optional[Dict]:
+        """
+        用新K线推进状态并保存，返回最新指标
+        状态不存在时，用 history_loader() 返回的历史K线（升序）重建；未提供时从这批K线开始
+        on_bar(timestamp, latest, replay) 在每根被采用的K线后调用，重建时回放的历史K线 replay 为 True
+        """
+        try:
+            stream = self.load(symbol, timeframe)
+            if stream is None:
+                stream = IndicatorStream()
+                if history_loader is not None:
+                    stream.update_many(history_loader() or [],
+                                       on_bar and (lambda ts, latest: on_bar(ts, latest, True)))
+            stream.update_many(candles, on_bar and (lambda ts, latest: on_bar(ts, latest, False)))
+            if stream.last_ts is None:
+                return None
+            self.save(symbol, timeframe, stream)
+            return dict(stream.latest, timestamp=stream.last_ts, bars=stream.count)
+        except Exception as e:
+            logging.warning(f"推进指标状态失败 {symbol} {timeframe}: {e}")
+            return None
+
+    def latest(self, symbol: str, timeframe: str, history_loader=None) -> Optional[Dict]:
+        """读取最新指标（O(1)），状态不存在时用 history_loader 重建"""
+        stream = self.load(symbol, timeframe)
+        if stream is None:
+            return self.advance(symbol, timeframe, [], history_loader)
+        return dict(stream.latest, timestamp=stream.last_ts, bars=stream.count)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+技术指标计算模块
+KlineBackend（/api/kline_data）和 KlineProcessor（批量处理）共用的指标实现，
+输入为 NumPy 数组，输出为与输入等长的 float64 数组，预热期（数据不足）的位置为 NaN
+
+滚动窗口（均值、方差、最大/最小值）的计算量与窗口长度无关，均为 O(n)
+
+统一口径：
+- EMA / MACD / RSI 以前 period 个值的简单平均作为初始值（与 TA-Lib 一致）
+- 布林带使用总体标准差（ddof=0）
+- 波动率为 period 个收益率的样本标准差（ddof=1）按 252 年化，返回小数
+- KDJ 以 K、D 初值 50 起算：K = (2*K_prev + RSV) / 3，D = (2*D_prev + K) / 3
+
+安装了 TA-Lib 时 SMA/EMA/RSI/布林带和 KDJ 的滚动高低点使用其 C 实现，否则使用 NumPy 实现，
+两者按上述口径对齐（MACD 由 TA-Lib 的 EMA 组合，KDJ 的平滑不使用 STOCH，因其初值和平滑方式不同）。
+环境变量 INDICATOR_BACKEND=numpy 可强制使用 NumPy 实现，一致性检查见 indicator_parity.py
+"""
+
+import logging
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import talib
+except ImportError:
+    talib = None
+
+# 年化波动率使用的周期数
+ANNUALIZATION = 252
+# KDJ 的 K、D 初始值
+KDJ_SEED = 50.0
+
+# 当前使用的计算后端：'talib' 或 'numpy'
+BACKEND = 'numpy'
+
+
+def set_backend(name):
+    """切换计算后端，返回切换前的后端；TA-Lib 未安装时请求 talib 抛出 ValueError"""
+    global BACKEND
+    if name not in ('talib', 'numpy'):
+        raise ValueError(f"未知的指标计算后端: {name}")
+    if name == 'talib' and talib is None:
+        raise ValueError("TA-Lib 未安装")
+    previous, BACKEND = BACKEND, name
+    return previous
+
+
+def _use_talib():
+    return BACKEND == 'talib'
+
+
+def _c_array(values):
+    """TA-Lib 需要连续的 float64 数组"""
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+if talib is not None and os.getenv('INDICATOR_BACKEND', 'auto').lower() != 'numpy':
+    set_backend('talib')
+logging.getLogger(__name__).info(f"技术指标计算后端: {BACKEND}")
+
+
+def as_array(values):
+    """转换为 float64 数组（None 转为 NaN）"""
+    if isinstance(values, np.ndarray) and values.dtype == np.float64:
+        return values
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def ohlcv_from_klines(kline_data):
+    """将 [timestamp, open, high, low, close, volume] 列表转换为按列的数组"""
+    if not kline_data:
+        empty = np.empty(0, dtype=np.float64)
+        return {'timestamp': empty, 'open': empty, 'high': empty, 'low': empty, 'close': empty, 'volume': empty}
+    table = np.asarray(kline_data, dtype=np.float64)
+    return {
+        'timestamp': table[:, 0],
+        'open': table[:, 1],
+        'high': table[:, 2],
+        'low': table[:, 3],
+        'close': table[:, 4],
+        'volume': table[:, 5]
+    }
+
+
+def to_list(values, decimals=None):
+    """转换为JSON可用的列表，NaN 转为 None，可选保留小数位"""
+    if decimals is not None:
+        values = np.round(values, decimals)
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _nan_array(n):
+    return np.full(n, np.nan, dtype=np.float64)
+
+
+def _recursive_smooth(values, alpha, seed, start):
+    """
+    从 start 位置以 seed 为初值做指数平滑：s[i] = s[i-1] + alpha * (x[i] - s[i-1])
+    递推依赖前值，逐点计算（O(n)）
+    """
+    out = _nan_array(len(values))
+    if start >= len(values):
+        return out
+    out[start] = current = seed
+    for i, value in enumerate(values[start + 1:].tolist(), start + 1):
+        current += alpha * (value - current)
+        out[i] = current
+    return out
+
+
+# 前缀和分段计算的长度，每段单独去均值，限制累加误差
+PREFIX_CHUNK = 4096
+# 小于该长度的窗口直接按窗口求标准差（窗口很短时平方和相减的相对误差较大，且逐窗口计算本身是常数开销）
+DIRECT_STD_WINDOW = 16
+
+
+def _window_moments(values, period):
+    """
+    所有长度为 period 的窗口的均值和离差平方和（前缀和相减，O(n)）
+    按段计算，每段先减去段内均值再累加，避免价格量级较大或序列很长时的精度损失
+    """
+    count = len(values) - period + 1
+    means = np.empty(count, dtype=np.float64)
+    sq_devs = np.empty(count, dtype=np.float64)
+    step = max(PREFIX_CHUNK, period)
+    for first in range(0, count, step):
+        last = min(first + step, count)
+        segment = values[first:last + period - 1]
+        shift = segment.mean()
+        centered = segment - shift
+        csum = np.concatenate(([0.0], np.cumsum(centered)))
+        csum_sq = np.concatenate(([0.0], np.cumsum(centered * centered)))
+        window_sum = csum[period:] - csum[:-period]
+        window_sum_sq = csum_sq[period:] - csum_sq[:-period]
+        means[first:last] = shift + window_sum / period
+        # 低于前缀平方和舍入误差量级的离差视为0（常数窗口、负的舍入残差）
+        noise = 8 * np.finfo(np.float64).eps * csum_sq[-1]
+        segment_sq_devs = window_sum_sq - window_sum * window_sum / period
+        sq_devs[first:last] = np.where(segment_sq_devs > noise, segment_sq_devs, 0.0)
+    return means, sq_devs
+
+
+def sma(values, period):
+    """简单移动平均"""
+    values = as_array(values)
+    out = _nan_array(len(values))
+    if period <= 0 or len(values) < period:
+        return out
+    if _use_talib():
+        return talib.SMA(_c_array(values), timeperiod=period)
+    out[period - 1:] = _window_moments(values, period)[0]
+    return out
+
+
+def rolling_std(values, period, ddof=0):
+    """滚动标准差"""
+    values = as_array(values)
+    out = _nan_array(len(values))
+    if period <= ddof or len(values) < period:
+        return out
+    if period < DIRECT_STD_WINDOW:
+        out[period - 1:] = sliding_window_view(values, period).std(axis=1, ddof=ddof)
+    else:
+        out[period - 1:] = np.sqrt(_window_moments(values, period)[1] / (period - ddof))
+    return out
+
+
+def _rolling_extreme(values, period, accumulate, combine, fill):
+    """
+    van Herk / Gil-Werman 滚动极值：按 period 分块，块内前缀极值和后缀极值各扫描一次，
+    窗口 [i-period+1, i] 的极值 = 起点所在块的后缀极值 与 终点所在块的前缀极值 的较大（小）者
+    """
+    n = len(values)
+    out = _nan_array(n)
+    if period <= 0 or n < period:
+        return out
+    if period == 1:
+        return values.copy()
+
+    blocks = -(-n // period)
+    padded = np.full(blocks * period, fill, dtype=np.float64)
+    padded[:n] = values
+    padded = padded.reshape(blocks, period)
+    prefix = accumulate(padded, axis=1).ravel()
+    suffix = accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    out[period - 1:] = combine(suffix[:n - period + 1], prefix[period - 1:n])
+    return out
+
+
+def rolling_max(values, period):
+    """滚动最大值"""
+    values = as_array(values)
+    if _use_talib() and period > 1 and len(values) >= period:
+        return talib.MAX(_c_array(values), timeperiod=period)
+    return _rolling_extreme(values, period, np.maximum.accumulate, np.maximum, -np.inf)
+
+
+def rolling_min(values, period):
+    """滚动最小值"""
+    values = as_array(values)
+    if _use_talib() and period > 1 and len(values) >= period:
+        return talib.MIN(_c_array(values), timeperiod=period)
+    return _rolling_extreme(values, period, np.minimum.accumulate, np.minimum, np.inf)
+
+
+def ema(values, period, offset=0):
+    """
+    指数移动平均，以前 period 个值的简单平均为初值
+    offset 为序列开头需要跳过的预热位置数（如对 MACD 线再求 EMA）
+    """
+    values = as_array(values)
+    start = offset + period - 1
+    if period <= 0 or len(values) <= start:
+        return _nan_array(len(values))
+    if _use_talib() and period > 1:
+        out = _nan_array(len(values))
+        out[offset:] = talib.EMA(_c_array(values[offset:]), timeperiod=period)
+        return out
+    seed = values[offset:start + 1].mean()
+    return _recursive_smooth(values, 2.0 / (period + 1), seed, start)
+
+
+def rsi(close, period=14):
+    """相对强弱指数（Wilder 平滑）"""
+    close = as_array(close)
+    out = _nan_array(len(close))
+    if len(close) <= period:
+        return out
+
+    deltas = np.diff(close)
+    if _use_talib() and period > 1:
+        out = talib.RSI(_c_array(close), timeperiod=period)
+        # TA-Lib 在平均涨跌幅都为0（从头到此价格未变）时返回0，统一为100
+        moved = np.maximum.accumulate(deltas != 0)
+        out[period:][~moved[period - 1:]] = 100.0
+        return out
+
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+
+    # 平滑后的序列下标 i 对应收盘价下标 i+1
+    avg_gain = _recursive_smooth(gains, 1.0 / period, gains[:period].mean(), period - 1)[period - 1:]
+    avg_loss = _recursive_smooth(losses, 1.0 / period, losses[:period].mean(), period - 1)[period - 1:]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    out[period:] = np.where(avg_loss == 0, 100.0, values)
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD，返回 (MACD线, 信号线, 柱状图)"""
+    close = as_array(close)
+    macd_line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(macd_line, signal, offset=slow - 1)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def bollinger_bands(close, period=20, num_std=2):
+    """布林带，返回 (上轨, 中轨, 下轨)"""
+    close = as_array(close)
+    if _use_talib() and period > 1 and len(close) >= period:
+        return talib.BBANDS(_c_array(close), timeperiod=period, nbdevup=num_std, nbdevdn=num_std, matype=0)
+    middle = sma(close, period)
+    width = rolling_std(close, period) * num_std
+    return middle + width, middle, middle - width
+
+
+def volatility(close, period=20, annualization=ANNUALIZATION):
+    """年化波动率（小数），基于最近 period 个简单收益率"""
+    close = as_array(close)
+    out = _nan_array(len(close))
+    if len(close) <= period:
+        return out
+    returns = close[1:] / close[:-1] - 1.0
+    out[1:] = rolling_std(returns, period, ddof=1) * np.sqrt(annualization)
+    return out
+
+
+def kdj(high, low, close, period=9, k_smooth=3, d_smooth=3):
+    """KDJ随机指标，返回 (K, D, J)"""
+    high, low, close = as_array(high), as_array(low), as_array(close)
+    n = len(close)
+    if n < period:
+        return _nan_array(n), _nan_array(n), _nan_array(n)
+
+    highest = rolling_max(high, period)
+    lowest = rolling_min(low, period)
+    span = highest - lowest
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = np.where(span == 0, 50.0, (close - lowest) / span * 100.0)
+
+    # 初值 50 视为第一根有效K线之前的 K、D
+    start = period - 1
+    k = _recursive_smooth(rsv, 1.0 / k_smooth, KDJ_SEED + (rsv[start] - KDJ_SEED) / k_smooth, start)
+    d = _recursive_smooth(k, 1.0 / d_smooth, KDJ_SEED + (k[start] - KDJ_SEED) / d_smooth, start)
+    return k, d, 3 * k - 2 * d
@@ -1,13 +1,164 @@
 from flask import Flask, jsonify, request
-import pandas as pd
-import numpy as np
 import json
 import os
 import glob
 import logging
 from datetime import datetime, timedelta
-from crypto_db import CryptoDatabase
-from timestamp_manager import get_timestamp_manager, get_unified_timestamp, get_unified_datetime, get_unified_iso
+from crypto_db import CryptoDatabase, INDICATOR_COLUMNS
+from timestamp_manager import get_timestamp_manager, get_unified_datetime, get_unified_iso
+from simple_redis_manager import cache_result
+import numpy as np
+import indicators
+import resample
+from indicator_stream import IndicatorStateStore, IndicatorStream
+from kline_segments import get_segment_reader
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 增量指标状态不存在时，用于重建的历史K线条数
+INDICATOR_HISTORY = 200
+
+# 可选指标及默认参数（顺序即规范化后的指标描述顺序）
+INDICATOR_DEFAULTS = {
+    'ma': (5, 10, 20),
+    'rsi': (14,),
+    'macd': (12, 26, 9),
+    'bollinger': (20, 2),
+    'volatility': (20,),
+    'kdj': (9, 3, 3)
+}
+# indicator_data 表中已存储的指标参数，请求的参数在此范围内时可直接读取
+STORED_INDICATORS = dict(INDICATOR_DEFAULTS, ma=(5, 10, 20, 50))
+# 周期参数上限，MA 最多的周期个数
+MAX_INDICATOR_PERIOD = 500
+MAX_MA_PERIODS = 8
+
+
+def format_indicator_spec(spec):
+    """指标描述规范化为字符串，如 ma:5,10,20|rsi:14（作为缓存键的一部分）"""
+    return '|'.join(
+        f"{name}:{','.join(format(value, 'g') for value in spec[name])}"
+        for name in INDICATOR_DEFAULTS if name in spec
+    )
+
+
+def parse_indicator_spec_string(spec_string):
+    """format_indicator_spec 的逆操作"""
+    spec = {}
+    for part in spec_string.split('|') if spec_string else []:
+        name, _, values = part.partition(':')
+        spec[name] = tuple(float(value) if '.' in value else int(value) for value in values.split(','))
+    return spec
+
+
+def _parse_params(name, raw):
+    """解析单个指标的参数，非法时抛出 ValueError"""
+    try:
+        values = [float(value) for value in raw.split(',') if value.strip()]
+    except ValueError:
+        raise ValueError(f"指标 {name} 的参数不是数字: {raw}")
+    
+    expected = {'rsi': (1, 1), 'macd': (3, 3), 'bollinger': (1, 2), 'volatility': (1, 1),
+                'kdj': (1, 3), 'ma': (1, MAX_MA_PERIODS)}[name]
+    if not expected[0] <= len(values) <= expected[1]:
+        raise ValueError(f"指标 {name} 的参数个数应为 {expected[0]}-{expected[1]} 个")
+    
+    # 缺省的参数使用默认值（如 bollinger=30 表示周期30、2倍标准差）
+    if name != 'ma':
+        values += [float(value) for value in INDICATOR_DEFAULTS[name][len(values):]]
+    
+    params = []
+    for index, value in enumerate(values):
+        if name == 'bollinger' and index == 1:
+            if not 0 < value <= 10:
+                raise ValueError(f"布林带标准差倍数超出范围: {raw}")
+            params.append(int(value) if value.is_integer() else value)
+            continue
+        if not value.is_integer() or not 1 <= value <= MAX_INDICATOR_PERIOD:
+            raise ValueError(f"指标 {name} 的周期应为 1-{MAX_INDICATOR_PERIOD} 的整数: {raw}")
+        params.append(int(value))
+    
+    if name == 'ma':
+        params = sorted(set(params))
+    if name == 'macd' and params[0] >= params[1]:
+        raise ValueError(f"MACD 快线周期应小于慢线周期: {raw}")
+    return tuple(params)
+
+
+def parse_indicator_spec(args):
+    """
+    从请求参数解析指标描述，返回规范化字符串
+    indicators=ma,rsi 选择指标（缺省为全部），ma=7,25,99 / rsi=14 等覆盖默认参数，非法时抛出 ValueError
+    """
+    names = args.get('indicators')
+    if names:
+        selected = {name.strip().lower() for name in names.split(',') if name.strip()}
+        unknown = selected - set(INDICATOR_DEFAULTS)
+        if unknown:
+            raise ValueError(f"不支持的指标: {', '.join(sorted(unknown))}")
+    else:
+        selected = set(INDICATOR_DEFAULTS)
+    
+    spec = {}
+    for name in selected:
+        raw = args.get(name)
+        spec[name] = _parse_params(name, raw) if raw else INDICATOR_DEFAULTS[name]
+    return format_indicator_spec(spec)
+
+
+# 默认指标描述（/api/kline_data 不带指标参数时）
+DEFAULT_INDICATOR_SPEC = format_indicator_spec(INDICATOR_DEFAULTS)
+
+
+def selected_indicator_columns(selected):
+    """选择的指标对应的列名（与 indicator_data 表一致）"""
+    columns = [f"ma{period}" for period in selected.get('ma', ())]
+    if 'rsi' in selected:
+        columns.append('rsi')
+    if 'macd' in selected:
+        columns += ['macd', 'macd_signal', 'macd_hist']
+    if 'bollinger' in selected:
+        columns += ['bb_upper', 'bb_middle', 'bb_lower']
+    if 'volatility' in selected:
+        columns.append('volatility')
+    if 'kdj' in selected:
+        columns += ['kdj_k', 'kdj_d', 'kdj_j']
+    return columns
+
+
+# 列式格式中与默认格式字段名不同的列
+COLUMNAR_NAMES = {
+    'macd': 'macd_line',
+    'macd_signal': 'signal_line',
+    'bb_upper': 'bollinger_upper',
+    'bb_middle': 'bollinger_middle',
+    'bb_lower': 'bollinger_lower'
+}
+# 列式格式支持的数值类型
+COLUMNAR_DTYPES = ('float64', 'float32')
+
+
+def dumps_columnar(data):
+    """列式数据编码为JSON文本：有 orjson 时直接序列化 NumPy 数组（NaN 为 null），否则转为列表后用 json"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    
+    def plain(value):
+        if isinstance(value, np.ndarray):
+            if value.dtype.kind == 'i':
+                return value.tolist()
+            if value.dtype == np.float32:
+                # float32 直接转 float 会展开成 123.44999694824219，按 float32 的最短表示转回
+                return [None if text == 'nan' else float(text) for text in value.astype(str).tolist()]
+            return indicators.to_list(value)
+        if isinstance(value, dict):
+            return {key: plain(item) for key, item in value.items()}
+        return value
+    
+    return json.dumps(plain(data), ensure_ascii=False, separators=(',', ':'))
 
 class KlineBackend:
     """K线数据后端处理类 - 只从数据库获取真实数据"""
@@ -16,6 +167,7 @@ class KlineBackend:
         self.logger = logging.getLogger(__name__)
         self.db = CryptoDatabase()
         self.timestamp_manager = get_timestamp_manager()
+        self.indicator_store = None
     
     def get_database_kline_data(self, symbol, timeframe, limit=100):
         """从数据库获取K线数据"""
@@ -24,35 +176,13 @@ class KlineBackend:
             return []
         
         try:
-            # 从数据库获取历史数据
-            data = self.db.get_historical_data(timeframe, symbol, limit)
-            if not data:
+            # 从数据库获取数值K线（非数据表粒度从更细的表重采样）
+            table = resample.load_kline_table(self.db, timeframe, symbol, limit)
+            if not len(table):
                 self.logger.warning(f"数据库中没有找到 {symbol} 的 {timeframe} 级数据")
                 return []
             
-            # 转换为K线格式 [timestamp, open, high, low, close, volume]
-            kline_data = []
-            for item in data:
-                symbol_db, date, open_price, high_price, low_price, close_price, volume = item
-                # 使用统一的时间戳管理器转换日期为时间戳（毫秒）
-                try:
-                    unified_date = self.timestamp_manager.ensure_utc(date)
-                    timestamp = self.timestamp_manager.to_timestamp(unified_date)
-                except Exception as e:
-                    self.logger.warning(f"时间戳转换失败，使用当前时间: {e}")
-                    timestamp = get_unified_timestamp()
-                
-                kline_data.append([
-                    timestamp,
-                    float(open_price),
-                    float(high_price),
-                    float(low_price),
-                    float(close_price),
-                    float(volume)
-                ])
-            
-            # 按时间排序
-            kline_data.sort(key=lambda x: x[0])
+            kline_data = resample.table_to_kline(table)
             
             self.logger.info(f"成功从数据库获取 {symbol} 的 {timeframe} 级K线数据，共 {len(kline_data)} 条")
             return kline_data
@@ -62,248 +192,202 @@ class KlineBackend:
             return []
         finally:
             self.db.disconnect()
-    def calculate_ma(self, data, period):
-        """计算移动平均线"""
-        close_prices = [d[4] for d in data]
-        ma_values = []
-        
-        for i in range(len(close_prices)):
-            if i < period - 1:
-                ma_values.append(None)
-            else:
-                ma = sum(close_prices[i-period+1:i+1]) / period
-                ma_values.append(round(ma, 2))
+    
+    @staticmethod
+    def is_stored_spec(selected):
+        """请求的指标参数是否都在 indicator_data 已存储的范围内"""
+        for name, params in selected.items():
+            if name == 'ma':
+                if not set(params) <= set(STORED_INDICATORS['ma']):
+                    return False
+            elif params != STORED_INDICATORS[name]:
+                return False
+        return True
+    
+    def get_stored_kline_columns(self, symbol, timeframe, limit, selected):
+        """
+        从数据库读取K线并关联 indicator_data 中入库时算好的指标
+        返回 (K线, 指标列)；有K线缺少指标行或请求的参数未存储时指标列为None（由调用方现算），
+        查询失败时K线为空
+        """
+        if not self.db.connect():
+            self.logger.error("数据库连接失败")
+            return [], None
         
-        return ma_values
+        try:
+            rows = self.db.get_historical_data_with_indicators(timeframe, symbol, limit)
+            return self.stored_kline_columns_from_rows(rows, symbol, timeframe, selected)
+        except Exception as e:
+            self.logger.error(f"读取已存储的技术指标时出错: {str(e)}")
+            return [], None
+        finally:
+            self.db.disconnect()
     
-    def calculate_rsi(self, data, period=14):
-        """计算RSI相对强弱指数"""
-        close_prices = np.array([d[4] for d in data])
-        deltas = np.diff(close_prices)
+    def stored_kline_columns_from_rows(self, rows, symbol, timeframe, selected):
+        """get_historical_data_with_indicators 的行转换为 (K线, 指标列)，规则同 get_stored_kline_columns"""
+        if not rows:
+            return [], None
         
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
+        # 查询按时间倒序，反转后K线与指标逐行对应（NULL 指标为 NaN）
+        table = np.array(rows, dtype=np.float64)[::-1]
+        kline_data = resample.table_to_kline(table[:, :6])
+        if not self.is_stored_spec(selected):
+            return kline_data, None
+        if not table[:, 6].all():
+            self.logger.info(f"{symbol} 的 {timeframe} 级K线缺少已存储的指标，改为实时计算")
+            return kline_data, None
         
-        rsi_values = [None] * period  # 前period个值为None
+        columns = {name: table[:, 7 + index] for index, name in enumerate(INDICATOR_COLUMNS)}
+        return kline_data, columns
+    
+    def load_kline_file(self, symbol, timeframe):
+        """从旧版的K线JSON快照读取数据（数据库和分段存储都没有数据时使用）"""
+        # 获取项目根目录路径
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        project_root = os.path.dirname(current_dir)
+        data_dir = os.path.join(project_root, 'data', 'kline_data')
         
-        # 计算初始平均收益和损失
-        avg_gain = np.mean(gains[:period])
-        avg_loss = np.mean(losses[:period])
+        pattern = os.path.join(data_dir, f"{symbol.upper()}_{timeframe}_kline_*.json")
+        matching_files = glob.glob(pattern)
+        if not matching_files:
+            return []
         
-        if avg_loss == 0:
-            rsi_values.append(100)
-        else:
-            rs = avg_gain / avg_loss
-            rsi = 100 - (100 / (1 + rs))
-            rsi_values.append(round(rsi, 2))
+        # 使用最新的文件
+        latest_file = sorted(matching_files)[-1]
+        with open(latest_file, 'r', encoding='utf-8') as f:
+            file_data = json.load(f)
         
-        # 计算后续RSI值
-        for i in range(period + 1, len(close_prices)):
-            avg_gain = (avg_gain * (period - 1) + gains[i-1]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i-1]) / period
-            
-            if avg_loss == 0:
-                rsi_values.append(100)
+        # 转换为标准格式
+        kline_data = []
+        for item in file_data.get('kline_data', []):
+            if isinstance(item, dict):
+                # 如果是字典格式，转换为数组格式
+                try:
+                    # 使用统一的时间戳管理器处理时间戳
+                    if 'timestamp_ms' in item:
+                        timestamp = item['timestamp_ms']
+                    else:
+                        unified_date = self.timestamp_manager.parse_datetime(item['date'])
+                        timestamp = self.timestamp_manager.to_timestamp(unified_date)
+                    
+                    kline_data.append([
+                        timestamp,
+                        item['open'],
+                        item['high'],
+                        item['low'],
+                        item['close'],
+                        item.get('volume', 0)
+                    ])
+                except Exception as e:
+                    self.logger.warning(f"处理文件数据时间戳失败: {e}")
+                    continue
             else:
-                rs = avg_gain / avg_loss
-                rsi = 100 - (100 / (1 + rs))
-                rsi_values.append(round(rsi, 2))
-        
-        return rsi_values
+                # 如果已经是数组格式，直接使用
+                kline_data.append(item)
+        return kline_data
     
-    def calculate_macd(self, data, short_period=12, long_period=26, signal_period=9):
-        """计算MACD指标"""
-        close_prices = pd.Series([d[4] for d in data])
-        
-        # 计算EMA
-        ema_short = close_prices.ewm(span=short_period, adjust=False).mean()
-        ema_long = close_prices.ewm(span=long_period, adjust=False).mean()
+    def load_kline_columns(self, symbol, timeframe, limit=100, spec=DEFAULT_INDICATOR_SPEC):
+        """
+        读取最近 limit 条K线和 spec 选择的指标列（NumPy 数组），返回 (K线, 指标列, 选择的指标)
+        优先使用入库时已算好的指标，缺失时用同一批K线现算；数据库和文件中都没有数据时K线为空
+        """
+        selected = parse_indicator_spec_string(spec)
+        kline_data, columns = self.get_stored_kline_columns(symbol, timeframe, limit, selected)
+        if columns is not None:
+            return kline_data, columns, selected
         
-        # MACD线
-        macd_line = ema_short - ema_long
-        
-        # 信号线
-        signal_line = macd_line.ewm(span=signal_period, adjust=False).mean()
-        
-        # MACD柱状图
-        macd_hist = macd_line - signal_line
+        # 关联查询失败时直接从数据库获取K线，数据库没有数据时依次尝试K线分段存储（内存映射）和旧版JSON快照
+        if not kline_data:
+            kline_data = self.get_database_kline_data(symbol, timeframe, limit)
+        if not kline_data:
+            kline_data = get_segment_reader().load_kline(symbol, timeframe, limit)
+        if not kline_data:
+            kline_data = self.load_kline_file(symbol, timeframe)
+        if not kline_data:
+            self.logger.error(f"无法获取{symbol}的{timeframe}数据：数据库和文件中都没有数据")
+            return [], {}, selected
         
-        return (
-            [round(x, 4) for x in macd_line.tolist()],
-            [round(x, 4) for x in signal_line.tolist()],
-            [round(x, 4) for x in macd_hist.tolist()]
-        )
+        kline_data = kline_data[-limit:]
+        return kline_data, self.compute_indicator_columns(kline_data, selected), selected
     
-    def calculate_bollinger_bands(self, data, period=20, std_dev=2):
-        """计算布林带"""
-        close_prices = pd.Series([d[4] for d in data])
-        
-        # 中轨（移动平均线）
-        middle = close_prices.rolling(window=period).mean()
-        
-        # 标准差
-        std = close_prices.rolling(window=period).std()
-        
-        # 上轨和下轨
-        upper = middle + (std * std_dev)
-        lower = middle - (std * std_dev)
+    def probe_latest_candle(self, symbol, timeframe):
+        """
+        读取源数据表中最新一根K线 [timestamp, open, high, low, close, volume]，作为指标结果的缓存版本
+        只查一行（走 symbol+date 索引）；当前K线在周期内会被原地更新，所以带上价格而不只是时间戳
+        数据库不可用或没有数据时返回None
+        """
+        if not self.db.connect():
+            return None
         
-        return {
-            'upper': [round(x, 2) if not pd.isna(x) else None for x in upper.tolist()],
-            'middle': [round(x, 2) if not pd.isna(x) else None for x in middle.tolist()],
-            'lower': [round(x, 2) if not pd.isna(x) else None for x in lower.tolist()]
-        }
+        try:
+            rows = self.db.get_kline_rows(resample.base_timeframe(timeframe), symbol, 1)
+            return list(rows[0]) if rows else None
+        except Exception as e:
+            self.logger.warning(f"读取 {symbol} 的 {timeframe} 级最新K线失败: {str(e)}")
+            return None
+        finally:
+            self.db.disconnect()
     
-    def calculate_kdj(self, data, period=9, k_period=3, d_period=3):
-        """计算KDJ指标"""
-        high_prices = [d[2] for d in data]
-        low_prices = [d[3] for d in data]
-        close_prices = [d[4] for d in data]
-        
-        k_values = []
-        d_values = []
-        j_values = []
-        
-        for i in range(len(data)):
-            if i < period - 1:
-                k_values.append(None)
-                d_values.append(None)
-                j_values.append(None)
-            else:
-                # 计算RSV
-                period_high = max(high_prices[i-period+1:i+1])
-                period_low = min(low_prices[i-period+1:i+1])
-                
-                if period_high == period_low:
-                    rsv = 50
-                else:
-                    rsv = (close_prices[i] - period_low) / (period_high - period_low) * 100
-                
-                # 计算K值
-                if i == period - 1:
-                    k = rsv
-                else:
-                    k = (k_values[i-1] * (k_period - 1) + rsv) / k_period if k_values[i-1] is not None else rsv
-                
-                k_values.append(round(k, 2))
-                
-                # 计算D值
-                if i == period - 1:
-                    d = k
-                else:
-                    d = (d_values[i-1] * (d_period - 1) + k) / d_period if d_values[i-1] is not None else k
-                
-                d_values.append(round(d, 2))
-                
-                # 计算J值
-                j = 3 * k - 2 * d
-                j_values.append(round(j, 2))
-        
-        return {'k': k_values, 'd': d_values, 'j': j_values}
+    def get_kline_data_with_indicators(self, symbol='BTC', timeframe='hour', limit=100,
+                                       spec=DEFAULT_INDICATOR_SPEC):
+        """
+        获取K线数据和技术指标 - 只从数据库获取真实数据
+        先探测最新K线，没有新K线时直接返回按 (币种, 粒度, 条数, 指标, 最新K线) 缓存的结果，不再查询和计算
+        """
+        latest = self.probe_latest_candle(symbol, timeframe)
+        return self.compute_kline_payload(symbol, timeframe, limit, spec, latest)
     
-    def calculate_volatility(self, data, period=20):
-        """计算波动率"""
-        close_prices = pd.Series([d[4] for d in data])
-        returns = close_prices.pct_change()
-        volatility = returns.rolling(window=period).std() * np.sqrt(252) * 100  # 年化波动率
-        
-        return [round(x, 2) if not pd.isna(x) else None for x in volatility.tolist()]
+    def kline_cache_entries(self, timeframe, symbols, limit=100, spec=DEFAULT_INDICATOR_SPEC, connection=None):
+        """
+        缓存预热用的批量写入条目，返回 {symbol: 条目}（没有数据的币种不包含在内），只支持数据表粒度
+        所有币种的K线和已存储指标一次关联查询读取；每个币种的最新一行就是 probe_latest_candle 的结果（同一张表、同样的数值转换），
+        键和数据与 get_kline_data_with_indicators 未命中时一致
+        """
+        selected = parse_indicator_spec_string(spec)
+        grouped = self.db.get_historical_data_with_indicators_batch(timeframe, symbols, limit, connection=connection)
+        cached = KlineBackend.compute_kline_payload
+        entries = {}
+        for symbol, rows in grouped.items():
+            if not rows:
+                continue
+            latest = list(rows[0][:6])
+            kline_data, columns = self.stored_kline_columns_from_rows(rows, symbol, timeframe, selected)
+            if columns is None:
+                columns = self.compute_indicator_columns(kline_data, selected)
+            entries[symbol] = {
+                'key': cached.cache_key(self, symbol, timeframe, limit, spec, latest),
+                'data': self.format_kline_payload(kline_data, columns, selected),
+                'ttl': cached.cache_expire,
+                'stale_ttl': cached.cache_stale_ttl
+            }
+        return entries
+    
+    def get_kline_columnar(self, symbol='BTC', timeframe='hour', limit=100, spec=DEFAULT_INDICATOR_SPEC,
+                           dtype='float64'):
+        """列式格式的K线和技术指标（缓存方式同 get_kline_data_with_indicators）"""
+        latest = self.probe_latest_candle(symbol, timeframe)
+        return self.compute_kline_columnar(symbol, timeframe, limit, spec, dtype, latest)
     
-    def get_kline_data_with_indicators(self, symbol='BTC', timeframe='hour', limit=100):
-        """获取K线数据和技术指标 - 只从数据库获取真实数据"""
+    # 缓存键包含最新K线，数据不变时结果不变，可以长时间缓存
+    @cache_result(expire=600, namespace='kline_indicators', local_ttl=60,
+                  cache_if=lambda result: bool(result and result.get('kline')))
+    def compute_kline_payload(self, symbol, timeframe, limit, spec, latest):
+        """
+        读取K线并计算技术指标（默认格式）
+        spec 为 parse_indicator_spec 返回的规范化指标描述，latest 为 probe_latest_candle 的结果，二者都是缓存键的一部分
+        """
         try:
-            # 首先尝试从数据库直接获取数据
-            kline_data = self.get_database_kline_data(symbol, timeframe, limit)
+            kline_data, columns, selected = self.load_kline_columns(symbol, timeframe, limit, spec)
             
-            # 如果数据库没有数据，尝试从处理过的文件读取
-            if not kline_data:
-                # 获取项目根目录路径
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                project_root = os.path.dirname(current_dir)
-                data_dir = os.path.join(project_root, 'data', 'kline_data')
-                
-                pattern = os.path.join(data_dir, f"{symbol.upper()}_{timeframe}_kline_*.json")
-                matching_files = glob.glob(pattern)
-                
-                if matching_files:
-                    # 使用最新的文件
-                    latest_file = sorted(matching_files)[-1]
-                    with open(latest_file, 'r', encoding='utf-8') as f:
-                        file_data = json.load(f)
-                    
-                    # 转换为标准格式
-                    kline_data = []
-                    for item in file_data.get('kline_data', []):
-                        if isinstance(item, dict):
-                            # 如果是字典格式，转换为数组格式
-                            try:
-                                # 使用统一的时间戳管理器处理时间戳
-                                if 'timestamp_ms' in item:
-                                    timestamp = item['timestamp_ms']
-                                else:
-                                    unified_date = self.timestamp_manager.parse_datetime(item['date'])
-                                    timestamp = self.timestamp_manager.to_timestamp(unified_date)
-                                
-                                kline_data.append([
-                                    timestamp,
-                                    item['open'],
-                                    item['high'],
-                                    item['low'],
-                                    item['close'],
-                                    item.get('volume', 0)
-                                ])
-                            except Exception as e:
-                                self.logger.warning(f"处理文件数据时间戳失败: {e}")
-                                continue
-                        else:
-                            # 如果已经是数组格式，直接使用
-                            kline_data.append(item)
-                else:
-                    # 如果没有任何数据源，返回空结果
-                    self.logger.error(f"无法获取{symbol}的{timeframe}数据：数据库和文件中都没有数据")
-                    return {
-                        'kline': [],
-                        'indicators': {},
-                        'error': f'没有找到{symbol}的{timeframe}级数据'
-                    }
             # 如果没有数据，返回空结果
             if not kline_data:
-                self.logger.error(f"无法获取{symbol}的{timeframe}数据")
                 return {
                     'kline': [],
                     'indicators': {},
                     'error': f'没有找到{symbol}的{timeframe}级数据'
                 }
             
-            # 限制数据量
-            if len(kline_data) > limit:
-                kline_data = kline_data[-limit:]
-            
-            # 计算技术指标
-            ma5 = self.calculate_ma(kline_data, 5)
-            ma10 = self.calculate_ma(kline_data, 10)
-            ma20 = self.calculate_ma(kline_data, 20)
-            rsi = self.calculate_rsi(kline_data)
-            macd_line, signal_line, macd_hist = self.calculate_macd(kline_data)
-            bollinger = self.calculate_bollinger_bands(kline_data)
-            volatility = self.calculate_volatility(kline_data)
-            kdj = self.calculate_kdj(kline_data)
-            
-            return {
-                'kline': kline_data,
-                'indicators': {
-                    'ma5': ma5,
-                    'ma10': ma10,
-                    'ma20': ma20,
-                    'rsi': rsi,
-                    'macd_line': macd_line,
-                    'signal_line': signal_line,
-                    'macd_hist': macd_hist,
-                    'bollinger': bollinger,
-                    'volatility': volatility,
-                    'kdj': kdj
-                }
-            }
+            return self.format_kline_payload(kline_data, columns, selected)
             
         except Exception as e:
             self.logger.error(f"获取K线数据时出错: {str(e)}")
@@ -312,6 +396,128 @@ class KlineBackend:
                 'indicators': {},
                 'error': f'获取数据时出错: {str(e)}'
             }
+    
+    @cache_result(expire=600, namespace='kline_columnar', local_ttl=60,
+                  cache_if=lambda result: bool(result and result.get('length')))
+    def compute_kline_columnar(self, symbol, timeframe, limit, spec, dtype, latest):
+        """
+        列式格式的K线和技术指标，返回 {'length': 条数, 'body': 已编码的JSON文本}
+        缓存编码后的文本，命中时不再序列化
+        """
+        try:
+            kline_data, columns, selected = self.load_kline_columns(symbol, timeframe, limit, spec)
+            if not kline_data:
+                data = {'format': 'columnar', 'length': 0, 'columns': {}, 'offsets': {},
+                        'error': f'没有找到{symbol}的{timeframe}级数据'}
+            else:
+                data = self.build_columnar_payload(kline_data, columns, selected, dtype)
+            return {'length': data['length'], 'body': dumps_columnar(data)}
+            
+        except Exception as e:
+            self.logger.error(f"获取列式K线数据时出错: {str(e)}")
+            return {'length': 0, 'body': dumps_columnar({'format': 'columnar', 'length': 0, 'columns': {},
+                                                          'offsets': {}, 'error': f'获取数据时出错: {str(e)}'})}
+    
+    def get_latest_indicators(self, symbol='BTC', timeframe='hour'):
+        """
+        获取最新一根K线的技术指标（读取增量状态，不重算整段序列）
+        重采样周期没有随入库推进的状态，从重采样历史计算；不支持的周期抛出 ValueError
+        """
+        timeframe = resample.normalize_timeframe(timeframe)
+        history_loader = lambda: self.get_database_kline_data(symbol, timeframe, INDICATOR_HISTORY)
+        if not resample.is_native(timeframe):
+            # 保存状态会停在首次请求时的快照，这里每次按最新数据重算
+            stream = IndicatorStream()
+            stream.update_many(history_loader())
+            if stream.last_ts is None:
+                return None
+            return dict(stream.latest, timestamp=stream.last_ts, bars=stream.count)
+        
+        if self.indicator_store is None:
+            self.indicator_store = IndicatorStateStore()
+        return self.indicator_store.latest(symbol.upper(), timeframe, history_loader=history_loader)
+    
+    def compute_indicator_columns(self, kline_data, selected):
+        """计算选择的指标，返回 {列名: 数组}（列名与 indicator_data 表一致）"""
+        # 只计算请求的指标（与K线批处理共用 indicators 模块）
+        ohlcv = indicators.ohlcv_from_klines(kline_data)
+        close = ohlcv['close']
+        columns = {}
+        for period in selected.get('ma', ()):
+            columns[f"ma{period}"] = indicators.sma(close, period)
+        if 'rsi' in selected:
+            columns['rsi'] = indicators.rsi(close, *selected['rsi'])
+        if 'macd' in selected:
+            columns['macd'], columns['macd_signal'], columns['macd_hist'] = indicators.macd(close, *selected['macd'])
+        if 'bollinger' in selected:
+            columns['bb_upper'], columns['bb_middle'], columns['bb_lower'] = \
+                indicators.bollinger_bands(close, *selected['bollinger'])
+        if 'volatility' in selected:
+            columns['volatility'] = indicators.volatility(close, *selected['volatility'])
+        if 'kdj' in selected:
+            columns['kdj_k'], columns['kdj_d'], columns['kdj_j'] = \
+                indicators.kdj(ohlcv['high'], ohlcv['low'], close, *selected['kdj'])
+        return columns
+    
+    def build_columnar_payload(self, kline_data, columns, selected, dtype='float64'):
+        """
+        列式格式：每个字段一个数组，指标按列一次舍入到与默认格式相同的小数位（不逐值调用 round）
+        指标开头的预热期（NaN）不输出，只在 offsets 中记录一次起始位置；其余 NaN 编码为 null
+        """
+        ohlcv = indicators.ohlcv_from_klines(kline_data)
+        output = {'timestamp': ohlcv['timestamp'].astype(np.int64)}
+        for name in ('open', 'high', 'low', 'close', 'volume'):
+            output[name] = ohlcv[name].astype(dtype)
+        
+        offsets = {}
+        for column in selected_indicator_columns(selected):
+            values = columns[column] * 100 if column == 'volatility' else columns[column]
+            values = np.round(values, 4 if column.startswith('macd') else 2)
+            valid = np.flatnonzero(~np.isnan(values))
+            start = int(valid[0]) if len(valid) else len(values)
+            if start:
+                offsets[COLUMNAR_NAMES.get(column, column)] = start
+            output[COLUMNAR_NAMES.get(column, column)] = values[start:].astype(dtype)
+        
+        return {
+            'format': 'columnar',
+            'dtype': dtype,
+            'length': len(kline_data),
+            'columns': output,
+            'offsets': offsets
+        }
+    
+    def format_kline_payload(self, kline_data, columns, selected):
+        """按接口格式输出K线和选择的指标（列名与 indicator_data 表一致）"""
+        payload = {}
+        for period in selected.get('ma', ()):
+            payload[f"ma{period}"] = indicators.to_list(columns[f"ma{period}"], 2)
+        if 'rsi' in selected:
+            payload['rsi'] = indicators.to_list(columns['rsi'], 2)
+        if 'macd' in selected:
+            payload['macd_line'] = indicators.to_list(columns['macd'], 4)
+            payload['signal_line'] = indicators.to_list(columns['macd_signal'], 4)
+            payload['macd_hist'] = indicators.to_list(columns['macd_hist'], 4)
+        if 'bollinger' in selected:
+            payload['bollinger'] = {
+                'upper': indicators.to_list(columns['bb_upper'], 2),
+                'middle': indicators.to_list(columns['bb_middle'], 2),
+                'lower': indicators.to_list(columns['bb_lower'], 2)
+            }
+        if 'volatility' in selected:
+            # 年化波动率，百分比
+            payload['volatility'] = indicators.to_list(columns['volatility'] * 100, 2)
+        if 'kdj' in selected:
+            payload['kdj'] = {
+                'k': indicators.to_list(columns['kdj_k'], 2),
+                'd': indicators.to_list(columns['kdj_d'], 2),
+                'j': indicators.to_list(columns['kdj_j'], 2)
+            }
+        
+        return {
+            'kline': kline_data,
+            'indicators': payload
+        }
 
 # 创建全局实例
 kline_backend = KlineBackend()
\ No newline at end of file
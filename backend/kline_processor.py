@@ -1,10 +1,13 @@
-import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import logging
 import os
 import json
+import numpy as np
 from crypto_db import CryptoDatabase
+from kline_segments import get_segment_store, series_name
+import indicators
 
 # 配置日志
 logging.basicConfig(
@@ -16,16 +19,108 @@ logging.basicConfig(
     ]
 )
 
+# 默认处理的币种（crypto_info 中没有登记时使用）和时间粒度
+DEFAULT_SYMBOLS = ['BTC', 'ETH']
+TIMEFRAMES = ['minute', 'hour', 'day']
+# 并行计算指标的进程数（默认CPU核数），任务数少于 PARALLEL_MIN_JOBS 时在当前进程内计算
+KLINE_WORKERS = int(os.getenv('KLINE_WORKERS', '0')) or os.cpu_count() or 1
+PARALLEL_MIN_JOBS = 8
+# 批量读取K线时每次查询的币种数
+BATCH_QUERY_SYMBOLS = 50
+# 计算指标所需的最少K线条数
+MIN_INDICATOR_BARS = 20
+# 判断序列是否变化时读取的最近K线条数（最后一根会被原地更新，之前的K线也可能被补录）
+FINGERPRINT_TAIL = 3
+FINGERPRINT_FILE = 'fingerprints.json'
+# 是否继续为每次运行写入完整的JSON快照（K线分段存储之外）
+KLINE_JSON_SNAPSHOTS = os.getenv('KLINE_JSON_SNAPSHOTS', 'false').lower() not in ('0', 'false', 'no', 'off')
+# JSON快照输出目录（项目根目录下的 data/kline_data）
+KLINE_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'kline_data')
+# 早期版本从 backend/ 目录运行时按相对路径写出的快照目录
+LEGACY_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'kline_data')
+
+
+def compute_indicator_arrays(highs, lows, closes, volumes):
+    """计算全部技术指标，输入输出均为 NumPy 数组（与 /api/kline_data 共用 indicators 模块）"""
+    result = {}
+    
+    # 移动平均线
+    result['ma5'] = indicators.sma(closes, 5)
+    result['ma10'] = indicators.sma(closes, 10)
+    result['ma20'] = indicators.sma(closes, 20)
+    result['ma50'] = indicators.sma(closes, 50)
+    
+    # RSI
+    result['rsi'] = indicators.rsi(closes, 14)
+    
+    # MACD
+    result['macd'], result['signal'], result['histogram'] = indicators.macd(closes, 12, 26, 9)
+    
+    # 布林带
+    result['bb_upper'], result['bb_middle'], result['bb_lower'] = indicators.bollinger_bands(closes, 20, 2)
+    
+    # 成交量指标
+    result['volume_ma'] = indicators.sma(volumes, 20)
+    
+    # 波动率
+    result['volatility'] = indicators.volatility(closes, 20)
+    
+    # KDJ指标
+    result['k'], result['d'], result['j'] = indicators.kdj(highs, lows, closes, 9, 3, 3)
+    
+    return result
+
+
+def kline_document(symbol, timeframe, timestamp, kline_data, indicator_lists=None):
+    """K线文件的内容"""
+    return {
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'timestamp': timestamp,
+        'data_count': len(kline_data),
+        'kline_data': kline_data,
+        'technical_indicators': indicator_lists or {}
+    }
+
+
+def indicator_job(job):
+    """
+    进程池任务：job 为 (symbol, timeframe, timestamp, dates, table, json_snapshot)，
+    dates 为 datetime64 数组，table 为 (n, 5) 的 open/high/low/close/volume 数组（均按时间升序）
+    在子进程内计算指标，json_snapshot 为真时同时序列化K线文件内容
+    返回 (symbol, timeframe, 条数, 指标数组, JSON文本)，出错时指标数组为None
+    """
+    symbol, timeframe, timestamp, dates, table, json_snapshot = job
+    try:
+        arrays = {}
+        if len(table) >= MIN_INDICATOR_BARS:
+            arrays = compute_indicator_arrays(table[:, 1], table[:, 2], table[:, 3], table[:, 4])
+        if not json_snapshot:
+            return symbol, timeframe, len(table), arrays, None
+        
+        indicator_lists = {name: indicators.to_list(values) for name, values in arrays.items()}
+        kline_data = [
+            {'symbol': symbol, 'date': date, 'open': open_price, 'high': high_price,
+             'low': low_price, 'close': close_price, 'volume': volume}
+            for date, (open_price, high_price, low_price, close_price, volume)
+            in zip(np.datetime_as_string(dates, unit='s').tolist(), table.tolist())
+        ]
+        document = kline_document(symbol, timeframe, timestamp, kline_data, indicator_lists)
+        return symbol, timeframe, len(kline_data), arrays, json.dumps(document, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logging.error(f"计算 {symbol} {timeframe} 技术指标时出错: {str(e)}")
+        return symbol, timeframe, len(table), None, None
+
+
 class KlineProcessor:
     """K线数据处理器"""
     
     def __init__(self):
         self.db = CryptoDatabase()
         
-        # 获取项目根目录路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        self.output_dir = os.path.join(project_root, "data", "kline_data")
+        self.output_dir = KLINE_OUTPUT_DIR
+        self.segment_store = get_segment_store()
+        self.fingerprint_path = os.path.join(self.segment_store.root_dir, FINGERPRINT_FILE)
         
         self.ensure_output_dir()
     
@@ -35,330 +130,25 @@ class KlineProcessor:
             os.makedirs(self.output_dir)
             logging.info(f"创建K线数据输出目录: {self.output_dir}")
     
-    def get_kline_data(self, symbol, timeframe, limit=100):
-        """获取K线数据"""
-        if not self.db.connect():
-            logging.error("数据库连接失败")
-            return []
-        
-        try:
-            # 从数据库获取历史数据
-            data = self.db.get_historical_data(timeframe, symbol, limit)
-            if not data:
-                logging.warning(f"没有找到 {symbol} 的 {timeframe} 级数据")
-                return []
-            
-            # 转换为K线格式
-            kline_data = []
-            for item in data:
-                symbol_db, date, open_price, high_price, low_price, close_price, volume = item
-                kline_data.append({
-                    'symbol': symbol_db,
-                    'date': date.isoformat() if hasattr(date, 'isoformat') else str(date),
-                    'open': float(open_price),
-                    'high': float(high_price),
-                    'low': float(low_price),
-                    'close': float(close_price),
-                    'volume': float(volume)
-                })
-            
-            # 按时间排序
-            kline_data.sort(key=lambda x: x['date'])
-            
-            logging.info(f"成功获取 {symbol} 的 {timeframe} 级K线数据，共 {len(kline_data)} 条")
-            return kline_data
-            
-        except Exception as e:
-            logging.error(f"获取K线数据时出错: {str(e)}")
-            return []
-        finally:
-            self.db.disconnect()
+    @staticmethod
+    def rows_to_arrays(data):
+        """将数据库行转换为按时间升序的 (datetime64 数组, (n, 5) 的 open/high/low/close/volume 数组)"""
+        dates = np.array([item[1] for item in data], dtype='datetime64[s]')
+        table = np.array([item[2:7] for item in data], dtype=np.float64).reshape(-1, 5)
+        table[:, 4] = np.nan_to_num(table[:, 4])
+        order = np.argsort(dates, kind='stable')
+        return dates[order], table[order]
     
-    def calculate_technical_indicators(self, kline_data):
-        """计算技术指标"""
-        if not kline_data or len(kline_data) < 20:
-            return {}
-        
-        # 提取收盘价
-        closes = [item['close'] for item in kline_data]
-        highs = [item['high'] for item in kline_data]
-        lows = [item['low'] for item in kline_data]
-        volumes = [item['volume'] for item in kline_data]
-        
-        indicators = {}
-        
-        try:
-            # 移动平均线
-            indicators['ma5'] = self.calculate_ma(closes, 5)
-            indicators['ma10'] = self.calculate_ma(closes, 10)
-            indicators['ma20'] = self.calculate_ma(closes, 20)
-            indicators['ma50'] = self.calculate_ma(closes, 50)
-            
-            # RSI
-            indicators['rsi'] = self.calculate_rsi(closes, 14)
-            
-            # MACD
-            macd_data = self.calculate_macd(closes)
-            indicators.update(macd_data)
-            
-            # 布林带
-            bollinger_data = self.calculate_bollinger_bands(closes, 20, 2)
-            indicators.update(bollinger_data)
-            
-            # 成交量指标
-            indicators['volume_ma'] = self.calculate_ma(volumes, 20)
-            
-            # 波动率
-            indicators['volatility'] = self.calculate_volatility(closes, 20)
-            
-            # KDJ指标
-            kdj_data = self.calculate_kdj(highs, lows, closes, 9, 3, 3)
-            indicators.update(kdj_data)
-            
-            logging.info("技术指标计算完成")
-            
-        except Exception as e:
-            logging.error(f"计算技术指标时出错: {str(e)}")
-        
-        return indicators
-    
-    def calculate_ma(self, data, period):
-        """计算移动平均线"""
-        if len(data) < period:
-            return None
-        
-        ma_values = []
-        for i in range(len(data)):
-            if i < period - 1:
-                ma_values.append(None)
-            else:
-                ma = sum(data[i-period+1:i+1]) / period
-                ma_values.append(ma)
-        
-        return ma_values
-    
-    def calculate_rsi(self, data, period=14):
-        """计算RSI指标"""
-        if len(data) < period + 1:
-            return None
-        
-        deltas = [data[i] - data[i-1] for i in range(1, len(data))]
-        gains = [delta if delta > 0 else 0 for delta in deltas]
-        losses = [-delta if delta < 0 else 0 for delta in deltas]
-        
-        rsi_values = [None] * period
-        
-        # 计算初始RSI
-        avg_gain = sum(gains[:period]) / period
-        avg_loss = sum(losses[:period]) / period
-        
-        if avg_loss == 0:
-            rsi_values.append(100)
-        else:
-            rs = avg_gain / avg_loss
-            rsi = 100 - (100 / (1 + rs))
-            rsi_values.append(rsi)
-        
-        # 计算后续RSI
-        for i in range(period + 1, len(data)):
-            avg_gain = (avg_gain * (period - 1) + gains[i-1]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i-1]) / period
-            
-            if avg_loss == 0:
-                rsi_values.append(100)
-            else:
-                rs = avg_gain / avg_loss
-                rsi = 100 - (100 / (1 + rs))
-                rsi_values.append(rsi)
-        
-        return rsi_values
-    
-    def calculate_macd(self, data, fast=12, slow=26, signal=9):
-        """计算MACD指标"""
-        if len(data) < slow:
-            return {'macd': None, 'signal': None, 'histogram': None}
-        
-        # 计算EMA
-        ema_fast = self.calculate_ema(data, fast)
-        ema_slow = self.calculate_ema(data, slow)
-        
-        # 计算MACD线
-        macd_line = []
-        for i in range(len(data)):
-            if ema_fast[i] is not None and ema_slow[i] is not None:
-                macd_line.append(ema_fast[i] - ema_slow[i])
-            else:
-                macd_line.append(None)
-        
-        # 计算信号线
-        signal_line = self.calculate_ema([x for x in macd_line if x is not None], signal)
-        
-        # 补齐信号线长度
-        signal_full = [None] * (len(macd_line) - len(signal_line)) + signal_line
-        
-        # 计算柱状图
-        histogram = []
-        for i in range(len(macd_line)):
-            if macd_line[i] is not None and signal_full[i] is not None:
-                histogram.append(macd_line[i] - signal_full[i])
-            else:
-                histogram.append(None)
-        
-        return {
-            'macd': macd_line,
-            'signal': signal_full,
-            'histogram': histogram
-        }
-    
-    def calculate_ema(self, data, period):
-        """计算指数移动平均线"""
-        if len(data) < period:
-            return [None] * len(data)
-        
-        multiplier = 2 / (period + 1)
-        ema_values = [None] * (period - 1)
-        
-        # 初始EMA使用SMA
-        sma = sum(data[:period]) / period
-        ema_values.append(sma)
-        
-        # 计算后续EMA
-        for i in range(period, len(data)):
-            ema = (data[i] * multiplier) + (ema_values[-1] * (1 - multiplier))
-            ema_values.append(ema)
-        
-        return ema_values
-    
-    def calculate_bollinger_bands(self, data, period=20, std_dev=2):
-        """计算布林带"""
-        if len(data) < period:
-            return {'bb_upper': None, 'bb_middle': None, 'bb_lower': None}
-        
-        ma_values = self.calculate_ma(data, period)
-        
-        bb_upper = []
-        bb_lower = []
-        
-        for i in range(len(data)):
-            if i < period - 1:
-                bb_upper.append(None)
-                bb_lower.append(None)
-            else:
-                # 计算标准差
-                window_data = data[i-period+1:i+1]
-                std = np.std(window_data)
-                
-                bb_upper.append(ma_values[i] + (std * std_dev))
-                bb_lower.append(ma_values[i] - (std * std_dev))
-        
-        return {
-            'bb_upper': bb_upper,
-            'bb_middle': ma_values,
-            'bb_lower': bb_lower
-        }
-    
-    def calculate_volatility(self, data, period=20):
-        """计算波动率"""
-        if len(data) < period:
-            return None
-        
-        volatility_values = []
-        
-        for i in range(len(data)):
-            if i < period - 1:
-                volatility_values.append(None)
-            else:
-                window_data = data[i-period+1:i+1]
-                returns = [(window_data[j] - window_data[j-1]) / window_data[j-1] 
-                          for j in range(1, len(window_data))]
-                volatility = np.std(returns) * np.sqrt(252)  # 年化波动率
-                volatility_values.append(volatility)
-        
-        return volatility_values
-    
-    def calculate_kdj(self, highs, lows, closes, k_period=9, k_smooth=3, d_smooth=3):
-        """计算KDJ指标"""
-        if len(closes) < k_period:
-            return {'k': None, 'd': None, 'j': None}
-        
-        rsv_values = []
-        
-        # 计算RSV
-        for i in range(len(closes)):
-            if i < k_period - 1:
-                rsv_values.append(None)
-            else:
-                window_highs = highs[i-k_period+1:i+1]
-                window_lows = lows[i-k_period+1:i+1]
-                
-                highest = max(window_highs)
-                lowest = min(window_lows)
-                
-                if highest == lowest:
-                    rsv = 50
-                else:
-                    rsv = (closes[i] - lowest) / (highest - lowest) * 100
-                
-                rsv_values.append(rsv)
-        
-        # 计算K值
-        k_values = [None] * (k_period - 1)
-        k_values.append(50)  # 初始K值
-        
-        for i in range(k_period, len(rsv_values)):
-            if rsv_values[i] is not None:
-                k = (k_values[-1] * (k_smooth - 1) + rsv_values[i]) / k_smooth
-                k_values.append(k)
-            else:
-                k_values.append(None)
-        
-        # 计算D值
-        d_values = [None] * (k_period - 1)
-        d_values.append(50)  # 初始D值
-        
-        for i in range(k_period, len(k_values)):
-            if k_values[i] is not None:
-                d = (d_values[-1] * (d_smooth - 1) + k_values[i]) / d_smooth
-                d_values.append(d)
-            else:
-                d_values.append(None)
-        
-        # 计算J值
-        j_values = []
-        for i in range(len(k_values)):
-            if k_values[i] is not None and d_values[i] is not None:
-                j = 3 * k_values[i] - 2 * d_values[i]
-                j_values.append(j)
-            else:
-                j_values.append(None)
-        
-        return {
-            'k': k_values,
-            'd': d_values,
-            'j': j_values
-        }
-    
-    def save_kline_data(self, symbol, timeframe, kline_data, indicators=None):
-        """保存K线数据到文件"""
+    def write_kline_file(self, symbol, timeframe, timestamp, text):
+        """写入已序列化的K线文件，返回文件路径"""
         try:
             # 创建文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"{symbol}_{timeframe}_kline_{timestamp}.json"
             filepath = os.path.join(self.output_dir, filename)
             
-            # 准备保存的数据
-            save_data = {
-                'symbol': symbol,
-                'timeframe': timeframe,
-                'timestamp': timestamp,
-                'data_count': len(kline_data),
-                'kline_data': kline_data,
-                'technical_indicators': indicators or {}
-            }
-            
             # 保存到JSON文件
             with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(save_data, f, ensure_ascii=False, indent=2)
+                f.write(text)
             
             logging.info(f"K线数据已保存到: {filepath}")
             return filepath
@@ -367,53 +157,158 @@ class KlineProcessor:
             logging.error(f"保存K线数据时出错: {str(e)}")
             return None
     
-    def process_and_save_kline(self, symbol, timeframe, limit=100):
-        """处理并保存K线数据"""
-        logging.info(f"开始处理 {symbol} 的 {timeframe} 级K线数据")
-        
-        # 获取K线数据
-        kline_data = self.get_kline_data(symbol, timeframe, limit)
-        if not kline_data:
-            logging.warning(f"没有获取到 {symbol} 的K线数据")
-            return None
-        
-        # 计算技术指标
-        indicators = self.calculate_technical_indicators(kline_data)
-        
-        # 保存数据
-        filepath = self.save_kline_data(symbol, timeframe, kline_data, indicators)
+    def get_symbols(self):
+        """需要处理的币种：crypto_info 中登记的全部币种"""
+        symbols = self.db.get_symbols()
+        return symbols or list(DEFAULT_SYMBOLS)
+    
+    def load_kline_batch(self, symbols, timeframe, limit=100):
+        """批量读取多个币种的K线，返回 {symbol: (datetime64 数组, OHLCV 数组)}，均按时间升序"""
+        klines = {}
+        if not self.db.connect():
+            logging.error("数据库连接失败")
+            return klines
         
-        return {
-            'symbol': symbol,
-            'timeframe': timeframe,
-            'data_count': len(kline_data),
-            'filepath': filepath,
-            'kline_data': kline_data,
-            'indicators': indicators
-        }
-
-def run_kline_processing():
-    """运行K线数据处理"""
-    processor = KlineProcessor()
+        try:
+            for start in range(0, len(symbols), BATCH_QUERY_SYMBOLS):
+                chunk = symbols[start:start + BATCH_QUERY_SYMBOLS]
+                grouped = self.db.get_historical_data_batch(timeframe, chunk, limit)
+                for symbol, rows in grouped.items():
+                    if rows:
+                        klines[symbol] = self.rows_to_arrays(rows)
+            return klines
+        except Exception as e:
+            logging.error(f"批量获取 {timeframe} 级K线数据时出错: {str(e)}")
+            return klines
+        finally:
+            self.db.disconnect()
+    
+    def append_segment(self, symbol, timeframe, dates, table, arrays):
+        """把K线和指标追加到分段存储（只写入新增的K线），返回写入的行数"""
+        columns = {name: table[:, index] for index, name in enumerate(('open', 'high', 'low', 'close', 'volume'))}
+        columns.update(arrays)
+        return self.segment_store.append(symbol, timeframe, dates.astype('datetime64[ms]').astype(np.int64), columns)
     
-    symbols = ['BTC', 'ETH']
-    timeframes = ['minute', 'hour', 'day']
+    @staticmethod
+    def fingerprint(dates, table, limit):
+        """序列内容指纹：最后一根K线的时间 + 最近K线（时间和OHLCV）的哈希，处理条数不同时指纹也不同"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.ascontiguousarray(dates.astype('datetime64[s]').astype(np.int64)).tobytes())
+        digest.update(np.ascontiguousarray(table, dtype=np.float64).tobytes())
+        return f"{np.datetime_as_string(dates[-1], unit='s')}|{limit}|{digest.hexdigest()}"
     
-    results = []
+    def load_fingerprints(self):
+        try:
+            with open(self.fingerprint_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_fingerprints(self, fingerprints):
+        try:
+            os.makedirs(os.path.dirname(self.fingerprint_path), exist_ok=True)
+            tmp_path = self.fingerprint_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(fingerprints, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.fingerprint_path)
+        except Exception as e:
+            logging.error(f"保存K线指纹失败: {str(e)}")
     
-    for symbol in symbols:
+    def process_batch(self, symbols, timeframes, limit=100, workers=KLINE_WORKERS, json_snapshot=KLINE_JSON_SNAPSHOTS,
+                      force=False):
+        """
+        批量处理多个 (币种, 时间粒度)
+        先按时间粒度批量读取每个币种最近 FINGERPRINT_TAIL 根K线，指纹与上次处理时相同（且分段存储中有该序列）的跳过，
+        其余读取完整K线，以 NumPy 数组分发到进程池计算指标，新增的K线和指标追加到分段存储，
+        json_snapshot 为真时另外写入完整的JSON文件；force 为真时不跳过
+        返回每个数据集的 symbol/timeframe/data_count/rows_appended/filepath/skipped
+        """
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        fingerprints = self.load_fingerprints()
+        stored_series = self.segment_store.read_manifest()
+        pending = {}
+        skipped = []
+        jobs = []
         for timeframe in timeframes:
-            try:
-                result = processor.process_and_save_kline(symbol, timeframe, 100)
-                if result:
-                    results.append(result)
-                    logging.info(f"成功处理 {symbol} {timeframe} 级K线数据")
-                else:
-                    logging.warning(f"处理 {symbol} {timeframe} 级K线数据失败")
-            except Exception as e:
-                logging.error(f"处理 {symbol} {timeframe} 级K线数据时出错: {str(e)}")
+            tails = self.load_kline_batch(symbols, timeframe, FINGERPRINT_TAIL)
+            changed = []
+            for symbol in symbols:
+                if symbol not in tails:
+                    logging.warning(f"没有获取到 {symbol} 的 {timeframe} 级K线数据")
+                    continue
+                name = series_name(symbol, timeframe)
+                fingerprint = self.fingerprint(*tails[symbol], limit)
+                if not force and fingerprints.get(name) == fingerprint and name in stored_series:
+                    skipped.append({
+                        'symbol': symbol,
+                        'timeframe': timeframe,
+                        'data_count': 0,
+                        'rows_appended': 0,
+                        'filepath': self.segment_store.series_dir(symbol, timeframe),
+                        'skipped': True
+                    })
+                    continue
+                pending[name] = fingerprint
+                changed.append(symbol)
+            
+            klines = self.load_kline_batch(changed, timeframe, limit) if changed else {}
+            for symbol in changed:
+                if symbol not in klines:
+                    logging.warning(f"没有获取到 {symbol} 的 {timeframe} 级K线数据")
+                    continue
+                dates, table = klines[symbol]
+                jobs.append((symbol, timeframe, timestamp, dates, table, json_snapshot))
+        
+        if skipped:
+            logging.info(f"{len(skipped)} 组K线数据自上次处理后没有变化，已跳过")
+        
+        if workers > 1 and len(jobs) >= PARALLEL_MIN_JOBS:
+            logging.info(f"使用 {workers} 个进程计算 {len(jobs)} 组技术指标")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                outputs = list(pool.map(indicator_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+        else:
+            outputs = [indicator_job(job) for job in jobs]
+        
+        results = []
+        for job, (symbol, timeframe, count, arrays, text) in zip(jobs, outputs):
+            if arrays is None:
+                logging.warning(f"处理 {symbol} {timeframe} 级K线数据失败")
+                continue
+            dates, table = job[3], job[4]
+            rows_appended = self.append_segment(symbol, timeframe, dates, table, arrays)
+            results.append({
+                'symbol': symbol,
+                'timeframe': timeframe,
+                'data_count': count,
+                'rows_appended': rows_appended,
+                'filepath': self.write_kline_file(symbol, timeframe, timestamp, text) if text is not None
+                            else self.segment_store.series_dir(symbol, timeframe),
+                'skipped': False
+            })
+            # 没有新K线时分段不变，清单中缺少该序列（如清单丢失）时补上
+            if rows_appended == 0 and series_name(symbol, timeframe) not in stored_series:
+                self.segment_store.update_manifest(symbol, timeframe)
+            # 写入成功后才记录指纹，失败的序列下次重新处理
+            if rows_appended is not None:
+                fingerprints[series_name(symbol, timeframe)] = pending[series_name(symbol, timeframe)]
+            logging.info(f"成功处理 {symbol} {timeframe} 级K线数据")
+        
+        if pending:
+            self.save_fingerprints(fingerprints)
+        return results + skipped
+
+def run_kline_processing(workers=KLINE_WORKERS, force=False):
+    """运行K线数据处理（所有登记的币种，指标计算按CPU核数并行，没有变化的序列跳过）"""
+    processor = KlineProcessor()
+    
+    try:
+        results = processor.process_batch(processor.get_symbols(), TIMEFRAMES, 100, workers, force=force)
+    except Exception as e:
+        logging.error(f"K线数据处理时出错: {str(e)}")
+        results = []
     
-    logging.info(f"K线数据处理完成，共处理 {len(results)} 个数据集")
+    skipped = sum(1 for result in results if result.get('skipped'))
+    logging.info(f"K线数据处理完成，共处理 {len(results) - skipped} 个数据集，跳过 {skipped} 个未变化的数据集")
     return results
 
 if __name__ == "__main__":
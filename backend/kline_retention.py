@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+K线输出保留策略
+KlineProcessor 的JSON快照（{币种}_{粒度}_kline_{时间}.json）每个序列保留最新 N 个，以及最近若干天中每天最新的一个，
+其余快照的K线和技术指标按日期去重后合并进该序列的压缩归档（{币种}_{粒度}_kline_archive.json.gz）再删除；
+同时合并K线分段存储中的分段。由调度器每天运行，报告回收的字节数
+
+用法: python kline_retention.py [快照目录 ...]
+"""
+
+import glob
+import gzip
+import json
+import logging
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+from kline_segments import get_segment_store
+
+# 每个序列保留的最新快照数
+KLINE_KEEP_SNAPSHOTS = int(os.getenv('KLINE_KEEP_SNAPSHOTS', '3'))
+# 最近多少天每天保留一个快照
+KLINE_KEEP_DAYS = int(os.getenv('KLINE_KEEP_DAYS', '7'))
+
+ARCHIVE_SUFFIX = '_kline_archive.json.gz'
+
+_SNAPSHOT_PATTERN = re.compile(r'^([A-Za-z0-9]+)_([A-Za-z0-9]+)_kline_(\d{8}_\d{6})\.json$')
+
+
+def list_snapshots(directory):
+    """目录中的快照，返回 {(币种, 粒度): [(时间, 路径)]}，每个序列按时间升序"""
+    series = {}
+    for path in glob.glob(os.path.join(directory, '*_kline_*.json')):
+        match = _SNAPSHOT_PATTERN.match(os.path.basename(path))
+        if not match:
+            continue
+        taken_at = datetime.strptime(match.group(3), '%Y%m%d_%H%M%S')
+        series.setdefault((match.group(1), match.group(2)), []).append((taken_at, path))
+    for snapshots in series.values():
+        snapshots.sort()
+    return series
+
+
+def default_directories():
+    """KlineProcessor 的输出目录，以及早期从 backend/ 目录运行时写出的目录"""
+    from kline_processor import KLINE_OUTPUT_DIR, LEGACY_OUTPUT_DIR
+    return list(dict.fromkeys([KLINE_OUTPUT_DIR, LEGACY_OUTPUT_DIR]))
+
+
+def select_retained(snapshots, keep_last=KLINE_KEEP_SNAPSHOTS, keep_days=KLINE_KEEP_DAYS, now=None):
+    """按时间升序的 [(时间, 路径)] 中需要保留的路径：最新 keep_last 个，以及最近 keep_days 天每天最新的一个"""
+    now = now or datetime.now()
+    retained = {path for _, path in snapshots[-keep_last:]} if keep_last > 0 else set()
+    newest_per_day = {}
+    for taken_at, path in snapshots:
+        if taken_at >= now - timedelta(days=keep_days):
+            newest_per_day[taken_at.date()] = path
+    retained.update(newest_per_day.values())
+    return retained
+
+
+class KlineRetention:
+    """K线快照保留和归档"""
+
+    def __init__(self, directories=None, keep_last=KLINE_KEEP_SNAPSHOTS, keep_days=KLINE_KEEP_DAYS):
+        self.directories = directories or default_directories()
+        self.keep_last = keep_last
+        self.keep_days = keep_days
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def archive_path(directory, symbol, timeframe):
+        return os.path.join(directory, f"{symbol}_{timeframe}{ARCHIVE_SUFFIX}")
+
+    @staticmethod
+    def merge_document(document, candles, indicator_rows):
+        """
+        把快照（或归档）中的K线和按下标对齐的技术指标合并进 {date: K线} 和 {date: {指标: 值}}
+        同一日期以后合并的为准；指标只覆盖非空值（较新快照的窗口开头处于预热期，值为空）
+        """
+        series = document.get('technical_indicators') or {}
+        for index, item in enumerate(document.get('kline_data', [])):
+            if not isinstance(item, dict) or 'date' not in item:
+                continue
+            candles[item['date']] = item
+            row = indicator_rows.setdefault(item['date'], {})
+            for name, values in series.items():
+                value = values[index] if index < len(values) else None
+                if value is not None or name not in row:
+                    row[name] = value
+
+    def read_archive(self, path):
+        """读取归档，返回 ({date: K线}, {date: {指标: 值}})"""
+        candles, indicator_rows = {}, {}
+        if os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                self.merge_document(json.load(f), candles, indicator_rows)
+        return candles, indicator_rows
+
+    def archive_series(self, directory, symbol, timeframe, paths):
+        """
+        把快照中的K线和技术指标合并进归档（同一日期以较新的快照为准），写入成功后删除快照
+        返回 (删除的文件数, 回收的字节数)
+        """
+        archive = self.archive_path(directory, symbol, timeframe)
+        before = sum(os.path.getsize(path) for path in paths)
+        before += os.path.getsize(archive) if os.path.exists(archive) else 0
+
+        candles, indicator_rows = self.read_archive(archive)
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.merge_document(json.load(f), candles, indicator_rows)
+
+        dates = sorted(candles)
+        names = list(dict.fromkeys(name for date in dates for name in indicator_rows.get(date, {})))
+        document = {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+            'data_count': len(candles),
+            'kline_data': [candles[date] for date in dates],
+            'technical_indicators': {name: [indicator_rows.get(date, {}).get(name) for date in dates]
+                                     for name in names}
+        }
+        tmp_path = archive + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, archive)
+
+        for path in paths:
+            os.remove(path)
+        return len(paths), before - os.path.getsize(archive)
+
+    def run(self):
+        """对所有目录执行保留策略并合并K线分段，返回统计"""
+        report = {'files_removed': 0, 'files_kept': 0, 'archives': 0, 'segments_merged': 0, 'bytes_reclaimed': 0}
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for (symbol, timeframe), snapshots in list_snapshots(directory).items():
+                retained = select_retained(snapshots, self.keep_last, self.keep_days)
+                expired = [path for _, path in snapshots if path not in retained]
+                report['files_kept'] += len(retained)
+                if not expired:
+                    continue
+                try:
+                    removed, reclaimed = self.archive_series(directory, symbol, timeframe, expired)
+                    report['files_removed'] += removed
+                    report['archives'] += 1
+                    report['bytes_reclaimed'] += reclaimed
+                except Exception as e:
+                    self.logger.error(f"归档 {symbol} {timeframe} K线快照失败: {str(e)}")
+
+        store = get_segment_store()
+        segment_bytes = self.directory_size(store.root_dir)
+        report['segments_merged'] = store.compact_all()
+        report['bytes_reclaimed'] += segment_bytes - self.directory_size(store.root_dir)
+        return report
+
+    @staticmethod
+    def directory_size(directory):
+        total = 0
+        for root, _, files in os.walk(directory):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
+
+
+def run_kline_retention(directories=None):
+    """运行K线输出保留策略，返回统计（失败时返回None）"""
+    try:
+        report = KlineRetention(directories).run()
+    except Exception as e:
+        logging.error(f"K线输出清理时出错: {str(e)}")
+        return None
+
+    logging.info(f"K线输出清理完成: 删除 {report['files_removed']} 个快照，保留 {report['files_kept']} 个，"
+                 f"合并 {report['segments_merged']} 个分段，回收 {report['bytes_reclaimed'] / 1024 / 1024:.2f} MB")
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    result = run_kline_retention(sys.argv[1:] or None)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    sys.exit(0 if result is not None else 1)
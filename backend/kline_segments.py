@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+K线分段存储
+每个 (币种, 时间粒度) 一个目录，每次处理只把新增（或被更新的最后一根）K线及其技术指标追加为一个新的二进制列式分段，
+分段数超过阈值时合并为一个分段，磁盘占用和写入量随新数据增长，而不是随运行次数增长
+根目录下的 manifest.json 记录每个序列当前的分段，读取方据此内存映射分段文件，不扫描目录
+
+分段文件格式（小端）:
+  头部 32 字节: magic b'KSEG' | 版本 u16 | 列数 u16 | 行数 u32 | 保留 u32 | 首个时间戳 i64 | 最后时间戳 i64
+  列名: 每列 16 字节 ASCII（不足补0）
+  数据: 时间戳 int64[行数]，随后每列 float64[行数]（按列连续存放）
+"""
+
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+SEGMENT_MAGIC = b'KSEG'
+SEGMENT_VERSION = 1
+HEADER = struct.Struct('<4sHHIIqq')
+NAME_SIZE = 16
+SEGMENT_SUFFIX = '.seg'
+MANIFEST_NAME = 'manifest.json'
+# 分段数达到该值时合并
+SEGMENT_COMPACT_COUNT = int(os.getenv('KLINE_SEGMENT_COMPACT', '24'))
+
+DEFAULT_SEGMENT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'data', 'kline_segments')
+
+
+def encode_segment(timestamps, columns):
+    """编码一个分段：timestamps 为升序的毫秒时间戳，columns 为 {列名: 等长数组}"""
+    timestamps = np.asarray(timestamps, dtype='<i8')
+    names = list(columns)
+    header = HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, len(names), len(timestamps), 0,
+                         int(timestamps[0]) if len(timestamps) else 0,
+                         int(timestamps[-1]) if len(timestamps) else 0)
+    parts = [header]
+    for name in names:
+        raw = name.encode('ascii')
+        if len(raw) > NAME_SIZE:
+            raise ValueError(f"列名过长: {name}")
+        parts.append(raw.ljust(NAME_SIZE, b'\0'))
+    parts.append(timestamps.tobytes())
+    for name in names:
+        parts.append(np.asarray(columns[name], dtype='<f8').tobytes())
+    return b''.join(parts)
+
+
+def parse_header(buffer):
+    """解析分段头部，返回 {'rows', 'first_ts', 'last_ts', 'columns', 'data_offset'}"""
+    magic, version, ncols, rows, _, first_ts, last_ts = HEADER.unpack_from(buffer, 0)
+    if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+        raise ValueError("不是有效的K线分段文件")
+    names_end = HEADER.size + ncols * NAME_SIZE
+    columns = [bytes(buffer[offset:offset + NAME_SIZE]).rstrip(b'\0').decode('ascii')
+               for offset in range(HEADER.size, names_end, NAME_SIZE)]
+    return {'rows': rows, 'first_ts': first_ts, 'last_ts': last_ts, 'columns': columns, 'data_offset': names_end}
+
+
+def decode_segment(buffer):
+    """解码分段（bytes 或 mmap），返回 (时间戳数组, {列名: 数组})；数组直接引用 buffer，不复制"""
+    header = parse_header(buffer)
+    rows, offset = header['rows'], header['data_offset']
+    timestamps = np.frombuffer(buffer, dtype='<i8', count=rows, offset=offset)
+    offset += rows * 8
+    columns = {}
+    for name in header['columns']:
+        columns[name] = np.frombuffer(buffer, dtype='<f8', count=rows, offset=offset)
+        offset += rows * 8
+    return timestamps, columns
+
+
+def merge_segments(segments):
+    """
+    合并按写入顺序排列的分段 [(时间戳, 列)]，同一时间戳以后写入的为准，返回按时间升序的 (时间戳, 列)
+    各分段缺少的列以 NaN 填充
+    """
+    segments = [(ts, cols) for ts, cols in segments if len(ts)]
+    if not segments:
+        return np.empty(0, dtype=np.int64), {}
+    # 单个分段内时间戳已升序且唯一
+    if len(segments) == 1:
+        return segments[0]
+
+    names = []
+    for _, cols in segments:
+        names.extend(name for name in cols if name not in names)
+    timestamps = np.concatenate([ts for ts, _ in segments])
+    columns = {
+        name: np.concatenate([cols[name] if name in cols else np.full(len(ts), np.nan) for ts, cols in segments])
+        for name in names
+    }
+
+    # 反转后取每个时间戳第一次出现的位置，即最后写入的行
+    _, index = np.unique(timestamps[::-1], return_index=True)
+    keep = len(timestamps) - 1 - index
+    return timestamps[keep], {name: values[keep] for name, values in columns.items()}
+
+
+def series_name(symbol, timeframe):
+    """序列目录名和清单键"""
+    return f"{symbol.upper()}_{timeframe}"
+
+
+class KlineSegmentStore:
+    """K线分段存储"""
+
+    def __init__(self, root_dir=DEFAULT_SEGMENT_DIR, compact_count=SEGMENT_COMPACT_COUNT):
+        self.root_dir = root_dir
+        self.compact_count = compact_count
+        self.logger = logging.getLogger(__name__)
+
+    def series_dir(self, symbol, timeframe):
+        return os.path.join(self.root_dir, series_name(symbol, timeframe))
+
+    def list_segments(self, symbol, timeframe):
+        """按写入顺序排列的分段文件"""
+        return sorted(glob.glob(os.path.join(self.series_dir(symbol, timeframe), f"*{SEGMENT_SUFFIX}")))
+
+    def read_segment(self, path):
+        with open(path, 'rb') as f:
+            return decode_segment(f.read())
+
+    def read_header(self, path):
+        with open(path, 'rb') as f:
+            head = f.read(HEADER.size)
+            ncols = HEADER.unpack(head)[2]
+            return parse_header(head + f.read(ncols * NAME_SIZE))
+
+    def read_last_row(self, path):
+        """只读取头部和最后一行（按列步长定位），返回 (时间戳, {列名: 值})，空分段返回 (None, {})"""
+        with open(path, 'rb') as f:
+            head = f.read(HEADER.size)
+            ncols = HEADER.unpack(head)[2]
+            header = parse_header(head + f.read(ncols * NAME_SIZE))
+            rows, offset = header['rows'], header['data_offset']
+            if not rows:
+                return None, {}
+            values = {}
+            for index, name in enumerate(header['columns']):
+                f.seek(offset + rows * 8 * (index + 1) + (rows - 1) * 8)
+                values[name] = struct.unpack('<d', f.read(8))[0]
+            return header['last_ts'], values
+
+    def _write_segment(self, path, timestamps, columns):
+        """先写临时文件再原子替换，读取方不会看到写了一半的分段"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(encode_segment(timestamps, columns))
+        os.replace(tmp_path, path)
+
+    def _next_segment_path(self, symbol, timeframe, segments):
+        sequence = int(os.path.basename(segments[-1])[:-len(SEGMENT_SUFFIX)]) + 1 if segments else 1
+        return os.path.join(self.series_dir(symbol, timeframe), f"{sequence:08d}{SEGMENT_SUFFIX}")
+
+    def append(self, symbol, timeframe, timestamps, columns):
+        """
+        追加K线：只写入晚于已存储的最后一根的K线，以及数值有变化的最后一根（进行中的K线会被原地更新）
+        返回写入的行数，出错时返回None
+        """
+        try:
+            timestamps = np.asarray(timestamps, dtype=np.int64)
+            columns = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+            segments = self.list_segments(symbol, timeframe)
+
+            mask = np.ones(len(timestamps), dtype=bool)
+            if segments:
+                stored_ts, last_row = self.read_last_row(segments[-1])
+                if stored_ts is not None:
+                    mask = timestamps > stored_ts
+                    same = np.flatnonzero(timestamps == stored_ts)
+                    if len(same) and not all(
+                            name in last_row and np.array_equal(values[same[0]], last_row[name], equal_nan=True)
+                            for name, values in columns.items()):
+                        mask[same[0]] = True
+            if not mask.any():
+                return 0
+
+            os.makedirs(self.series_dir(symbol, timeframe), exist_ok=True)
+            path = self._next_segment_path(symbol, timeframe, segments)
+            self._write_segment(path, timestamps[mask], {name: values[mask] for name, values in columns.items()})
+            if len(segments) + 1 >= self.compact_count:
+                self.compact(symbol, timeframe)
+            else:
+                self.update_manifest(symbol, timeframe)
+            return int(mask.sum())
+        except Exception as e:
+            self.logger.error(f"追加 {symbol} {timeframe} K线分段失败: {str(e)}")
+            return None
+
+    def compact(self, symbol, timeframe):
+        """
+        合并全部分段为一个新分段，清单切换到新分段后再删除旧分段
+        删除前中断时旧分段与合并结果重复，读取时按时间戳去重，结果不变
+        返回被合并的分段数
+        """
+        segments = self.list_segments(symbol, timeframe)
+        if len(segments) < 2:
+            return 0
+        try:
+            timestamps, columns = merge_segments([self.read_segment(path) for path in segments])
+            path = self._next_segment_path(symbol, timeframe, segments)
+            self._write_segment(path, timestamps, columns)
+            self.update_manifest(symbol, timeframe, [path])
+            for path in segments:
+                os.remove(path)
+            self.logger.info(f"合并 {symbol} {timeframe} 的 {len(segments)} 个K线分段，共 {len(timestamps)} 条")
+            return len(segments)
+        except Exception as e:
+            self.logger.error(f"合并 {symbol} {timeframe} K线分段失败: {str(e)}")
+            return 0
+
+    def compact_all(self):
+        """合并所有序列的分段，返回被合并的分段数"""
+        merged = 0
+        for series in sorted(glob.glob(os.path.join(self.root_dir, '*_*'))):
+            if not os.path.isdir(series):
+                continue
+            symbol, _, timeframe = os.path.basename(series).partition('_')
+            merged += self.compact(symbol, timeframe)
+        return merged
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root_dir, MANIFEST_NAME)
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def series_entry(self, symbol, timeframe, paths=None):
+        """序列在清单中的记录：分段文件名（按写入顺序）、各分段行数之和（含被后写入的分段覆盖的行）和最后时间戳"""
+        segments = []
+        for path in self.list_segments(symbol, timeframe) if paths is None else paths:
+            header = self.read_header(path)
+            segments.append({'name': os.path.basename(path), 'rows': header['rows'],
+                             'first_ts': header['first_ts'], 'last_ts': header['last_ts']})
+        return {
+            'segments': segments,
+            'rows': sum(segment['rows'] for segment in segments),
+            'last_ts': segments[-1]['last_ts'] if segments else None
+        }
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.root_dir, exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.manifest_path)
+
+    def update_manifest(self, symbol, timeframe, paths=None):
+        """分段变化后更新清单中该序列的记录（只有处理进程写入清单），paths 默认为目录中的全部分段"""
+        manifest = self.read_manifest()
+        manifest[series_name(symbol, timeframe)] = self.series_entry(symbol, timeframe, paths)
+        self._write_manifest(manifest)
+
+    def rebuild_manifest(self):
+        """按目录中的分段重建整个清单，返回序列数"""
+        manifest = {}
+        for series in sorted(glob.glob(os.path.join(self.root_dir, '*_*'))):
+            if os.path.isdir(series):
+                symbol, _, timeframe = os.path.basename(series).partition('_')
+                manifest[series_name(symbol, timeframe)] = self.series_entry(symbol, timeframe)
+        self._write_manifest(manifest)
+        return len(manifest)
+
+    def load(self, symbol, timeframe, limit=None):
+        """读取一个序列，返回按时间升序的 (时间戳数组, {列名: 数组})，可只取最近 limit 条"""
+        timestamps, columns = merge_segments([self.read_segment(path)
+                                              for path in self.list_segments(symbol, timeframe)])
+        if limit is not None:
+            timestamps = timestamps[-limit:]
+            columns = {name: values[-limit:] for name, values in columns.items()}
+        return timestamps, columns
+
+
+class KlineSegmentReader:
+    """
+    只读访问分段存储：按清单内存映射分段文件，清单的修改时间变化时才重新读取清单，
+    序列的分段没有变化时直接返回上次合并的结果（单个分段时数组直接引用映射内存）
+    """
+
+    def __init__(self, root_dir=DEFAULT_SEGMENT_DIR):
+        self.root_dir = root_dir
+        self.manifest_path = os.path.join(root_dir, MANIFEST_NAME)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._manifest = {}
+        self._manifest_mtime = None
+        # 序列名 -> (清单记录, 合并后的 (时间戳, 列))
+        self._series = {}
+
+    def _refresh_manifest(self):
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            self._manifest, self._manifest_mtime = {}, None
+            return
+        if mtime != self._manifest_mtime:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+
+    def _map_segment(self, path):
+        with open(path, 'rb') as f:
+            # 映射在文件关闭后仍然有效；分段被合并替换或删除后，旧映射继续指向原文件内容
+            return decode_segment(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def load(self, symbol, timeframe, limit=None):
+        """读取一个序列，返回按时间升序的 (时间戳数组, {列名: 数组})，清单中没有该序列时返回None"""
+        name = series_name(symbol, timeframe)
+        try:
+            with self._lock:
+                self._refresh_manifest()
+                entry = self._manifest.get(name)
+                if not entry or not entry['segments']:
+                    return None
+                cached = self._series.get(name)
+                if cached is None or cached[0] != entry:
+                    directory = os.path.join(self.root_dir, name)
+                    merged = merge_segments([self._map_segment(os.path.join(directory, segment['name']))
+                                             for segment in entry['segments']])
+                    cached = (entry, merged)
+                    self._series[name] = cached
+            timestamps, columns = cached[1]
+        except Exception as e:
+            self.logger.error(f"读取 {name} 的K线分段失败: {str(e)}")
+            return None
+
+        if limit is not None:
+            timestamps = timestamps[-limit:]
+            columns = {column: values[-limit:] for column, values in columns.items()}
+        return timestamps, columns
+
+    def load_kline(self, symbol, timeframe, limit=None):
+        """读取为K线列表 [timestamp, open, high, low, close, volume]，没有数据时返回空列表"""
+        series = self.load(symbol, timeframe, limit)
+        if series is None or not len(series[0]):
+            return []
+        timestamps, columns = series
+        values = np.column_stack([columns[name] for name in ('open', 'high', 'low', 'close', 'volume')])
+        return [[timestamp, *row] for timestamp, row in zip(timestamps.tolist(), values.tolist())]
+
+
+# 全局实例
+_segment_store = None
+_segment_reader = None
+
+
+def get_segment_store():
+    """获取全局K线分段存储"""
+    global _segment_store
+    if _segment_store is None:
+        _segment_store = KlineSegmentStore()
+    return _segment_store
+
+
+def get_segment_reader():
+    """获取全局K线分段读取器"""
+    global _segment_reader
+    if _segment_reader is None:
+        _segment_reader = KlineSegmentReader()
+    return _segment_reader
@@ -10,7 +10,8 @@ from crypto_db import rebuild_database
 from data_processor import run_data_processing
 from crypto_analyzer import run_analysis
 from kline_processor import run_kline_processing
-from crypto_web_app import app
+from kline_retention import run_kline_retention
+from crypto_web_app import app, crypto_app
 from realtime_processor import run_realtime_processor
 
 # 配置日志
@@ -72,6 +73,9 @@ class CryptoSystem:
         # 每天凌晨2点运行完整处理
         schedule.every().day.at("02:00").do(self.run_full_processing)
         
+        # 每天凌晨3点清理K线输出
+        schedule.every().day.at("03:00").do(self.run_kline_retention_task)
+        
         logging.info("定时任务设置完成")
     
     def run_realtime_task(self):
@@ -107,6 +111,18 @@ class CryptoSystem:
         except Exception as e:
             logging.error(f"定时分析任务异常: {str(e)}")
     
+    def run_kline_retention_task(self):
+        """运行K线输出清理任务"""
+        logging.info("执行K线输出清理任务")
+        try:
+            report = run_kline_retention()
+            if report is not None:
+                logging.info(f"K线输出清理任务完成，回收 {report['bytes_reclaimed']} 字节")
+            else:
+                logging.error("K线输出清理任务失败")
+        except Exception as e:
+            logging.error(f"K线输出清理任务异常: {str(e)}")
+    
     def run_full_processing(self):
         """运行完整处理流程"""
         logging.info("执行完整处理流程")
@@ -130,6 +146,8 @@ class CryptoSystem:
         """启动Web服务器"""
         logging.info("启动Web服务器")
         try:
+            # 数据库初始化完成后再预热缓存
+            crypto_app.start_cache_warmup()
             app.run(debug=False, host='0.0.0.0', port=5000, threaded=True)
         except Exception as e:
             logging.error(f"Web服务器启动失败: {str(e)}")
@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""
+进程内Redis替身
+在没有Redis服务器的机器上（本地运行、基准测试）提供与redis-py客户端一致的接口，
+通过环境变量 CACHE_BACKEND=memory 启用
+
+支持缓存层用到的命令子集：
+- 字符串: get / set(ex, px, nx, xx) / setex / mget / incr / delete / exists / expire / ttl
+- 集合: sadd / srem / smembers / scard
+- 有序集合: zadd / zrem / zcard / zrange / zrangebyscore / zrevrangebyscore /
+  zremrangebyscore / zremrangebyrank
+- 键空间: keys / scan / scan_iter / flushdb / info / ping
+- 管道: pipeline().<命令>...execute()
+- 发布订阅: publish / pubsub().subscribe / get_message / listen
+
+与 decode_responses=False 的redis-py一致，返回的值、键和成员都是bytes
+"""
+
+import bisect
+import fnmatch
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class ResponseError(Exception):
+    """命令作用在错误类型的键上"""
+
+
+def _to_bytes(value: Any) -> bytes:
+    """按redis-py的规则把参数编码为bytes"""
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    if isinstance(value, (int, float)):
+        return repr(value).encode('utf-8')
+    raise TypeError(f"无效的Redis参数类型: {type(value).__name__}")
+
+
+def _to_key(name: Any) -> str:
+    return name.decode('utf-8') if isinstance(name, bytes) else str(name)
+
+
+def _parse_score(value: Any):
+    """解析分数边界，返回 (分数, 是否开区间)"""
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        text = value.strip()
+        exclusive = text.startswith('(')
+        if exclusive:
+            text = text[1:]
+        if text in ('-inf', '+inf', 'inf'):
+            return (float('-inf') if text == '-inf' else float('inf')), exclusive
+        return float(text), exclusive
+    return float(value), False
+
+
+class _SortedSet:
+    """有序集合：成员->分数 映射 + 按 (分数, 成员) 排序的列表"""
+
+    def __init__(self):
+        self.scores = {}
+        self.ordered = []
+
+    def add(self, member: bytes, score: float) -> int:
+        old = self.scores.get(member)
+        if old is not None:
+            if old == score:
+                return 0
+            self.ordered.remove((old, member))
+        self.scores[member] = score
+        bisect.insort(self.ordered, (score, member))
+        return 0 if old is not None else 1
+
+    def remove(self, member: bytes) -> int:
+        score = self.scores.pop(member, None)
+        if score is None:
+            return 0
+        self.ordered.remove((score, member))
+        return 1
+
+    def range_by_score(self, min_value, max_value) -> List[tuple]:
+        min_score, min_open = _parse_score(min_value)
+        max_score, max_open = _parse_score(max_value)
+        result = []
+        for score, member in self.ordered:
+            if score < min_score or (min_open and score == min_score):
+                continue
+            if score > max_score or (max_open and score == max_score):
+                break
+            result.append((score, member))
+        return result
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def _normalize_range(start: int, end: int, length: int):
+    """把Redis风格的闭区间下标（支持负数）转为切片"""
+    if start < 0:
+        start = max(length + start, 0)
+    if end < 0:
+        end = length + end
+    return start, min(end, length - 1) + 1
+
+
+class InMemoryRedis:
+    """进程内Redis实现（线程安全）"""
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._channels: Dict[bytes, List['InMemoryPubSub']] = {}
+        self._last_sweep = 0.0
+
+    # ---------- 内部工具 ----------
+
+    def _expired(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and time.time() >= expires_at:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            return True
+        return False
+
+    def _sweep(self):
+        """定期清理已过期的键（最多每秒一次）"""
+        now = time.time()
+        if now - self._last_sweep < 1:
+            return
+        self._last_sweep = now
+        for key in [k for k, t in self._expires.items() if now >= t]:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def _get_typed(self, name: Any, kind: type, create: bool = False):
+        key = _to_key(name)
+        self._expired(key)
+        value = self._data.get(key)
+        if value is None:
+            if not create:
+                return None
+            value = kind()
+            self._data[key] = value
+        elif not isinstance(value, kind):
+            raise ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _drop_if_empty(self, name: Any):
+        key = _to_key(name)
+        value = self._data.get(key)
+        if value is not None and not isinstance(value, bytes) and len(value) == 0:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    # ---------- 连接 ----------
+
+    def ping(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    # ---------- 字符串 ----------
+
+    def get(self, name: Any) -> Optional[bytes]:
+        with self._lock:
+            return self._get_typed(name, bytes)
+
+    def mget(self, keys, *args) -> List[Optional[bytes]]:
+        names = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        names.extend(args)
+        with self._lock:
+            return [self._get_typed(name, bytes) for name in names]
+
+    def set(self, name: Any, value: Any, ex: Optional[int] = None, px: Optional[int] = None,
+            nx: bool = False, xx: bool = False, keepttl: bool = False) -> Optional[bool]:
+        key = _to_key(name)
+        with self._lock:
+            self._sweep()
+            self._expired(key)
+            exists = key in self._data
+            if (nx and exists) or (xx and not exists):
+                return None
+            self._data[key] = _to_bytes(value)
+            if ex is not None:
+                self._expires[key] = time.time() + float(ex)
+            elif px is not None:
+                self._expires[key] = time.time() + float(px) / 1000
+            elif not keepttl:
+                self._expires.pop(key, None)
+            return True
+
+    def setex(self, name: Any, time_seconds: int, value: Any) -> bool:
+        return self.set(name, value, ex=time_seconds)
+
+    def incr(self, name: Any, amount: int = 1) -> int:
+        key = _to_key(name)
+        with self._lock:
+            current = self._get_typed(key, bytes)
+            try:
+                number = int(current) if current is not None else 0
+            except ValueError:
+                raise ResponseError("value is not an integer or out of range")
+            number += amount
+            self._data[key] = str(number).encode('utf-8')
+            return number
+
+    def delete(self, *names: Any) -> int:
+        deleted = 0
+        with self._lock:
+            for name in names:
+                key = _to_key(name)
+                if not self._expired(key) and key in self._data:
+                    del self._data[key]
+                    self._expires.pop(key, None)
+                    deleted += 1
+        return deleted
+
+    unlink = delete
+
+    def exists(self, *names: Any) -> int:
+        with self._lock:
+            return sum(1 for name in names if not self._expired(_to_key(name)) and _to_key(name) in self._data)
+
+    def expire(self, name: Any, time_seconds: int) -> bool:
+        key = _to_key(name)
+        with self._lock:
+            if self._expired(key) or key not in self._data:
+                return False
+            self._expires[key] = time.time() + float(time_seconds)
+            return True
+
+    def ttl(self, name: Any) -> int:
+        key = _to_key(name)
+        with self._lock:
+            if self._expired(key) or key not in self._data:
+                return -2
+            expires_at = self._expires.get(key)
+            if expires_at is None:
+                return -1
+            return max(int(round(expires_at - time.time())), 0)
+
+    # ---------- 集合 ----------
+
+    def sadd(self, name: Any, *values: Any) -> int:
+        with self._lock:
+            members = self._get_typed(name, set, create=True)
+            before = len(members)
+            members.update(_to_bytes(v) for v in values)
+            return len(members) - before
+
+    def srem(self, name: Any, *values: Any) -> int:
+        with self._lock:
+            members = self._get_typed(name, set)
+            if not members:
+                return 0
+            before = len(members)
+            members.difference_update(_to_bytes(v) for v in values)
+            removed = before - len(members)
+            self._drop_if_empty(name)
+            return removed
+
+    def smembers(self, name: Any) -> set:
+        with self._lock:
+            return set(self._get_typed(name, set) or ())
+
+    def scard(self, name: Any) -> int:
+        with self._lock:
+            return len(self._get_typed(name, set) or ())
+
+    # ---------- 有序集合 ----------
+
+    def zadd(self, name: Any, mapping: Dict[Any, float], nx: bool = False, xx: bool = False) -> int:
+        with self._lock:
+            zset = self._get_typed(name, _SortedSet, create=True)
+            added = 0
+            for member, score in mapping.items():
+                member = _to_bytes(member)
+                exists = member in zset.scores
+                if (nx and exists) or (xx and not exists):
+                    continue
+                added += zset.add(member, float(score))
+            self._drop_if_empty(name)
+            return added
+
+    def zrem(self, name: Any, *values: Any) -> int:
+        with self._lock:
+            zset = self._get_typed(name, _SortedSet)
+            if not zset:
+                return 0
+            removed = sum(zset.remove(_to_bytes(v)) for v in values)
+            self._drop_if_empty(name)
+            return removed
+
+    def zcard(self, name: Any) -> int:
+        with self._lock:
+            return len(self._get_typed(name, _SortedSet) or ())
+
+    @staticmethod
+    def _format_range(items: List[tuple], withscores: bool):
+        if withscores:
+            return [(member, score) for score, member in items]
+        return [member for _, member in items]
+
+    def zrange(self, name: Any, start: int, end: int, desc: bool = False, withscores: bool = False):
+        with self._lock:
+            zset = self._get_typed(name, _SortedSet)
+            if not zset:
+                return []
+            items = list(reversed(zset.ordered)) if desc else list(zset.ordered)
+            lo, hi = _normalize_range(start, end, len(items))
+            return self._format_range(items[lo:hi], withscores)
+
+    def zrangebyscore(self, name: Any, min: Any, max: Any, start: Optional[int] = None,
+                      num: Optional[int] = None, withscores: bool = False):
+        with self._lock:
+            zset = self._get_typed(name, _SortedSet)
+            if not zset:
+                return []
+            items = zset.range_by_score(min, max)
+            if start is not None and num is not None:
+                items = items[start:start + num] if num >= 0 else items[start:]
+            return self._format_range(items, withscores)
+
+    def zrevrangebyscore(self, name: Any, max: Any, min: Any, start: Optional[int] = None,
+                         num: Optional[int] = None, withscores: bool = False):
+        with self._lock:
+            zset = self._get_typed(name, _SortedSet)
+            if not zset:
+                return []
+            items = list(reversed(zset.range_by_score(min, max)))
+            if start is not None and num is not None:
+                items = items[start:start + num] if num >= 0 else items[start:]
+            return self._format_range(items, withscores)
+
+    def zremrangebyscore(self, name: Any, min: Any, max: Any) -> int:
+        with self._lock:
+            zset = self._get_typed(name, _SortedSet)
+            if not zset:
+                return 0
+            items = zset.range_by_score(min, max)
+            for _, member in items:
+                zset.remove(member)
+            self._drop_if_empty(name)
+            return len(items)
+
+    def zremrangebyrank(self, name: Any, min: int, max: int) -> int:
+        with self._lock:
+            zset = self._get_typed(name, _SortedSet)
+            if not zset:
+                return 0
+            lo, hi = _normalize_range(min, max, len(zset.ordered))
+            items = zset.ordered[lo:hi]
+            for _, member in items:
+                zset.remove(member)
+            self._drop_if_empty(name)
+            return len(items)
+
+    # ---------- 键空间 ----------
+
+    def _live_keys(self) -> List[str]:
+        self._sweep()
+        now = time.time()
+        return [k for k in self._data if self._expires.get(k, now + 1) > now]
+
+    def keys(self, pattern: str = '*') -> List[bytes]:
+        pattern = _to_key(pattern)
+        with self._lock:
+            return [k.encode('utf-8') for k in self._live_keys() if fnmatch.fnmatchcase(k, pattern)]
+
+    def scan(self, cursor: int = 0, match: Optional[str] = None, count: Optional[int] = None, **kwargs):
+        """
+        与Redis一致的SCAN语义：游标为0时开始，返回的游标为0时结束；
+        遍历期间一直存在的键至少返回一次，新增或删除的键可能返回也可能不返回
+        """
+        count = count or 10
+        pattern = _to_key(match) if match else None
+        with self._lock:
+            ordered = sorted(self._live_keys())
+        start = bisect.bisect_left(ordered, self._cursor_key(cursor)) if cursor else 0
+        batch = ordered[start:start + count]
+        next_cursor = 0 if start + count >= len(ordered) else self._make_cursor(ordered[start + count])
+        keys = [k.encode('utf-8') for k in batch if pattern is None or fnmatch.fnmatchcase(k, pattern)]
+        return next_cursor, keys
+
+    # SCAN游标：按键名有序遍历，游标就是下一个键名的整数编码（无状态，不会泄漏）
+    @staticmethod
+    def _make_cursor(key: str) -> int:
+        return int.from_bytes(b'\x01' + key.encode('utf-8'), 'big')
+
+    @staticmethod
+    def _cursor_key(cursor: int) -> str:
+        cursor = int(cursor)
+        return cursor.to_bytes((cursor.bit_length() + 7) // 8, 'big')[1:].decode('utf-8')
+
+    def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None, **kwargs):
+        cursor = None
+        while cursor != 0:
+            cursor, keys = self.scan(cursor or 0, match=match, count=count)
+            for key in keys:
+                yield key
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+        return True
+
+    def _memory_usage(self) -> int:
+        size = 0
+        for key, value in self._data.items():
+            size += len(key)
+            if isinstance(value, bytes):
+                size += len(value)
+            elif isinstance(value, set):
+                size += sum(len(m) for m in value)
+            elif isinstance(value, _SortedSet):
+                size += sum(len(m) + 8 for m in value.scores)
+        return size
+
+    def info(self, section: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            used = self._memory_usage()
+            keys = len(self._live_keys())
+        return {
+            'redis_version': 'in-memory',
+            'used_memory': used,
+            'used_memory_human': f"{used / 1024 / 1024:.2f}M",
+            'db0': {'keys': keys, 'expires': len(self._expires)},
+            'python_version': sys.version.split()[0]
+        }
+
+    # ---------- 管道 ----------
+
+    def pipeline(self, transaction: bool = True) -> 'InMemoryPipeline':
+        return InMemoryPipeline(self)
+
+    # ---------- 发布订阅 ----------
+
+    def publish(self, channel: Any, message: Any) -> int:
+        channel = _to_bytes(channel)
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for pubsub in subscribers:
+            pubsub._deliver(channel, _to_bytes(message))
+        return len(subscribers)
+
+    def pubsub(self, **kwargs) -> 'InMemoryPubSub':
+        return InMemoryPubSub(self)
+
+
+class InMemoryPipeline:
+    """管道：缓存命令，execute() 时在同一把锁下依次执行"""
+
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self._client, name)
+
+        def _queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return _queue
+
+    def execute(self, raise_on_error: bool = True) -> List[Any]:
+        results = []
+        with self._client._lock:
+            for method, args, kwargs in self._commands:
+                try:
+                    results.append(method(*args, **kwargs))
+                except Exception as e:
+                    if raise_on_error:
+                        self._commands = []
+                        raise
+                    results.append(e)
+        self._commands = []
+        return results
+
+    def reset(self):
+        self._commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.reset()
+
+
+class InMemoryPubSub:
+    """订阅对象，消息格式与redis-py一致"""
+
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._messages = queue.Queue()
+        self.channels = set()
+
+    def _deliver(self, channel: bytes, data: bytes):
+        self._messages.put({'type': 'message', 'pattern': None, 'channel': channel, 'data': data})
+
+    def subscribe(self, *channels: Any):
+        with self._client._lock:
+            for channel in channels:
+                channel = _to_bytes(channel)
+                self._client._channels.setdefault(channel, []).append(self)
+                self.channels.add(channel)
+                self._messages.put({'type': 'subscribe', 'pattern': None, 'channel': channel,
+                                    'data': len(self.channels)})
+
+    def unsubscribe(self, *channels: Any):
+        with self._client._lock:
+            for channel in [_to_bytes(c) for c in channels] or list(self.channels):
+                subscribers = self._client._channels.get(channel, [])
+                if self in subscribers:
+                    subscribers.remove(self)
+                self.channels.discard(channel)
+                self._messages.put({'type': 'unsubscribe', 'pattern': None, 'channel': channel,
+                                    'data': len(self.channels)})
+
+    def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0):
+        deadline = time.time() + (timeout or 0)
+        while True:
+            remaining = deadline - time.time()
+            try:
+                message = self._messages.get(timeout=remaining) if remaining > 0 else self._messages.get_nowait()
+            except queue.Empty:
+                return None
+            if ignore_subscribe_messages and message['type'] != 'message':
+                continue
+            return message
+
+    def listen(self):
+        while self.channels:
+            yield self._messages.get()
+
+    def close(self):
+        self.unsubscribe()
+
+
+# 每个db编号一个共享实例，使同一进程内的所有管理器看到相同数据
+_instances: Dict[int, InMemoryRedis] = {}
+_instances_lock = threading.Lock()
+
+def get_memory_redis(db: int = 0) -> InMemoryRedis:
+    """获取进程内Redis替身实例"""
+    with _instances_lock:
+        if db not in _instances:
+            _instances[db] = InMemoryRedis()
+        return _instances[db]
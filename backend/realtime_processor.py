@@ -48,6 +48,7 @@ class RealtimeDataProcessor:
             
             # 存储实时价格数据到数据库
             logging.info("开始存储实时价格数据到数据库")
+            stored_prices = []
             for data in realtime_data:
                 # 检查数据质量
                 quality_score = self.timestamp_manager.get_data_quality_score(data['timestamp'], 'minute')
@@ -63,12 +64,30 @@ class RealtimeDataProcessor:
                     )
                     
                     if success:
+                        self.cache_manager.append_tick(
+                            data['symbol'],
+                            data['price'],
+                            data['change_24h'],
+                            int(data['timestamp'].timestamp() * 1000)
+                        )
+                        stored_prices.append({
+                            'symbol': data['symbol'],
+                            'price': float(data['price']),
+                            'timestamp': data['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+                        })
                         logging.info(f"实时数据存储成功: {data['symbol']} - ${data['price']:,.2f} (质量分数: {quality_score:.2f})")
                     else:
                         logging.error(f"实时数据存储失败: {data['symbol']}")
                 else:
                     logging.warning(f"数据质量过低，跳过存储: {data['symbol']} (质量分数: {quality_score:.2f})")
             
+            # 把入库成功的价格写穿到最新价格缓存
+            if stored_prices:
+                if self.cache_manager.write_through_prices(stored_prices):
+                    logging.info(f"最新价格缓存写穿成功: {len(stored_prices)} 条")
+                else:
+                    logging.warning("最新价格缓存写穿失败")
+            
             # 缓存实时数据到Redis
             logging.info("开始缓存实时数据到Redis")
             
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+K线重采样
+minute/hour/day 三个粒度直接对应数据表，其余周期（如 5m、15m、4h、1w）从能整除它的最粗的表读取，
+按时间桶向量化聚合 OHLCV：开盘取桶内第一根、最高取最大、最低取最小、收盘取最后一根、成交量求和
+"""
+
+import re
+
+import numpy as np
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+WEEK_MS = 7 * DAY_MS
+
+# 数据表对应的基础粒度（由粗到细）
+BASE_TIMEFRAMES = [('day', DAY_MS), ('hour', HOUR_MS), ('minute', MINUTE_MS)]
+UNIT_MS = {'m': MINUTE_MS, 'h': HOUR_MS, 'd': DAY_MS, 'w': WEEK_MS}
+# 周K线从周一 00:00 UTC 开始（1970-01-01 是周四）
+WEEK_OFFSET_MS = 4 * DAY_MS
+# 单次重采样最多读取的源K线条数
+MAX_SOURCE_ROWS = 20000
+
+_TIMEFRAME_PATTERN = re.compile(r'^(\d+)([mhdw])$')
+
+
+def timeframe_ms(timeframe):
+    """周期长度（毫秒），不支持的周期抛出 ValueError"""
+    for name, length in BASE_TIMEFRAMES:
+        if timeframe == name:
+            return length
+    match = _TIMEFRAME_PATTERN.match(str(timeframe).strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"不支持的时间粒度: {timeframe}")
+    return int(match.group(1)) * UNIT_MS[match.group(2)]
+
+
+def base_timeframe(timeframe):
+    """读取源数据的基础粒度（能整除该周期的最粗的表）"""
+    length = timeframe_ms(timeframe)
+    for name, base_length in BASE_TIMEFRAMES:
+        if length % base_length == 0:
+            return name
+    raise ValueError(f"不支持的时间粒度: {timeframe}")
+
+
+def normalize_timeframe(timeframe):
+    """
+    规范化周期名称：等于基础粒度时返回 minute/hour/day，否则返回最大整数单位的写法（如 60m -> hour，14d -> 2w）
+    不支持的周期抛出 ValueError
+    """
+    length = timeframe_ms(timeframe)
+    for name, base_length in BASE_TIMEFRAMES:
+        if length == base_length:
+            return name
+    for unit in ('w', 'd', 'h', 'm'):
+        if length % UNIT_MS[unit] == 0:
+            return f"{length // UNIT_MS[unit]}{unit}"
+
+
+def is_native(timeframe):
+    """是否直接对应数据表"""
+    return timeframe in dict(BASE_TIMEFRAMES)
+
+
+def bucket_offset(length):
+    """时间桶的对齐偏移：整周的周期按周一对齐，其余按 UTC 零点对齐"""
+    return WEEK_OFFSET_MS if length % WEEK_MS == 0 else 0
+
+
+def resample_ohlcv(timestamps, open_, high, low, close, volume, length):
+    """
+    按 length 毫秒的时间桶聚合按时间升序的K线，返回 (桶起始时间戳, open, high, low, close, volume) 数组
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if len(timestamps) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return np.empty(0, dtype=np.int64), empty, empty, empty, empty, empty
+
+    offset = bucket_offset(length)
+    buckets = (timestamps - offset) // length
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(timestamps)])) - 1
+    return (
+        buckets[starts] * length + offset,
+        np.asarray(open_, dtype=np.float64)[starts],
+        np.maximum.reduceat(np.asarray(high, dtype=np.float64), starts),
+        np.minimum.reduceat(np.asarray(low, dtype=np.float64), starts),
+        np.asarray(close, dtype=np.float64)[ends],
+        np.add.reduceat(np.asarray(volume, dtype=np.float64), starts)
+    )
+
+
+def resample_rows(rows, timeframe, limit=None):
+    """
+    重采样数据库行 (symbol, date, open, high, low, close, volume)，输入输出均为按时间倒序，
+    date 为 UTC 无时区时间（桶起始时间），多个币种分别聚合
+    """
+    length = timeframe_ms(timeframe)
+    by_symbol = {}
+    for row in rows:
+        by_symbol.setdefault(row[0], []).append(row)
+
+    result = []
+    for symbol, symbol_rows in by_symbol.items():
+        symbol_rows.sort(key=lambda row: row[1])
+        dates = np.array([row[1] for row in symbol_rows], dtype='datetime64[ms]').astype(np.int64)
+        columns = np.array([row[2:7] for row in symbol_rows], dtype=np.float64)
+        columns[:, 4] = np.nan_to_num(columns[:, 4])
+        timestamps, open_, high, low, close, volume = resample_ohlcv(
+            dates, columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3], columns[:, 4], length)
+        bucket_dates = timestamps.astype('datetime64[ms]').tolist()
+        result.extend(zip([symbol] * len(timestamps), bucket_dates, open_.tolist(), high.tolist(),
+                          low.tolist(), close.tolist(), volume.tolist()))
+
+    result.sort(key=lambda row: row[1], reverse=True)
+    return result[:limit] if limit is not None else result
+
+
+def load_kline_table(db, timeframe, symbol, limit=100, connection=None):
+    """
+    读取单个币种任意周期的K线为 (n, 6) float64 数组 [timestamp, open, high, low, close, volume]，按时间升序
+    查询结果按时间倒序，直接反转；非基础粒度的处理同 load_history
+    """
+    base = timeframe if is_native(timeframe) else base_timeframe(timeframe)
+    ratio = timeframe_ms(timeframe) // timeframe_ms(base)
+    source_limit = limit if ratio == 1 else min((limit + 1) * ratio, MAX_SOURCE_ROWS)
+    rows = db.get_kline_rows(base, symbol, source_limit, connection=connection)
+    if not rows:
+        return np.empty((0, 6), dtype=np.float64)
+
+    table = np.array(rows, dtype=np.float64)[::-1]
+    if ratio == 1:
+        return table
+
+    table = np.column_stack(resample_ohlcv(table[:, 0].astype(np.int64), table[:, 1], table[:, 2],
+                                           table[:, 3], table[:, 4], table[:, 5], timeframe_ms(timeframe)))
+    # 源数据被 LIMIT 截断时，最早的桶可能不完整
+    if len(rows) >= source_limit and len(table) > 1:
+        table = table[1:]
+    return table[-limit:]
+
+
+def table_to_kline(table):
+    """(n, 6) 数组转换为接口使用的K线列表 [timestamp(int), open, high, low, close, volume]"""
+    return [[timestamp, *values] for timestamp, values in
+            zip(table[:, 0].astype(np.int64).tolist(), table[:, 1:].tolist())]
+
+
+def load_history(db, timeframe, symbol=None, limit=100, connection=None):
+    """
+    读取任意周期的历史数据（格式同 CryptoDatabase.get_historical_data，按时间倒序）
+    基础粒度直接查询，其余周期多读取一个桶的源K线后重采样，丢弃最早可能不完整的桶
+    """
+    if is_native(timeframe):
+        return db.get_historical_data(timeframe, symbol, limit, connection=connection)
+
+    base = base_timeframe(timeframe)
+    ratio = timeframe_ms(timeframe) // timeframe_ms(base)
+    source_limit = min((limit + 1) * ratio, MAX_SOURCE_ROWS)
+    rows = db.get_historical_data(base, symbol, source_limit, connection=connection)
+    if not rows:
+        return rows
+
+    resampled = resample_rows(rows, timeframe)
+    # 单个币种的源数据被 LIMIT 截断时，最早的桶可能不完整
+    if symbol and len(rows) >= source_limit and len(resampled) > 1:
+        resampled = resampled[:-1]
+    return resampled[:limit]
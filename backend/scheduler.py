@@ -19,6 +19,7 @@ load_dotenv()
 from data_processor import run_data_processing
 from crypto_analyzer import run_analysis
 from realtime_processor import run_realtime_processor
+from kline_retention import run_kline_retention
 
 # 配置日志
 logging.basicConfig(
@@ -50,11 +51,15 @@ class CryptoScheduler:
         # 每天凌晨2点运行完整处理
         schedule.every().day.at("02:00").do(self.run_full_processing)
         
+        # 每天凌晨3点清理K线输出
+        schedule.every().day.at("03:00").do(self.run_kline_retention_task)
+        
         logging.info("定时任务设置完成")
         logging.info("- 数据收集: 每1分钟")
         logging.info("- 实时处理: 每15秒")
         logging.info("- 分析任务: 每小时")
         logging.info("- 完整处理: 每天凌晨2点")
+        logging.info("- K线输出清理: 每天凌晨3点")
     
     def run_realtime_task(self):
         """运行实时数据处理任务"""
@@ -89,6 +94,18 @@ class CryptoScheduler:
         except Exception as e:
             logging.error(f"定时分析任务异常: {str(e)}")
     
+    def run_kline_retention_task(self):
+        """运行K线输出清理任务"""
+        logging.info("执行K线输出清理任务")
+        try:
+            report = run_kline_retention()
+            if report is not None:
+                logging.info(f"K线输出清理任务完成，回收 {report['bytes_reclaimed']} 字节")
+            else:
+                logging.error("K线输出清理任务失败")
+        except Exception as e:
+            logging.error(f"K线输出清理任务异常: {str(e)}")
+    
     def run_full_processing(self):
         """运行完整处理流程"""
         logging.info("执行完整处理流程")
@@ -4,38 +4,70 @@
 只使用基础Redis功能，不依赖集群库
 """
 
-import json
 import time
 import hashlib
 import os
-from typing import Any, Optional, Dict
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from functools import wraps
+import inspect
+from typing import Any, Callable, Optional, Dict, List
 import logging
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from cache_codecs import get_serializer
+from cache_metrics import get_cache_metrics, namespace_of
+import resample
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 索引集合的最短过期时间（秒），每次写入时续期
+INDEX_EXPIRE = 24 * 3600
+# 批量删除时每批的键数，避免单条DEL阻塞过久
+DELETE_BATCH_SIZE = 500
+
 class SimpleRedisManager:
     """简化版Redis缓存管理器"""
     
-    def __init__(self, host=None, port=None, db=None, password=None):
-        """初始化Redis连接"""
+    def __init__(self, host=None, port=None, db=None, password=None, backend=None):
+        """初始化Redis连接，backend 为 redis（默认）或 memory（进程内替身）"""
         self.redis_client = None
+        self.backend = (backend or os.getenv('CACHE_BACKEND', 'redis')).lower()
         self.host = host or os.getenv('REDIS_HOST', 'localhost')
         self.port = int(port or os.getenv('REDIS_PORT', 6379))
         self.db = int(db or os.getenv('REDIS_DB', 0))
         self.password = password or os.getenv('REDIS_PASSWORD')
+        self.serializer = get_serializer()
+        self.metrics = get_cache_metrics()
         self._connect()
     
     def _connect(self):
         """连接到Redis"""
+        if self.backend == 'memory':
+            from memory_redis import get_memory_redis
+            self.redis_client = get_memory_redis(self.db)
+            logger.info("✅ 使用进程内Redis替身 (CACHE_BACKEND=memory)")
+            return
+        
         try:
             import redis
             redis_config = {
                 'host': self.host,
                 'port': self.port,
                 'db': self.db,
-                'decode_responses': True,
+                # 缓存值为带编码标记的二进制，由序列化器负责解码
+                'decode_responses': False,
                 'socket_timeout': 5,
                 'socket_connect_timeout': 5
             }
@@ -65,48 +97,131 @@ class SimpleRedisManager:
         except:
             return False
     
-    def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
-        """设置缓存"""
+    def set(self, key: str, value: Any, expire: Optional[int] = None, tags: Optional[List[str]] = None) -> bool:
+        """设置缓存，tags 为需要记录该键的索引集合"""
         if not self.is_connected():
             return False
         
+        namespace = namespace_of(key)
         try:
             # 序列化数据
-            if isinstance(value, (dict, list)):
-                serialized_value = json.dumps(value, ensure_ascii=False)
-            else:
-                serialized_value = str(value)
+            started = time.perf_counter()
+            serialized_value = self.serializer.dumps(value)
+            encoded = time.perf_counter()
+            self.metrics.observe(namespace, 'encode', encoded - started)
+            self.metrics.incr(namespace, 'bytes_written', len(serialized_value))
             
-            # 设置缓存
+            # 在同一个管道中写入值并登记索引集合
+            pipe = self.redis_client.pipeline(transaction=False)
             if expire:
-                result = self.redis_client.setex(key, expire, serialized_value)
+                pipe.setex(key, expire, serialized_value)
             else:
-                result = self.redis_client.set(key, serialized_value)
+                pipe.set(key, serialized_value)
+            for tag in tags or []:
+                pipe.sadd(tag, key)
+                pipe.expire(tag, max(expire or 0, INDEX_EXPIRE))
             
-            return bool(result)
+            result = pipe.execute()
+            self.metrics.observe(namespace, 'rtt', time.perf_counter() - encoded)
+            return bool(result[0])
         except Exception as e:
+            self.metrics.incr(namespace, 'errors')
             logger.error(f"设置缓存失败 {key}: {e}")
             return False
     
+    def set_many(self, items: List[tuple]) -> int:
+        """
+        在一个管道中批量写入缓存，items 为 (key, value, expire, tags) 列表
+        返回写入成功的条数
+        """
+        if not items or not self.is_connected():
+            return 0
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            value_positions = []
+            queued = 0
+            for key, value, expire, tags in items:
+                namespace = namespace_of(key)
+                started = time.perf_counter()
+                serialized_value = self.serializer.dumps(value)
+                self.metrics.observe(namespace, 'encode', time.perf_counter() - started)
+                self.metrics.incr(namespace, 'bytes_written', len(serialized_value))
+                
+                value_positions.append(queued)
+                queued += 1 + 2 * len(tags or [])
+                if expire:
+                    pipe.setex(key, expire, serialized_value)
+                else:
+                    pipe.set(key, serialized_value)
+                for tag in tags or []:
+                    pipe.sadd(tag, key)
+                    pipe.expire(tag, max(expire or 0, INDEX_EXPIRE))
+            
+            started = time.perf_counter()
+            results = pipe.execute()
+            self.metrics.observe(namespace_of(items[0][0]), 'rtt', time.perf_counter() - started)
+            return sum(1 for position in value_positions if results[position])
+        except Exception as e:
+            self.metrics.incr(namespace_of(items[0][0]), 'errors')
+            logger.error(f"批量设置缓存失败: {e}")
+            return 0
+    
     def get(self, key: str) -> Optional[Any]:
         """获取缓存"""
         if not self.is_connected():
             return None
         
+        namespace = namespace_of(key)
         try:
+            started = time.perf_counter()
             value = self.redis_client.get(key)
+            self.metrics.observe(namespace, 'rtt', time.perf_counter() - started)
             if value is None:
                 return None
             
-            # 尝试反序列化JSON
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return value
+            return self._decode(namespace, value)
         except Exception as e:
+            self.metrics.incr(namespace, 'errors')
             logger.error(f"获取缓存失败 {key}: {e}")
             return None
     
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """一次往返批量获取缓存"""
+        if not keys or not self.is_connected():
+            return [None] * len(keys)
+        
+        try:
+            started = time.perf_counter()
+            values = self.redis_client.mget(keys)
+            # 一次往返按第一个键的命名空间计入
+            self.metrics.observe(namespace_of(keys[0]), 'rtt', time.perf_counter() - started)
+            return [None if value is None else self._decode(namespace_of(key), value)
+                    for key, value in zip(keys, values)]
+        except Exception as e:
+            self.metrics.incr(namespace_of(keys[0]), 'errors')
+            logger.error(f"批量获取缓存失败: {e}")
+            return [None] * len(keys)
+    
+    def _decode(self, namespace: str, raw: bytes) -> Any:
+        """解码缓存值并记录读取字节数和解码耗时"""
+        started = time.perf_counter()
+        value = self.serializer.loads(raw)
+        self.metrics.observe(namespace, 'decode', time.perf_counter() - started)
+        self.metrics.incr(namespace, 'bytes_read', len(raw))
+        return value
+    
+    def incr(self, key: str) -> Optional[int]:
+        """计数器加一"""
+        if not self.is_connected():
+            return None
+        
+        try:
+            return int(self.redis_client.incr(key))
+        except Exception as e:
+            logger.error(f"计数器自增失败 {key}: {e}")
+            return None
+    
     def delete(self, *keys: str) -> int:
         """删除缓存"""
         if not self.is_connected():
@@ -150,128 +265,669 @@ class SimpleRedisManager:
         except Exception as e:
             logger.error(f"获取TTL失败 {key}: {e}")
             return -1
+    
+    def acquire_lock(self, name: str, expire: int = 10) -> Optional[str]:
+        """获取分布式锁，成功返回锁令牌"""
+        if not self.is_connected():
+            return None
+        
+        token = uuid.uuid4().hex
+        try:
+            if self.redis_client.set(name, token, nx=True, ex=expire):
+                return token
+            return None
+        except Exception as e:
+            logger.error(f"获取锁失败 {name}: {e}")
+            return None
+    
+    def release_lock(self, name: str, token: str) -> bool:
+        """释放分布式锁（只释放自己持有的锁）"""
+        if not self.is_connected():
+            return False
+        
+        try:
+            current = self.redis_client.get(name)
+            if isinstance(current, bytes):
+                current = current.decode('utf-8')
+            if current == token:
+                return bool(self.redis_client.delete(name))
+            return False
+        except Exception as e:
+            logger.error(f"释放锁失败 {name}: {e}")
+            return False
+    
+    def smembers(self, name: str) -> List[str]:
+        """获取集合成员"""
+        if not self.is_connected():
+            return []
+        
+        try:
+            return [
+                member.decode('utf-8') if isinstance(member, bytes) else member
+                for member in self.redis_client.smembers(name)
+            ]
+        except Exception as e:
+            logger.error(f"获取集合成员失败 {name}: {e}")
+            return []
+    
+    def existing_keys(self, keys: List[str]) -> List[str]:
+        """批量检查键是否存在，返回仍存在的键"""
+        if not keys or not self.is_connected():
+            return []
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.exists(key)
+            return [key for key, found in zip(keys, pipe.execute()) if found]
+        except Exception as e:
+            logger.error(f"批量检查键失败: {e}")
+            return []
+    
+    def scan_keys(self, match: str, count: int = 500) -> List[str]:
+        """使用SCAN遍历匹配的键（不阻塞Redis）"""
+        if not self.is_connected():
+            return []
+        
+        try:
+            return [
+                key.decode('utf-8') if isinstance(key, bytes) else key
+                for key in self.redis_client.scan_iter(match=match, count=count)
+            ]
+        except Exception as e:
+            logger.error(f"扫描键失败 {match}: {e}")
+            return []
+
+class LocalCache:
+    """进程内本地缓存（一级缓存），带TTL和LRU淘汰"""
+    
+    _MISSING = object()
+    
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """获取未过期的值"""
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is self._MISSING:
+                return default
+            expires_at, value = item
+            if time.time() >= expires_at:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any, expire: int):
+        """写入值"""
+        with self._lock:
+            self._data[key] = (time.time() + expire, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def invalidate_prefix(self, prefix: str) -> int:
+        """删除指定前缀的所有键"""
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(prefix)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+    
+    def clear(self):
+        """清空本地缓存"""
+        with self._lock:
+            self._data.clear()
 
 class CryptoCacheManager:
     """加密货币缓存管理器"""
     
+    # 索引集合前缀：ns:<命名空间> / sym:<币种> 记录写入过的键
+    INDEX_PREFIX = "crypto:idx:"
+    
     def __init__(self):
         self.redis = SimpleRedisManager()
         self.default_expire = 30  # 30秒默认过期时间，提高数据实时性
+        self.stale_grace = 60  # 软过期后仍可返回旧数据的宽限时间（秒）
+        self.lock_expire = 10  # 单飞加载锁的过期时间（秒）
+        self.wait_timeout = 3  # 等待其他进程加载结果的最长时间（秒）
+        self.versioned_expire = 3600  # 带版本号条目的硬过期时间（软过期或版本变化后先返回旧值并后台刷新）
+        self.chart_expire = 120  # 图表数据软过期时间（秒）
+        self.latest_prices_expire = 20  # 最新价格列表软过期时间（秒）
+        self.indicator_state_expire = 7 * 24 * 3600  # 增量指标状态保留时间，过期后从历史数据重建
+        self.tick_max_count = 3000  # tick缓冲最多保留条数
+        self.tick_max_age = 24 * 3600  # tick缓冲最长保留时间（秒）
+        
+        # 进程内单飞状态
+        self._key_locks = {}  # 键 -> [锁, 持有和等待的线程数]
+        self._key_locks_guard = threading.Lock()
+        self._refreshing = set()
+        
+        # 进程内一级缓存
+        self.local = LocalCache()
+        
+        # 本进程已登记到索引注册表的命名空间和币种
+        self._registered_namespaces = set()
+        self._registered_symbols = set()
+        
+        # 命中率与延迟指标
+        self.metrics = self.redis.metrics
+    
+    def _record_lookup(self, key: str, value: Any) -> Any:
+        """记录一次缓存查询的命中或未命中，原样返回查询结果"""
+        self.metrics.incr(namespace_of(key), 'misses' if value is None else 'hits')
+        return value
+    
+    @staticmethod
+    def _version_key(version_scope: str) -> str:
+        return f"crypto:version:{version_scope}"
+    
+    def get_version(self, version_scope: str) -> Optional[int]:
+        """获取数据版本号（从未更新过时为None）"""
+        return self.redis.get(self._version_key(version_scope))
+    
+    def bump_version(self, version_scope: str) -> Optional[int]:
+        """数据入库后递增版本号，使旧版本的缓存条目失效"""
+        return self.redis.incr(self._version_key(version_scope))
+    
+    def _read_entry(self, key: str, version_scope: Optional[str] = None):
+        """读取带软过期时间的缓存条目，返回 (数据, 软过期时间戳)"""
+        if version_scope:
+            value, current_version = self.redis.get_many([key, self._version_key(version_scope)])
+        else:
+            value, current_version = self.redis.get(key), None
+        
+        if not isinstance(value, dict) or '_fresh_until' not in value:
+            return None
+        
+        fresh_until = value['_fresh_until']
+        if current_version is not None and '_version' in value and value['_version'] != current_version:
+            # 版本变化后立即视为过期；版本不变时仍按软过期时间回源，保证参考数据定期从数据库刷新
+            fresh_until = 0
+        return value.get('data'), fresh_until
+    
+    def _index_tags(self, key: str, symbol: Optional[str] = None) -> List[str]:
+        """键写入时需要登记的索引集合"""
+        namespace = namespace_of(key, grouped=False)
+        tags = [f"{self.INDEX_PREFIX}ns:{namespace}"]
+        if namespace == 'func':
+            # crypto:func:<函数命名空间>:<参数哈希>，按函数登记以支持单独失效
+            tags.append(f"{self.INDEX_PREFIX}func:{key.split(':')[2]}")
+        if symbol:
+            tags.append(f"{self.INDEX_PREFIX}sym:{symbol.upper()}")
+        return tags
+    
+    def _set(self, key: str, value: Any, expire: Optional[int], symbol: Optional[str] = None) -> bool:
+        """写入缓存并登记命名空间/币种索引"""
+        if not self.redis.set(key, value, expire, tags=self._index_tags(key, symbol)):
+            return False
+        
+        namespace = namespace_of(key, grouped=False)
+        symbol = symbol.upper() if symbol else None
+        if namespace not in self._registered_namespaces or (symbol and symbol not in self._registered_symbols):
+            self._register_indexes(namespace, symbol)
+        return True
+    
+    def _register_indexes(self, namespace: str, symbol: Optional[str]):
+        """登记已使用的命名空间和币种，供全量清理和统计时遍历（每个进程只登记一次）"""
+        try:
+            pipe = self.redis.redis_client.pipeline(transaction=False)
+            pipe.sadd(f"{self.INDEX_PREFIX}namespaces", namespace)
+            if symbol:
+                pipe.sadd(f"{self.INDEX_PREFIX}symbols", symbol)
+            pipe.execute()
+            self._registered_namespaces.add(namespace)
+            if symbol:
+                self._registered_symbols.add(symbol)
+        except Exception as e:
+            logger.warning(f"登记缓存索引失败 {namespace}: {e}")
+    
+    def _write_entry(self, key: str, data: Any, ttl: int, stale_ttl: Optional[int] = None,
+                     symbol: Optional[str] = None, version_scope: Optional[str] = None,
+                     version: Optional[int] = None) -> bool:
+        """
+        写入带软过期时间的缓存条目，硬过期 = 软过期 + 宽限时间
+        指定 version_scope 时记录加载前的数据版本号，版本不变时条目保留更久
+        """
+        stale_ttl = self.stale_grace if stale_ttl is None else stale_ttl
+        entry = {'data': data, '_fresh_until': time.time() + ttl}
+        expire = ttl + stale_ttl
+        if version_scope:
+            entry['_version'] = self.get_version(version_scope) if version is None else version
+            expire = max(expire, self.versioned_expire)
+        return self._set(key, entry, expire, symbol)
+    
+    def _write_through(self, key: str, cached: Dict, data: Any, version: int, symbol: Optional[str] = None) -> bool:
+        """
+        写穿：用新数据替换已有条目并标记为新版本，保留原条目的软过期时间和剩余硬过期时间，
+        写穿不会延长条目寿命，到期后仍从数据库重新加载
+        """
+        expire = self.redis.ttl(key)
+        if expire is None or expire <= 0:
+            return True
+        entry = {'data': data, '_fresh_until': cached['_fresh_until'], '_version': version}
+        return self._set(key, entry, expire, symbol)
+    
+    def write_entries(self, entries: List[Dict]) -> int:
+        """
+        批量写入带软过期时间的缓存条目（版本号一次读取，值在一个管道中写入）
+        entries 中每项包含 key, data, ttl，可选 stale_ttl, symbol, version_scope
+        """
+        if not entries:
+            return 0
+        
+        scopes = sorted({entry['version_scope'] for entry in entries if entry.get('version_scope')})
+        versions = dict(zip(scopes, self.redis.get_many([self._version_key(scope) for scope in scopes])))
+        
+        now = time.time()
+        items = []
+        for entry in entries:
+            stale_ttl = self.stale_grace if entry.get('stale_ttl') is None else entry['stale_ttl']
+            value = {'data': entry['data'], '_fresh_until': now + entry['ttl']}
+            expire = entry['ttl'] + stale_ttl
+            if entry.get('version_scope'):
+                value['_version'] = versions.get(entry['version_scope'])
+                expire = max(expire, self.versioned_expire)
+            items.append((entry['key'], value, expire, self._index_tags(entry['key'], entry.get('symbol'))))
+        
+        written = self.redis.set_many(items)
+        for entry in entries:
+            namespace = namespace_of(entry['key'], grouped=False)
+            symbol = entry['symbol'].upper() if entry.get('symbol') else None
+            if namespace not in self._registered_namespaces or (symbol and symbol not in self._registered_symbols):
+                self._register_indexes(namespace, symbol)
+        return written
+    
+    @contextmanager
+    def _key_lock(self, key: str):
+        """进程内的键级互斥锁：按引用计数创建，最后一个持有或等待的线程退出时移除"""
+        with self._key_locks_guard:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._key_locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+    
+    def _wait_for_entry(self, key: str, version_scope: Optional[str] = None):
+        """等待其他进程完成加载"""
+        deadline = time.time() + self.wait_timeout
+        while time.time() < deadline:
+            time.sleep(0.05)
+            entry = self._read_entry(key, version_scope)
+            if entry is not None:
+                return entry
+        return None
+    
+    def _load_single_flight(self, key: str, loader: Callable[[], Any], ttl: int, stale_ttl: Optional[int],
+                            symbol: Optional[str] = None, should_cache: Callable[[Any], bool] = bool,
+                            version_scope: Optional[str] = None) -> Any:
+        """单飞加载：同一个键同时只有一个请求回源"""
+        with self._key_lock(key):
+            # 等锁期间可能已被其他线程写入
+            entry = self._read_entry(key, version_scope)
+            if entry is not None and time.time() < entry[1]:
+                return entry[0]
+            
+            lock_name = f"crypto:lock:{key}"
+            token = self.redis.acquire_lock(lock_name, self.lock_expire)
+            if token is None and self.redis.is_connected():
+                entry = self._wait_for_entry(key, version_scope)
+                if entry is not None:
+                    return entry[0]
+                logger.warning(f"等待缓存加载超时，直接回源: {key}")
+            
+            try:
+                # 先取版本号再回源，避免把加载期间入库前的旧数据标记为新版本
+                version = self.get_version(version_scope) if version_scope else None
+                data = self._timed_load(key, loader)
+                if should_cache(data):
+                    self._write_entry(key, data, ttl, stale_ttl, symbol, version_scope, version)
+                return data
+            finally:
+                if token:
+                    self.redis.release_lock(lock_name, token)
+    
+    def _timed_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """回源加载并记录次数和耗时"""
+        namespace = namespace_of(key)
+        started = time.perf_counter()
+        try:
+            return loader()
+        finally:
+            self.metrics.incr(namespace, 'loads')
+            self.metrics.observe(namespace, 'load', time.perf_counter() - started)
+    
+    def _refresh_in_background(self, key: str, loader: Callable[[], Any], ttl: int, stale_ttl: Optional[int],
+                               symbol: Optional[str] = None, should_cache: Callable[[Any], bool] = bool,
+                               version_scope: Optional[str] = None):
+        """后台刷新已软过期的缓存"""
+        with self._key_locks_guard:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        
+        def _worker():
+            lock_name = f"crypto:lock:{key}"
+            token = None
+            try:
+                token = self.redis.acquire_lock(lock_name, self.lock_expire)
+                if token is None:
+                    # 其他进程正在刷新
+                    return
+                version = self.get_version(version_scope) if version_scope else None
+                data = self._timed_load(key, loader)
+                if should_cache(data):
+                    self._write_entry(key, data, ttl, stale_ttl, symbol, version_scope, version)
+                    logger.info(f"后台刷新缓存完成: {key}")
+            except Exception as e:
+                logger.error(f"后台刷新缓存失败 {key}: {e}")
+            finally:
+                if token:
+                    self.redis.release_lock(lock_name, token)
+                with self._key_locks_guard:
+                    self._refreshing.discard(key)
+        
+        threading.Thread(target=_worker, name=f"cache-refresh:{key}", daemon=True).start()
+    
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: int, stale_ttl: Optional[int] = None,
+                    symbol: Optional[str] = None, should_cache: Callable[[Any], bool] = bool,
+                    version_scope: Optional[str] = None) -> Any:
+        """
+        带击穿保护的缓存读取
+        - 新鲜数据直接返回
+        - 软过期数据先返回旧值，并在后台刷新
+        - 缓存缺失时单飞加载，其余请求等待结果
+        should_cache 决定加载结果是否写入缓存（默认只缓存非空结果）
+        version_scope 指定后，该范围的数据版本变化时条目立即视为软过期
+        """
+        namespace = namespace_of(key)
+        entry = self._read_entry(key, version_scope)
+        if entry is not None:
+            data, fresh_until = entry
+            self.metrics.incr(namespace, 'hits')
+            if time.time() >= fresh_until:
+                self.metrics.incr(namespace, 'stale_serves')
+                self._refresh_in_background(key, loader, ttl, stale_ttl, symbol, should_cache, version_scope)
+            return data
+        
+        self.metrics.incr(namespace, 'misses')
+        return self._load_single_flight(key, loader, ttl, stale_ttl, symbol, should_cache, version_scope)
     
     def cache_price(self, symbol: str, price_data: Dict) -> bool:
         """缓存价格数据"""
         key = f"crypto:price:{symbol.upper()}"
-        return self.redis.set(key, price_data, self.default_expire)
+        return self._set(key, price_data, self.default_expire, symbol)
     
     def get_price(self, symbol: str) -> Optional[Dict]:
         """获取价格数据"""
         key = f"crypto:price:{symbol.upper()}"
-        return self.redis.get(key)
+        return self._record_lookup(key, self.redis.get(key))
     
     def cache_chart_data(self, symbol: str, timeframe: str, data: list) -> bool:
         """缓存图表数据"""
         key = f"crypto:chart:{symbol.upper()}:{timeframe}"
         # 图表数据缓存时间减少，提高实时性
-        return self.redis.set(key, data, 120)  # 2分钟
+        return self._write_entry(key, data, self.chart_expire, symbol=symbol,
+                                 version_scope=self._chart_scope(symbol, timeframe))
     
     def get_chart_data(self, symbol: str, timeframe: str) -> Optional[list]:
         """获取图表数据"""
         key = f"crypto:chart:{symbol.upper()}:{timeframe}"
-        return self.redis.get(key)
+        entry = self._read_entry(key, self._chart_scope(symbol, timeframe))
+        return self._record_lookup(key, entry[0] if entry else None)
+    
+    def get_or_load_chart_data(self, symbol: str, timeframe: str, loader: Callable[[], list]) -> list:
+        """获取图表数据，缓存失效时单飞回源"""
+        key = f"crypto:chart:{symbol.upper()}:{timeframe}"
+        return self.get_or_load(key, loader, self.chart_expire, symbol=symbol,
+                                version_scope=self._chart_scope(symbol, timeframe))
+    
+    def chart_entry(self, symbol: str, timeframe: str, data: list) -> Dict:
+        """图表数据的批量写入条目（供 write_entries 使用）"""
+        return {
+            'key': f"crypto:chart:{symbol.upper()}:{timeframe}",
+            'data': data,
+            'ttl': self.chart_expire,
+            'symbol': symbol,
+            'version_scope': self._chart_scope(symbol, timeframe)
+        }
+    
+    @staticmethod
+    def _chart_scope(symbol: str, timeframe: str) -> str:
+        """
+        图表数据的版本范围：(币种, 时间粒度)
+        重采样周期（如 15m）与其源数据表的粒度共用版本号，源K线写入后一并失效
+        """
+        try:
+            timeframe = resample.base_timeframe(timeframe)
+        except ValueError:
+            pass
+        return f"{symbol.upper()}:{timeframe}"
+    
+    def write_through_candles(self, symbol: str, timeframe: str, candles: list) -> bool:
+        """
+        K线入库后写穿图表缓存
+        递增 (币种, 时间粒度) 的版本号，并把新K线合并进已有的缓存条目；
+        条目不存在时只更新版本号，由读取方按需加载
+        """
+        scope = self._chart_scope(symbol, timeframe)
+        version = self.bump_version(scope)
+        if version is None:
+            return False
+        
+        key = f"crypto:chart:{symbol.upper()}:{timeframe}"
+        cached = self.redis.get(key)
+        if not isinstance(cached, dict) or not cached.get('data') or '_fresh_until' not in cached:
+            return True
+        
+        # 缓存中的图表数据按时间倒序，合并后保持原有条数
+        rows = {row['date']: row for row in cached['data']}
+        for candle in candles:
+            rows[candle['date']] = candle
+        merged = sorted(rows.values(), key=lambda row: row['date'], reverse=True)[:len(cached['data'])]
+        
+        return self._write_through(key, cached, merged, version, symbol)
     
     def cache_latest_prices(self, prices: list) -> bool:
         """缓存最新价格列表"""
         key = "crypto:latest_prices"
-        return self.redis.set(key, prices, 20)  # 20秒，提高实时性
+        return self._write_entry(key, prices, self.latest_prices_expire, version_scope='prices')
     
     def get_latest_prices(self) -> Optional[list]:
         """获取最新价格列表"""
         key = "crypto:latest_prices"
-        return self.redis.get(key)
+        entry = self._read_entry(key, 'prices')
+        return self._record_lookup(key, entry[0] if entry else None)
+    
+    def get_or_load_latest_prices(self, loader: Callable[[], list]) -> list:
+        """获取最新价格列表，缓存失效时单飞回源"""
+        return self.get_or_load("crypto:latest_prices", loader, self.latest_prices_expire, version_scope='prices')
+    
+    def latest_prices_entry(self, prices: list) -> Dict:
+        """最新价格列表的批量写入条目（供 write_entries 使用）"""
+        return {
+            'key': "crypto:latest_prices",
+            'data': prices,
+            'ttl': self.latest_prices_expire,
+            'version_scope': 'prices'
+        }
+    
+    def write_through_prices(self, prices: List[Dict]) -> bool:
+        """
+        最新价格入库后写穿价格列表缓存
+        prices 为 {'symbol', 'price', 'timestamp'} 列表；24小时涨跌幅沿用原缓存中的参考价重新计算
+        """
+        version = self.bump_version('prices')
+        if version is None:
+            return False
+        
+        key = "crypto:latest_prices"
+        cached = self.redis.get(key)
+        if not isinstance(cached, dict) or not cached.get('data') or '_fresh_until' not in cached:
+            return True
+        
+        latest = {item['symbol']: item for item in prices}
+        updated = []
+        for item in cached['data']:
+            new_item = latest.get(item['symbol'])
+            if new_item:
+                item = dict(item)
+                change = item.get('change_24h') or 0.0
+                price_24h_ago = item['price'] / (1 + change / 100) if change != -100 else 0
+                item['price'] = new_item['price']
+                item['timestamp'] = new_item['timestamp']
+                if price_24h_ago:
+                    item['change_24h'] = (new_item['price'] - price_24h_ago) / price_24h_ago * 100
+            updated.append(item)
+        
+        return self._write_through(key, cached, updated, version)
     
     def cache_realtime_prices(self, prices: list) -> bool:
         """缓存实时价格列表（与历史数据分离）"""
         key = "crypto:realtime_prices"
-        return self.redis.set(key, prices, 30)  # 30秒过期，更短的缓存时间
+        return self._set(key, prices, 30)  # 30秒过期，更短的缓存时间
     
     def get_realtime_prices(self) -> Optional[list]:
         """获取实时价格列表"""
         key = "crypto:realtime_prices"
-        return self.redis.get(key)
-    
-    def clear_all_cache(self) -> bool:
-        """清理所有加密货币相关缓存"""
-        try:
-            # 获取所有crypto相关的键
-            if not self.redis.is_connected():
-                return False
-            
-            # 删除所有crypto相关的缓存
-            keys_to_delete = []
-            
-            # 使用scan来获取所有crypto相关的键
-            cursor = 0
-            while True:
-                cursor, keys = self.redis.redis_client.scan(cursor, match="crypto:*", count=100)
-                keys_to_delete.extend(keys)
-                if cursor == 0:
-                    break
-            
-            if keys_to_delete:
-                deleted_count = self.redis.delete(*keys_to_delete)
-                logger.info(f"清理了 {deleted_count} 个缓存键")
-                return True
-            else:
-                logger.info("没有找到需要清理的缓存")
-                return True
-                
-        except Exception as e:
-            logger.error(f"清理缓存失败: {e}")
-            return False
-    
-    def get_cache_stats(self) -> Dict:
-        """获取缓存统计信息"""
-        try:
-            if not self.redis.is_connected():
-                return {"error": "Redis未连接"}
-            
-            stats = {}
-            
-            # 获取所有crypto相关的键
-            cursor = 0
-            crypto_keys = []
-            while True:
-                cursor, keys = self.redis.redis_client.scan(cursor, match="crypto:*", count=100)
-                crypto_keys.extend(keys)
-                if cursor == 0:
-                    break
-            
-            stats["total_keys"] = len(crypto_keys)
-            stats["keys"] = []
-            
-            for key in crypto_keys:
-                ttl = self.redis.ttl(key)
-                stats["keys"].append({
-                    "key": key,
-                    "ttl": ttl,
-                    "exists": self.redis.exists(key)
-                })
-            
-            return stats
-            
-        except Exception as e:
-            logger.error(f"获取缓存统计失败: {e}")
-            return {"error": str(e)}
+        return self._record_lookup(key, self.redis.get(key))
     
     def cache_realtime_price(self, symbol: str, price_data: Dict) -> bool:
         """缓存单个币种的实时价格数据"""
         key = f"crypto:realtime:{symbol.upper()}"
-        return self.redis.set(key, price_data, 30)  # 30秒过期
+        return self._set(key, price_data, 30, symbol)  # 30秒过期
     
     def get_realtime_price(self, symbol: str) -> Optional[Dict]:
         """获取单个币种的实时价格数据"""
         key = f"crypto:realtime:{symbol.upper()}"
-        return self.redis.get(key)
+        return self._record_lookup(key, self.redis.get(key))
+    
+    def get_indicator_state(self, symbol: str, timeframe: str) -> Optional[Dict]:
+        """获取增量指标状态快照"""
+        key = f"crypto:indstate:{symbol.upper()}:{timeframe}"
+        return self._record_lookup(key, self.redis.get(key))
+    
+    def save_indicator_state(self, symbol: str, timeframe: str, state: Dict) -> bool:
+        """保存增量指标状态快照"""
+        key = f"crypto:indstate:{symbol.upper()}:{timeframe}"
+        return self._set(key, state, self.indicator_state_expire, symbol)
+    
+    def _indexed_keys(self, index_name: str, fallback_patterns: List[str]) -> List[str]:
+        """从索引集合获取键，索引不存在时回退到SCAN"""
+        if self.redis.exists(index_name):
+            return self.redis.smembers(index_name)
+        
+        keys = []
+        for pattern in fallback_patterns:
+            keys.extend(self.redis.scan_keys(pattern))
+        return keys
+    
+    def _namespace_keys(self, namespace: str) -> List[str]:
+        """获取某个命名空间下的键"""
+        return self._indexed_keys(
+            f"{self.INDEX_PREFIX}ns:{namespace}",
+            [f"crypto:{namespace}", f"crypto:{namespace}:*"]
+        )
+    
+    def _delete_keys(self, keys: List[str]) -> int:
+        """分批删除键"""
+        deleted = 0
+        for i in range(0, len(keys), DELETE_BATCH_SIZE):
+            deleted += self.redis.delete(*keys[i:i + DELETE_BATCH_SIZE])
+        return deleted
+    
+    def _clear_namespaces(self, namespaces: List[str]) -> int:
+        """删除若干命名空间下的所有键及其索引集合"""
+        deleted = 0
+        for namespace in namespaces:
+            keys = self._namespace_keys(namespace)
+            if keys:
+                deleted += self._delete_keys(keys)
+            self.redis.delete(f"{self.INDEX_PREFIX}ns:{namespace}")
+        return deleted
+    
+    def _known_namespaces(self) -> List[str]:
+        """已登记的命名空间（含内置命名空间）"""
+        namespaces = set(self.redis.smembers(f"{self.INDEX_PREFIX}namespaces"))
+        namespaces.update(['price', 'chart', 'latest_prices', 'realtime', 'realtime_prices'])
+        return sorted(namespaces)
+    
+    def append_tick(self, symbol: str, price: float, change_24h: Optional[float], timestamp_ms: int) -> bool:
+        """
+        追加一条实时报价到币种的tick环形缓冲（有序集合，score为毫秒时间戳）
+        只保留最近 tick_max_age 秒且最多 tick_max_count 条
+        """
+        if not self.redis.is_connected():
+            return False
+        
+        key = f"crypto:ticks:{symbol.upper()}"
+        member = f"{int(timestamp_ms)}|{float(price)!r}|{'' if change_24h is None else repr(float(change_24h))}"
+        cutoff = int(time.time() * 1000) - self.tick_max_age * 1000
+        namespace = namespace_of(key)
+        try:
+            started = time.perf_counter()
+            pipe = self.redis.redis_client.pipeline(transaction=False)
+            pipe.zadd(key, {member: int(timestamp_ms)})
+            pipe.zremrangebyscore(key, '-inf', f"({cutoff}")
+            pipe.zremrangebyrank(key, 0, -(self.tick_max_count + 1))
+            pipe.expire(key, self.tick_max_age)
+            for tag in self._index_tags(key, symbol):
+                pipe.sadd(tag, key)
+                pipe.expire(tag, max(self.tick_max_age, INDEX_EXPIRE))
+            pipe.execute()
+            self.metrics.observe(namespace, 'rtt', time.perf_counter() - started)
+            self.metrics.incr(namespace, 'bytes_written', len(member))
+            if 'ticks' not in self._registered_namespaces or symbol.upper() not in self._registered_symbols:
+                self._register_indexes('ticks', symbol.upper())
+            return True
+        except Exception as e:
+            self.metrics.incr(namespace, 'errors')
+            logger.error(f"写入tick缓冲失败 {symbol}: {e}")
+            return False
+    
+    def get_recent_ticks(self, symbol: str, seconds: int = 3600, limit: Optional[int] = None) -> List[Dict]:
+        """一次读取币种最近 seconds 秒内的tick序列（按时间升序）"""
+        if not self.redis.is_connected():
+            return []
+        
+        key = f"crypto:ticks:{symbol.upper()}"
+        start = int(time.time() * 1000) - int(seconds) * 1000
+        namespace = namespace_of(key)
+        try:
+            started = time.perf_counter()
+            if limit:
+                # 取时间窗口内最新的 limit 条
+                members = self.redis.redis_client.zrevrangebyscore(key, '+inf', start, start=0, num=int(limit))
+                members.reverse()
+            else:
+                members = self.redis.redis_client.zrangebyscore(key, start, '+inf')
+            self.metrics.observe(namespace, 'rtt', time.perf_counter() - started)
+        except Exception as e:
+            self.metrics.incr(namespace, 'errors')
+            logger.error(f"读取tick缓冲失败 {symbol}: {e}")
+            return []
+        
+        self._record_lookup(key, members or None)
+        self.metrics.incr(namespace, 'bytes_read', sum(len(member) for member in members))
+        ticks = []
+        for member in members:
+            if isinstance(member, bytes):
+                member = member.decode('utf-8')
+            ts, price, change = member.split('|')
+            ticks.append({
+                'timestamp_ms': int(ts),
+                'price': float(price),
+                'change_24h': float(change) if change else None
+            })
+        return ticks
     
     def invalidate_symbol(self, symbol: str):
         """清除某个币种的所有缓存"""
@@ -279,15 +935,32 @@ class CryptoCacheManager:
             return
         
         try:
-            # 由于是单节点Redis，使用keys命令查找
-            pattern = f"crypto:*:{symbol.upper()}*"
-            keys = self.redis.redis_client.keys(pattern)
+            index_name = f"{self.INDEX_PREFIX}sym:{symbol.upper()}"
+            keys = self._indexed_keys(index_name, [f"crypto:*:{symbol.upper()}*"])
             if keys:
-                self.redis.delete(*keys)
+                self._delete_keys(keys)
                 logger.info(f"清除 {symbol} 相关缓存: {len(keys)} 个键")
+            self.redis.delete(index_name)
         except Exception as e:
             logger.error(f"清除缓存失败: {e}")
     
+    def invalidate_function(self, namespace: str) -> int:
+        """清除某个被 cache_result 装饰的函数的所有缓存结果"""
+        self.local.invalidate_prefix(f"crypto:func:{namespace}:")
+        if not self.redis.is_connected():
+            return 0
+        
+        try:
+            index_name = f"{self.INDEX_PREFIX}func:{namespace}"
+            keys = self._indexed_keys(index_name, [f"crypto:func:{namespace}:*"])
+            deleted = self._delete_keys(keys) if keys else 0
+            self.redis.delete(index_name)
+            logger.info(f"清除函数缓存 {namespace}: {deleted} 个键")
+            return deleted
+        except Exception as e:
+            logger.error(f"清除函数缓存失败 {namespace}: {e}")
+            return 0
+    
     def get_cache_stats(self) -> dict:
         """获取缓存统计信息"""
         if not self.redis.is_connected():
@@ -296,14 +969,22 @@ class CryptoCacheManager:
                 'total_keys': 0,
                 'price_keys': 0,
                 'chart_keys': 0,
-                'memory_usage': 'N/A'
+                'memory_usage': 'N/A',
+                'metrics': self.metrics.snapshot(),
+                'functions': get_cached_function_stats()
             }
         
         try:
-            # 获取所有crypto相关的键
-            all_keys = self.redis.redis_client.keys("crypto:*")
-            price_keys = self.redis.redis_client.keys("crypto:price:*")
-            chart_keys = self.redis.redis_client.keys("crypto:chart:*")
+            # 按命名空间统计仍存在的键，并顺带清理索引中已过期的键
+            namespace_counts = {}
+            for namespace in self._known_namespaces():
+                keys = self._namespace_keys(namespace)
+                live_keys = self.redis.existing_keys(keys)
+                expired = set(keys) - set(live_keys)
+                if expired:
+                    self.redis.redis_client.srem(f"{self.INDEX_PREFIX}ns:{namespace}", *expired)
+                if live_keys:
+                    namespace_counts[namespace] = len(live_keys)
             
             # 获取内存使用情况
             info = self.redis.redis_client.info('memory')
@@ -311,11 +992,14 @@ class CryptoCacheManager:
             
             return {
                 'connected': True,
-                'total_keys': len(all_keys),
-                'price_keys': len(price_keys),
-                'chart_keys': len(chart_keys),
+                'total_keys': sum(namespace_counts.values()),
+                'price_keys': namespace_counts.get('price', 0),
+                'chart_keys': namespace_counts.get('chart', 0),
+                'namespaces': namespace_counts,
                 'memory_usage': memory_usage,
-                'redis_version': self.redis.redis_client.info('server').get('redis_version', 'Unknown')
+                'redis_version': self.redis.redis_client.info('server').get('redis_version', 'Unknown'),
+                'metrics': self.metrics.snapshot(),
+                'functions': get_cached_function_stats()
             }
         except Exception as e:
             logger.error(f"获取缓存统计失败: {e}")
@@ -330,12 +1014,8 @@ class CryptoCacheManager:
             return False
         
         try:
-            keys = self.redis.redis_client.keys("crypto:price:*")
-            keys.extend(self.redis.redis_client.keys("crypto:latest_prices"))
-            if keys:
-                deleted = self.redis.delete(*keys)
-                logger.info(f"清除价格缓存: {deleted} 个键")
-                return True
+            deleted = self._clear_namespaces(['price', 'latest_prices'])
+            logger.info(f"清除价格缓存: {deleted} 个键")
             return True
         except Exception as e:
             logger.error(f"清除价格缓存失败: {e}")
@@ -347,11 +1027,8 @@ class CryptoCacheManager:
             return False
         
         try:
-            keys = self.redis.redis_client.keys("crypto:chart:*")
-            if keys:
-                deleted = self.redis.delete(*keys)
-                logger.info(f"清除图表缓存: {deleted} 个键")
-                return True
+            deleted = self._clear_namespaces(['chart'])
+            logger.info(f"清除图表缓存: {deleted} 个键")
             return True
         except Exception as e:
             logger.error(f"清除图表缓存失败: {e}")
@@ -363,50 +1040,136 @@ class CryptoCacheManager:
             return False
         
         try:
-            keys = self.redis.redis_client.keys("crypto:*")
-            if keys:
-                deleted = self.redis.delete(*keys)
-                logger.info(f"清除所有缓存: {deleted} 个键")
-                return True
+            deleted = self._clear_namespaces(self._known_namespaces())
+            
+            # 删除币种索引和注册表
+            symbol_indexes = [f"{self.INDEX_PREFIX}sym:{symbol}"
+                              for symbol in self.redis.smembers(f"{self.INDEX_PREFIX}symbols")]
+            self._delete_keys(symbol_indexes + [f"{self.INDEX_PREFIX}namespaces", f"{self.INDEX_PREFIX}symbols"])
+            self._registered_namespaces.clear()
+            self._registered_symbols.clear()
+            self.local.clear()
+            
+            logger.info(f"清除所有缓存: {deleted} 个键")
             return True
         except Exception as e:
             logger.error(f"清除所有缓存失败: {e}")
             return False
 
-def cache_result(expire: int = 300):
-    """缓存装饰器"""
+def _stable_default(value: Any):
+    """参数哈希时无法直接JSON化的对象按值表示，其他类型抛出 TypeError（不缓存该次调用）"""
+    if isinstance(value, (datetime, date)):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    if isinstance(value, bytes):
+        return value.hex()
+    if np is not None and isinstance(value, np.ndarray):
+        digest = hashlib.blake2b(np.ascontiguousarray(value).tobytes(), digest_size=16).hexdigest()
+        return {'__ndarray__': [str(value.dtype), list(value.shape), digest]}
+    if np is not None and isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法生成缓存键的参数类型: {type(value).__module__}.{type(value).__qualname__}")
+
+def make_args_key(args: tuple, kwargs: dict) -> str:
+    """生成跨进程稳定的参数哈希，参数无法按值表示时抛出 TypeError"""
+    payload = json.dumps([list(args), kwargs], sort_keys=True, default=_stable_default,
+                         ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+# 被 cache_result 装饰的函数：命名空间 -> 包装函数
+_cached_functions = {}
+
+def cache_result(expire: int = 300, namespace: Optional[str] = None, local_ttl: int = 0,
+                 stale_ttl: Optional[int] = None, cache_if: Callable[[Any], bool] = lambda r: r is not None):
+    """
+    缓存装饰器
+    - expire: Redis软过期时间，过期后返回旧值并后台刷新，缺失时单飞加载
+    - namespace: 函数缓存命名空间，默认为 模块名.函数名，可通过 wrapper.cache_invalidate() 整体失效
+    - local_ttl: 大于0时启用进程内一级缓存
+    - cache_if: 结果是否写入缓存
+    """
     def decorator(func):
+        func_namespace = namespace or f"{func.__module__}.{func.__qualname__}"
+        key_prefix = f"crypto:func:{func_namespace}:"
+        # 方法的 self/cls 不参与缓存键（命名空间已区分函数），其余参数按值参与
+        parameters = list(inspect.signature(func).parameters)
+        skip_first = bool(parameters) and parameters[0] in ('self', 'cls')
+        
+        def make_key(args, kwargs):
+            return key_prefix + make_args_key(args[1:] if skip_first else args, kwargs)
+        stats = {'hits': 0, 'local_hits': 0, 'misses': 0}
+        stats_lock = threading.Lock()
+        
+        def _count(name):
+            with stats_lock:
+                stats[name] += 1
+        
+        @wraps(func)
         def wrapper(*args, **kwargs):
-            # 生成缓存键
-            cache_key = f"func:{func.__name__}:{hashlib.md5(str(args + tuple(kwargs.items())).encode()).hexdigest()}"
+            cache_manager = get_cache_manager()
+            try:
+                cache_key = make_key(args, kwargs)
+            except TypeError as e:
+                logger.debug(f"{func_namespace} 的参数无法生成缓存键，直接调用: {e}")
+                return func(*args, **kwargs)
             
-            # 尝试从缓存获取
-            cache_manager = SimpleRedisManager()
-            cached_result = cache_manager.get(cache_key)
+            # 一级缓存
+            if local_ttl:
+                cached_result = cache_manager.local.get(cache_key, LocalCache._MISSING)
+                if cached_result is not LocalCache._MISSING:
+                    _count('local_hits')
+                    cache_manager.metrics.incr('func', 'local_hits')
+                    return cached_result
             
-            if cached_result is not None:
-                logger.info(f"缓存命中: {func.__name__}")
-                return cached_result
+            loaded = []
             
-            # 执行函数
-            result = func(*args, **kwargs)
+            def loader():
+                loaded.append(True)
+                return func(*args, **kwargs)
             
-            # 缓存结果
-            cache_manager.set(cache_key, result, expire)
-            logger.info(f"缓存结果: {func.__name__}")
+            result = cache_manager.get_or_load(cache_key, loader, expire, stale_ttl, should_cache=cache_if)
+            _count('misses' if loaded else 'hits')
             
+            if local_ttl and cache_if(result):
+                cache_manager.local.set(cache_key, result, local_ttl)
             return result
+        
+        def cache_info() -> Dict:
+            with stats_lock:
+                info = dict(stats)
+            total = info['hits'] + info['local_hits'] + info['misses']
+            info['hit_rate'] = round((info['hits'] + info['local_hits']) / total, 4) if total else 0.0
+            return info
+        
+        wrapper.cache_namespace = func_namespace
+        wrapper.cache_expire = expire
+        wrapper.cache_stale_ttl = stale_ttl
+        # 调用参数对应的缓存键（参数需与实际调用方式一致，供预热等批量写入使用）
+        wrapper.cache_key = lambda *args, **kwargs: make_key(args, kwargs)
+        wrapper.cache_info = cache_info
+        wrapper.cache_invalidate = lambda: get_cache_manager().invalidate_function(func_namespace)
+        _cached_functions[func_namespace] = wrapper
         return wrapper
     return decorator
 
+def get_cached_function_stats() -> Dict[str, Dict]:
+    """获取所有被缓存装饰的函数的命中统计"""
+    return {name: wrapper.cache_info() for name, wrapper in _cached_functions.items()}
+
 # 全局缓存管理器实例
 _cache_manager = None
+_cache_manager_lock = threading.Lock()
 
 def get_cache_manager() -> CryptoCacheManager:
     """获取全局缓存管理器实例"""
     global _cache_manager
     if _cache_manager is None:
-        _cache_manager = CryptoCacheManager()
+        with _cache_manager_lock:
+            if _cache_manager is None:
+                _cache_manager = CryptoCacheManager()
     return _cache_manager
 
 # 使用示例
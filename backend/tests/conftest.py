@@ -0,0 +1,48 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# 测试直接导入 backend 下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """可手动推进的 time.time()"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def cache_manager(monkeypatch):
+    """使用进程内Redis替身的缓存管理器，每个测试前后清空数据"""
+    monkeypatch.setenv('CACHE_BACKEND', 'memory')
+    monkeypatch.delenv('REDIS_DB', raising=False)
+    from memory_redis import get_memory_redis
+    from simple_redis_manager import CryptoCacheManager
+
+    get_memory_redis(0).flushdb()
+    manager = CryptoCacheManager()
+    yield manager
+    wait_for_refreshes()
+    get_memory_redis(0).flushdb()
+
+
+def wait_for_refreshes(timeout=5):
+    """等待后台刷新线程结束"""
+    for thread in threading.enumerate():
+        if thread.name.startswith('cache-refresh:'):
+            thread.join(timeout)
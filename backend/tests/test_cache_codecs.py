@@ -0,0 +1,61 @@
+"""缓存编码的往返一致性"""
+
+import json
+
+import pytest
+
+from cache_codecs import MAGIC, CacheSerializer, ColumnarCodec
+
+CANDLES = [
+    {'timestamp': 1700000000000 + i * 60000, 'open': 100.0 + i, 'high': 101.5 + i, 'low': 99.25 + i,
+     'close': 100.5 + i, 'volume': 12.0 * i, 'symbol': 'BTC'}
+    for i in range(50)
+]
+
+VALUES = [
+    'plain text',
+    {'price': 123.45, 'change': -1.5, 'symbol': 'ETH', 'nested': {'a': [1, 2, None]}},
+    [1, 2.5, 'x', None, True],
+    CANDLES,
+    {'data': CANDLES, '_fresh_until': 1700000000.5, '_version': 3},
+]
+
+
+@pytest.mark.parametrize('codec', ['json', 'msgpack', 'columnar', 'auto'])
+@pytest.mark.parametrize('compression', ['none', 'zlib'])
+@pytest.mark.parametrize('value', VALUES, ids=['text', 'dict', 'list', 'table', 'envelope'])
+def test_round_trip(codec, compression, value):
+    if codec != 'json':
+        pytest.importorskip('msgpack')
+    serializer = CacheSerializer(codec=codec, compression=compression, compress_threshold=64)
+    raw = serializer.dumps(value)
+    assert raw.startswith(MAGIC)
+    assert serializer.loads(raw) == value
+
+
+def test_compression_threshold():
+    serializer = CacheSerializer(codec='json', compression='zlib', compress_threshold=1024)
+    small, large = serializer.dumps({'a': 1}), serializer.dumps(CANDLES)
+    assert serializer.loads(small) == {'a': 1}
+    assert len(large) < len(json.dumps(CANDLES))
+
+
+def test_columnar_detects_tables():
+    assert ColumnarCodec.can_encode(CANDLES)
+    assert ColumnarCodec.can_encode({'data': CANDLES})
+    assert not ColumnarCodec.can_encode([{'a': 1}, {'b': 2}])
+    assert not ColumnarCodec.can_encode({'price': 1.0})
+
+
+def test_mixed_column_types_survive():
+    pytest.importorskip('msgpack')
+    rows = [{'value': float(i), 'flag': None if i % 2 else 1} for i in range(20)]
+    serializer = CacheSerializer(codec='columnar', compression='none')
+    assert serializer.loads(serializer.dumps(rows)) == rows
+
+
+def test_legacy_json_values():
+    serializer = CacheSerializer(codec='auto', compression='none')
+    assert serializer.loads(json.dumps({'a': [1, 2]}).encode('utf-8')) == {'a': [1, 2]}
+    assert serializer.loads(b'not json') == 'not json'
+    assert serializer.loads(None) is None
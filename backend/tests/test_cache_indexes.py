@@ -0,0 +1,76 @@
+"""索引集合：按币种、命名空间和函数失效，不使用 KEYS"""
+
+import pytest
+
+
+@pytest.fixture
+def populated(cache_manager, monkeypatch):
+    def forbidden(*args, **kwargs):
+        raise AssertionError("不应使用 KEYS")
+
+    monkeypatch.setattr(cache_manager.redis.redis_client, 'keys', forbidden)
+    for symbol in ('BTC', 'ETH'):
+        cache_manager.cache_price(symbol, {'price': 1.0})
+        cache_manager.cache_chart_data(symbol, 'hour', [{'date': '2026-01-01', 'close': 1.0}])
+    cache_manager.cache_latest_prices([{'symbol': 'BTC', 'price': 1.0}])
+    return cache_manager
+
+
+def test_writes_register_indexes(populated):
+    members = set(populated.redis.smembers('crypto:idx:sym:BTC'))
+    assert members == {'crypto:price:BTC', 'crypto:chart:BTC:hour'}
+    assert set(populated.redis.smembers('crypto:idx:ns:chart')) == {'crypto:chart:BTC:hour', 'crypto:chart:ETH:hour'}
+    assert {'price', 'chart', 'latest_prices'} <= set(populated.redis.smembers('crypto:idx:namespaces'))
+
+
+def test_invalidate_symbol(populated):
+    populated.invalidate_symbol('btc')
+    assert populated.get_price('BTC') is None
+    assert populated.get_chart_data('BTC', 'hour') is None
+    assert populated.get_price('ETH') == {'price': 1.0}
+    assert populated.get_chart_data('ETH', 'hour')
+    assert not populated.redis.exists('crypto:idx:sym:BTC')
+
+
+def test_clear_namespaces(populated):
+    assert populated.clear_chart_cache()
+    assert populated.get_chart_data('ETH', 'hour') is None
+    assert populated.get_price('ETH') == {'price': 1.0}
+
+    assert populated.clear_price_cache()
+    assert populated.get_price('ETH') is None
+    assert populated.get_latest_prices() is None
+
+
+def test_clear_all(populated):
+    assert populated.clear_all_cache()
+    assert populated.get_price('BTC') is None
+    assert populated.get_latest_prices() is None
+    assert not populated.redis.exists('crypto:idx:namespaces')
+
+
+def test_invalidate_symbol_falls_back_to_scan(populated):
+    populated.redis.delete('crypto:idx:sym:ETH')
+    populated.invalidate_symbol('ETH')
+    assert populated.get_price('ETH') is None
+    assert populated.get_price('BTC') == {'price': 1.0}
+
+
+def test_invalidate_function(populated, monkeypatch):
+    import simple_redis_manager
+    from simple_redis_manager import cache_result
+
+    monkeypatch.setattr(simple_redis_manager, '_cache_manager', populated)
+    calls = []
+
+    @cache_result(expire=60, namespace='test_indexes')
+    def double(value):
+        calls.append(value)
+        return value * 2
+
+    double(1)
+    double(2)
+    assert populated.invalidate_function('test_indexes') == 2
+    double(1)
+    assert calls == [1, 2, 1]
+    assert populated.get_price('BTC') == {'price': 1.0}
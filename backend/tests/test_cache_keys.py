@@ -0,0 +1,31 @@
+"""cache_result 的参数缓存键"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from simple_redis_manager import make_args_key
+
+
+@pytest.mark.parametrize('first, second', [
+    (Decimal('1'), Decimal('2')),
+    (datetime(2026, 1, 1), datetime(2026, 1, 2)),
+    (np.array([1, 2]), np.array([1, 3])),
+    (np.array([1, 2], dtype=np.int64), np.array([1, 2], dtype=np.int32)),
+    ('2026-01-01T00:00:00', datetime(2026, 1, 1)),
+])
+def test_values_get_distinct_keys(first, second):
+    assert make_args_key((first,), {}) != make_args_key((second,), {})
+
+
+def test_equal_values_share_key():
+    assert make_args_key((np.array([1.5, 2.5]), Decimal('1.0')), {'day': datetime(2026, 1, 1)}) == \
+        make_args_key((np.array([1.5, 2.5]), Decimal('1.0')), {'day': datetime(2026, 1, 1)})
+    assert make_args_key((np.int64(3),), {}) == make_args_key((3,), {})
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        make_args_key((object(),), {})
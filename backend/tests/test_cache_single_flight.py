@@ -0,0 +1,92 @@
+"""单飞加载和软过期后返回旧值"""
+
+import threading
+import time
+
+from conftest import wait_for_refreshes
+
+KEY = 'crypto:chart:BTC:hour'
+
+
+def test_concurrent_misses_load_once(cache_manager):
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return ['row']
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache_manager.get_or_load(KEY, loader, 60)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == [['row']] * 8
+    assert cache_manager._key_locks == {}
+
+
+def test_fresh_entry_served_without_loading(cache_manager, clock):
+    assert cache_manager.get_or_load(KEY, lambda: 'v1', 10) == 'v1'
+    clock.now += 9
+    assert cache_manager.get_or_load(KEY, lambda: 'v2', 10) == 'v1'
+
+
+def test_stale_entry_served_while_refreshing(cache_manager, clock):
+    cache_manager.get_or_load(KEY, lambda: 'v1', 10, stale_ttl=30)
+    clock.now += 11
+
+    refreshed = []
+
+    def loader():
+        refreshed.append(1)
+        return 'v2'
+
+    assert cache_manager.get_or_load(KEY, loader, 10, stale_ttl=30) == 'v1'
+    wait_for_refreshes()
+    assert refreshed == [1]
+    assert cache_manager.get_or_load(KEY, lambda: 'v3', 10, stale_ttl=30) == 'v2'
+
+
+def test_hard_expired_entry_reloads(cache_manager, clock):
+    cache_manager.get_or_load(KEY, lambda: 'v1', 10, stale_ttl=30)
+    clock.now += 41
+    assert cache_manager.get_or_load(KEY, lambda: 'v2', 10, stale_ttl=30) == 'v2'
+
+
+def test_empty_results_are_not_cached(cache_manager):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return []
+
+    assert cache_manager.get_or_load(KEY, loader, 60) == []
+    assert cache_manager.get_or_load(KEY, loader, 60) == []
+    assert len(calls) == 2
+
+
+def test_cache_result_decorator(cache_manager, monkeypatch):
+    import simple_redis_manager
+    from simple_redis_manager import cache_result
+
+    monkeypatch.setattr(simple_redis_manager, '_cache_manager', cache_manager)
+
+    calls = []
+
+    @cache_result(expire=60, namespace='test_single_flight')
+    def square(value):
+        calls.append(value)
+        return value * value
+
+    assert square(3) == 9
+    assert square(3) == 9
+    assert square(4) == 16
+    assert calls == [3, 4]
+    assert square.cache_info()['hits'] == 1
@@ -0,0 +1,77 @@
+"""入库写穿和数据版本号"""
+
+from conftest import wait_for_refreshes
+
+CHART_KEY = 'crypto:chart:BTC:hour'
+
+
+def chart_rows(*hours):
+    return [{'date': f"2026-01-01 {hour:02d}:00:00", 'close': float(hour)} for hour in sorted(hours, reverse=True)]
+
+
+def test_write_through_merges_candles_and_keeps_ttl(cache_manager, clock):
+    cache_manager.cache_chart_data('BTC', 'hour', chart_rows(1, 2, 3))
+    entry = cache_manager.redis.get(CHART_KEY)
+    expire = cache_manager.redis.ttl(CHART_KEY)
+
+    clock.now += 30
+    assert cache_manager.write_through_candles('BTC', 'hour', [{'date': '2026-01-01 03:00:00', 'close': 3.5},
+                                                               {'date': '2026-01-01 04:00:00', 'close': 4.0}])
+    updated = cache_manager.redis.get(CHART_KEY)
+    assert [row['close'] for row in updated['data']] == [4.0, 3.5, 2.0]
+    assert updated['_fresh_until'] == entry['_fresh_until']
+    assert updated['_version'] == cache_manager.get_version('BTC:hour')
+    assert cache_manager.redis.ttl(CHART_KEY) == expire - 30
+    # 写穿的数据是当前版本，读取时不需要回源
+    assert cache_manager.get_chart_data('BTC', 'hour') == updated['data']
+
+
+def test_write_through_without_entry_only_bumps_version(cache_manager):
+    assert cache_manager.get_version('BTC:hour') is None
+    assert cache_manager.write_through_candles('BTC', 'hour', [{'date': '2026-01-01 00:00:00', 'close': 1.0}])
+    assert cache_manager.get_version('BTC:hour') == 1
+    assert cache_manager.redis.get(CHART_KEY) is None
+
+
+def test_resampled_charts_share_source_version(cache_manager):
+    cache_manager.cache_chart_data('BTC', '4h', chart_rows(0, 4))
+    cache_manager.bump_version('BTC:hour')
+    assert cache_manager.get_chart_data('BTC', '4h') == chart_rows(0, 4)
+
+    loads = []
+    result = cache_manager.get_or_load_chart_data('BTC', '4h', lambda: loads.append(1) or chart_rows(0, 4, 8))
+    # 版本变化后先返回旧值并在后台刷新
+    assert result == chart_rows(0, 4)
+    wait_for_refreshes()
+    assert loads == [1]
+    assert cache_manager.get_or_load_chart_data('BTC', '4h', lambda: []) == chart_rows(0, 4, 8)
+
+
+def test_unchanged_version_still_refreshes_after_soft_ttl(cache_manager, clock):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return chart_rows(len(loads))
+
+    cache_manager.get_or_load_chart_data('BTC', 'hour', loader)
+    cache_manager.get_or_load_chart_data('BTC', 'hour', loader)
+    assert loads == [1]
+
+    # 版本不变时仍按软过期时间回源
+    clock.now += cache_manager.chart_expire + 1
+    cache_manager.get_or_load_chart_data('BTC', 'hour', loader)
+    wait_for_refreshes()
+    assert loads == [1, 1]
+
+
+def test_write_through_prices(cache_manager):
+    cache_manager.cache_latest_prices([{'symbol': 'BTC', 'price': 110.0, 'change_24h': 10.0, 'timestamp': 't0'},
+                                       {'symbol': 'ETH', 'price': 10.0, 'change_24h': 0.0, 'timestamp': 't0'}])
+    assert cache_manager.write_through_prices([{'symbol': 'BTC', 'price': 120.0, 'timestamp': 't1'}])
+
+    prices = {item['symbol']: item for item in cache_manager.get_latest_prices()}
+    assert prices['BTC']['price'] == 120.0
+    assert prices['BTC']['timestamp'] == 't1'
+    assert abs(prices['BTC']['change_24h'] - 20.0) < 1e-9
+    assert prices['ETH'] == {'symbol': 'ETH', 'price': 10.0, 'change_24h': 0.0, 'timestamp': 't0'}
@@ -0,0 +1,27 @@
+"""TA-Lib 与 NumPy 指标后端的一致性（data/kline_data 中的K线文件和边界序列）"""
+
+import glob
+import os
+
+import pytest
+
+pytest.importorskip('talib')
+
+import indicators
+from indicator_parity import DEFAULT_DATA_DIR, check_fixture, flat_fixture, load_fixture
+
+FIXTURES = sorted(glob.glob(os.path.join(DEFAULT_DATA_DIR, '*_kline_*.json')))
+
+
+def test_fixtures_present():
+    assert FIXTURES, f"没有找到K线文件: {DEFAULT_DATA_DIR}"
+
+
+@pytest.mark.parametrize('path', FIXTURES, ids=[os.path.basename(path) for path in FIXTURES])
+def test_kline_fixture(path):
+    assert indicators.talib is not None
+    assert check_fixture(load_fixture(path)) == {}
+
+
+def test_flat_series():
+    assert check_fixture(flat_fixture()) == {}
@@ -0,0 +1,62 @@
+"""指标参数解析"""
+
+import pytest
+
+from kline_backend import (DEFAULT_INDICATOR_SPEC, MAX_MA_PERIODS, format_indicator_spec, parse_indicator_spec,
+                           parse_indicator_spec_string)
+
+
+def parse(**args):
+    return parse_indicator_spec_string(parse_indicator_spec(args))
+
+
+def test_defaults():
+    assert parse_indicator_spec({}) == DEFAULT_INDICATOR_SPEC
+    assert parse(indicators='rsi') == {'rsi': (14,)}
+
+
+@pytest.mark.parametrize('name, raw, expected', [
+    ('bollinger', '30', (30, 2)),
+    ('bollinger', '30,2.5', (30, 2.5)),
+    ('kdj', '9', (9, 3, 3)),
+    ('kdj', '9,3', (9, 3, 3)),
+    ('kdj', '14,5', (14, 5, 3)),
+    ('macd', '5,35,5', (5, 35, 5)),
+    ('ma', '99,7,25,7', (7, 25, 99)),
+    ('rsi', '21', (21,)),
+])
+def test_partial_and_full_params(name, raw, expected):
+    assert parse(indicators=name, **{name: raw})[name] == expected
+
+
+def test_spec_round_trip():
+    spec = parse_indicator_spec({'bollinger': '30,2.5', 'ma': '7,25'})
+    assert format_indicator_spec(parse_indicator_spec_string(spec)) == spec
+
+
+@pytest.mark.parametrize('args', [
+    {'indicators': 'ma', 'ma': ','.join(str(period) for period in range(1, MAX_MA_PERIODS + 2))},
+    {'indicators': 'rsi', 'rsi': '14,2'},
+    {'indicators': 'bollinger', 'bollinger': '20,2,1'},
+    {'indicators': 'kdj', 'kdj': '9,3,3,3'},
+    {'indicators': 'macd', 'macd': '12,26'},
+])
+def test_rejects_wrong_param_count(args):
+    with pytest.raises(ValueError):
+        parse_indicator_spec(args)
+
+
+@pytest.mark.parametrize('args', [
+    {'indicators': 'rsi', 'rsi': 'abc'},
+    {'indicators': 'ma', 'ma': '7,x'},
+    {'indicators': 'rsi', 'rsi': '14.5'},
+    {'indicators': 'rsi', 'rsi': '0'},
+    {'indicators': 'rsi', 'rsi': 'nan'},
+    {'indicators': 'bollinger', 'bollinger': '20,0'},
+    {'indicators': 'bollinger', 'bollinger': '20,inf'},
+    {'indicators': 'macd', 'macd': '26,12,9'},
+    {'indicators': 'foo'},
+])
+def test_rejects_invalid_params(args):
+    with pytest.raises(ValueError):
+        parse_indicator_spec(args)
@@ -0,0 +1,91 @@
+"""增量指标与批量计算一致，同一时间戳的K线更新可回退"""
+
+import json
+import math
+
+import numpy as np
+import pytest
+
+from indicator_stream import IndicatorStream
+from kline_processor import compute_indicator_arrays
+
+
+def make_candles(length=300, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, length))
+    spread = np.abs(rng.normal(0, 0.005, length)) * close
+    volume = rng.uniform(1, 100, length)
+    return [[index * 60000, float(c), float(c + s), float(c - s), float(c), float(v)]
+            for index, (c, s, v) in enumerate(zip(close, spread, volume))]
+
+
+def batch_latest(candles):
+    table = np.array(candles, dtype=np.float64)
+    arrays = compute_indicator_arrays(table[:, 2], table[:, 3], table[:, 4], table[:, 5])
+    return [{name: values[index] for name, values in arrays.items()} for index in range(len(candles))]
+
+
+def assert_matches(streamed, expected):
+    assert set(streamed) == set(expected)
+    for name, value in streamed.items():
+        if math.isnan(expected[name]):
+            assert value is None, name
+        else:
+            assert value == pytest.approx(expected[name], rel=1e-8, abs=1e-8), name
+
+
+def test_stream_matches_batch_on_every_bar():
+    candles = make_candles()
+    expected = batch_latest(candles)
+    seen = []
+    stream = IndicatorStream()
+    assert stream.update_many(candles, on_bar=lambda ts, latest: seen.append(latest)) == len(candles)
+    assert len(seen) == len(candles)
+    for streamed, batch in zip(seen, expected):
+        assert_matches(streamed, batch)
+
+
+def test_same_timestamp_updates_roll_back():
+    candles = make_candles(200)
+    rng = np.random.default_rng(11)
+    stream = IndicatorStream()
+    for index, candle in enumerate(candles):
+        # 进行中的K线先以其他价格到达若干次，最后以收盘值到达
+        for _ in range(int(rng.integers(0, 4))):
+            price = float(rng.uniform(90, 110))
+            assert stream.update(candle[0], price, price * 1.02, price * 0.97, price, float(rng.uniform(0, 5)))
+        if index % 37 == 5:
+            # 状态经缓存序列化后仍能回退
+            stream = IndicatorStream.from_state(json.loads(json.dumps(stream.get_state())))
+        assert stream.update(*candle)
+
+    assert stream.count == len(candles)
+    assert_matches(stream.latest, batch_latest(candles)[-1])
+
+
+def test_older_candles_are_ignored():
+    candles = make_candles(40)
+    stream = IndicatorStream()
+    stream.update_many(candles)
+    latest = dict(stream.latest)
+    assert not stream.update(*candles[10])
+    assert stream.latest == latest and stream.count == 40
+
+
+def test_repeated_last_candle_is_idempotent():
+    candles = make_candles(30)
+    stream = IndicatorStream()
+    stream.update_many(candles)
+    latest = dict(stream.latest)
+    for _ in range(3):
+        assert stream.update(*candles[-1])
+    assert stream.latest == pytest.approx(latest, rel=1e-12)
+    assert stream.count == 30
+
+
+def test_old_state_versions_are_rebuilt():
+    stream = IndicatorStream()
+    stream.update_many(make_candles(10))
+    state = stream.get_state()
+    assert IndicatorStream.from_state(dict(state, version=1)) is None
+    assert IndicatorStream.from_state(state).latest == stream.latest
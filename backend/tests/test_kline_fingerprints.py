@@ -0,0 +1,98 @@
+"""K线处理的指纹跳过：未变化的序列不重新计算"""
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from kline_processor import FINGERPRINT_FILE, KlineProcessor
+from kline_segments import KlineSegmentStore
+
+
+class FakeSeries:
+    """按币种返回最近 limit 根K线，并记录每次批量读取"""
+
+    def __init__(self, count=150):
+        rng = np.random.default_rng(3)
+        self.closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 400)))
+        self.count = count
+        self.calls = []
+
+    def load_kline_batch(self, symbols, timeframe, limit=100):
+        self.calls.append((timeframe, tuple(symbols), limit))
+        start = max(0, self.count - limit)
+        dates = np.array([datetime(2024, 1, 1) + timedelta(hours=i) for i in range(start, self.count)],
+                         dtype='datetime64[s]')
+        closes = self.closes[start:self.count]
+        table = np.column_stack([closes, closes * 1.01, closes * 0.99, closes, np.full(len(closes), 5.0)])
+        return {symbol: (dates, table.copy()) for symbol in symbols}
+
+
+@pytest.fixture
+def series():
+    return FakeSeries()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return KlineSegmentStore(str(tmp_path))
+
+
+def run(store, series, **kwargs):
+    processor = KlineProcessor.__new__(KlineProcessor)
+    processor.segment_store = store
+    processor.fingerprint_path = os.path.join(store.root_dir, FINGERPRINT_FILE)
+    processor.load_kline_batch = series.load_kline_batch
+    series.calls.clear()
+    results = processor.process_batch(['BTC', 'ETH'], ['hour'], 100, 1, json_snapshot=False, **kwargs)
+    return {result['symbol']: result for result in results}
+
+
+def test_first_run_processes_everything(store, series):
+    results = run(store, series)
+    assert not any(result['skipped'] for result in results.values())
+    assert all(result['rows_appended'] == 100 for result in results.values())
+    assert os.path.exists(os.path.join(store.root_dir, FINGERPRINT_FILE))
+
+
+def test_unchanged_series_are_skipped(store, series):
+    run(store, series)
+    results = run(store, series)
+    assert all(result['skipped'] for result in results.values())
+    # 只读取了指纹用的最近K线，没有读取完整K线
+    assert all(limit != 100 for _, _, limit in series.calls)
+
+
+def test_changed_series_are_reprocessed(store, series):
+    run(store, series)
+
+    # 最后一根K线被更新
+    series.closes[series.count - 1] *= 1.01
+    results = run(store, series)
+    assert not any(result['skipped'] for result in results.values())
+    assert all(result['rows_appended'] == 1 for result in results.values())
+
+    # 新增一根K线
+    series.count += 1
+    results = run(store, series)
+    assert not any(result['skipped'] for result in results.values())
+    assert all(result['rows_appended'] >= 1 for result in results.values())
+    assert all(result['skipped'] for result in run(store, series).values())
+
+
+def test_force_reprocesses_unchanged_series(store, series):
+    run(store, series)
+    results = run(store, series, force=True)
+    assert not any(result['skipped'] for result in results.values())
+    assert all(result['rows_appended'] == 0 for result in results.values())
+
+
+def test_series_missing_from_manifest_is_reprocessed(store, series):
+    run(store, series)
+    os.remove(store.manifest_path)
+
+    results = run(store, series)
+    assert not any(result['skipped'] for result in results.values())
+    assert set(store.read_manifest()) == {'BTC_hour', 'ETH_hour'}
+    assert all(result['skipped'] for result in run(store, series).values())
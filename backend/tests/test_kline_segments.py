@@ -0,0 +1,81 @@
+"""K线分段存储的编码、追加和合并"""
+
+import numpy as np
+import pytest
+
+from kline_segments import KlineSegmentReader, KlineSegmentStore, decode_segment, encode_segment
+
+
+def make_columns(timestamps, offset=0.0):
+    base = np.asarray(timestamps, dtype=np.float64) / 60000 + offset
+    return {'open': base, 'high': base + 1, 'low': base - 1, 'close': base + 0.5, 'volume': np.ones(len(base))}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return KlineSegmentStore(str(tmp_path), compact_count=100)
+
+
+def test_encode_decode_round_trip():
+    timestamps = np.arange(10, dtype=np.int64) * 60000
+    columns = make_columns(timestamps)
+    columns['close'][3] = np.nan
+    decoded_ts, decoded = decode_segment(encode_segment(timestamps, columns))
+    assert decoded_ts.tolist() == timestamps.tolist()
+    assert list(decoded) == list(columns)
+    for name, values in columns.items():
+        np.testing.assert_array_equal(decoded[name], values)
+
+
+def test_append_skips_stored_and_updates_last(store):
+    timestamps = np.arange(5, dtype=np.int64) * 60000
+    columns = make_columns(timestamps)
+    assert store.append('BTC', 'hour', timestamps, columns) == 5
+    assert store.append('BTC', 'hour', timestamps, columns) == 0
+
+    # 进行中的最后一根K线被更新，并追加新K线
+    more = np.arange(7, dtype=np.int64) * 60000
+    updated = make_columns(more)
+    updated['close'][4] = 99.0
+    assert store.append('BTC', 'hour', more, updated) == 3
+
+    loaded_ts, loaded = store.load('BTC', 'hour')
+    assert loaded_ts.tolist() == more.tolist()
+    np.testing.assert_array_equal(loaded['close'], updated['close'])
+    assert store.load('BTC', 'hour', limit=2)[0].tolist() == more[-2:].tolist()
+
+
+def test_compact_merges_segments(store):
+    for start in range(0, 30, 10):
+        timestamps = np.arange(start, start + 10, dtype=np.int64) * 60000
+        store.append('ETH', 'minute', timestamps, make_columns(timestamps))
+    before_ts, before = store.load('ETH', 'minute')
+    assert len(store.list_segments('ETH', 'minute')) == 3
+
+    assert store.compact('ETH', 'minute') == 3
+    assert len(store.list_segments('ETH', 'minute')) == 1
+    after_ts, after = store.load('ETH', 'minute')
+    assert after_ts.tolist() == before_ts.tolist()
+    for name in before:
+        np.testing.assert_array_equal(after[name], before[name])
+
+
+def test_append_compacts_at_threshold(tmp_path):
+    store = KlineSegmentStore(str(tmp_path), compact_count=3)
+    for start in range(0, 50, 10):
+        timestamps = np.arange(start, start + 10, dtype=np.int64) * 60000
+        store.append('BTC', 'day', timestamps, make_columns(timestamps))
+    assert len(store.list_segments('BTC', 'day')) < 3
+    assert len(store.load('BTC', 'day')[0]) == 50
+
+
+def test_reader_matches_store(store, tmp_path):
+    timestamps = np.arange(20, dtype=np.int64) * 60000
+    store.append('BTC', 'hour', timestamps[:12], make_columns(timestamps[:12]))
+    store.append('BTC', 'hour', timestamps, make_columns(timestamps))
+    reader = KlineSegmentReader(str(tmp_path))
+    read_ts, read = reader.load('BTC', 'hour', limit=15)
+    stored_ts, stored = store.load('BTC', 'hour', limit=15)
+    assert read_ts.tolist() == stored_ts.tolist()
+    for name in stored:
+        np.testing.assert_array_equal(read[name], stored[name])
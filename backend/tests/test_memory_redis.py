@@ -0,0 +1,128 @@
+"""进程内Redis替身：SCAN、过期和发布订阅"""
+
+import pytest
+
+import memory_redis
+from memory_redis import InMemoryRedis, ResponseError
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(memory_redis.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def client():
+    return InMemoryRedis()
+
+
+def test_scan_returns_every_key_once(client):
+    for index in range(57):
+        client.set(f"crypto:price:S{index}", index)
+    client.set('other', 1)
+
+    seen = []
+    cursor = 0
+    while True:
+        cursor, keys = client.scan(cursor, match='crypto:price:*', count=10)
+        seen.extend(keys)
+        if cursor == 0:
+            break
+    assert sorted(seen) == sorted(f"crypto:price:S{index}".encode() for index in range(57))
+    assert set(client.scan_iter(match='other')) == {b'other'}
+
+
+def test_scan_survives_deletes_during_iteration(client):
+    for index in range(30):
+        client.set(f"k{index:02d}", index)
+    seen = set()
+    cursor, keys = client.scan(0, count=7)
+    seen.update(keys)
+    client.delete(*keys)
+    while cursor:
+        cursor, keys = client.scan(cursor, count=7)
+        seen.update(keys)
+    assert seen == {f"k{index:02d}".encode() for index in range(30)}
+
+
+def test_ttl_and_expiry(client, clock):
+    client.setex('a', 10, 'x')
+    client.set('b', 'y')
+    assert client.ttl('a') == 10
+    assert client.ttl('b') == -1
+    assert client.ttl('missing') == -2
+
+    clock.now += 4
+    assert client.ttl('a') == 6
+    assert client.get('a') == b'x'
+
+    clock.now += 7
+    assert client.get('a') is None
+    assert client.ttl('a') == -2
+    assert client.exists('a', 'b') == 1
+    assert client.keys('*') == [b'b']
+
+    assert client.expire('b', 5)
+    client.set('b', 'z', keepttl=True)
+    assert client.ttl('b') == 5
+    client.set('b', 'z')
+    assert client.ttl('b') == -1
+
+
+def test_expired_sets_and_sorted_sets(client, clock):
+    client.sadd('s', 'a', 'b')
+    client.zadd('z', {'m1': 1, 'm2': 2, 'm3': 3})
+    client.expire('s', 1)
+    assert client.zrangebyscore('z', 2, '+inf') == [b'm2', b'm3']
+    assert client.zremrangebyrank('z', 0, -3) == 1
+    assert client.zcard('z') == 2
+
+    clock.now += 2
+    assert client.smembers('s') == set()
+    assert client.sadd('s', 'c') == 1
+
+
+def test_incr_and_type_errors(client):
+    assert client.incr('n') == 1
+    assert client.incr('n', 5) == 6
+    client.set('text', 'abc')
+    with pytest.raises(ResponseError):
+        client.incr('text')
+
+
+def test_pipeline_runs_in_order(client):
+    pipe = client.pipeline(transaction=False)
+    pipe.set('a', 1).incr('a').get('a')
+    assert pipe.execute() == [True, 2, b'2']
+    assert pipe.execute() == []
+
+
+def test_pubsub(client):
+    pubsub = client.pubsub()
+    pubsub.subscribe('prices')
+    assert pubsub.get_message()['type'] == 'subscribe'
+    assert client.publish('prices', 'BTC') == 1
+    assert client.publish('other', 'x') == 0
+
+    message = pubsub.get_message(ignore_subscribe_messages=True)
+    assert message == {'type': 'message', 'pattern': None, 'channel': b'prices', 'data': b'BTC'}
+    assert pubsub.get_message(timeout=0.01) is None
+
+    pubsub.unsubscribe('prices')
+    assert client.publish('prices', 'BTC') == 0
+    assert pubsub.get_message()['type'] == 'unsubscribe'
+
+
+def test_shared_instance_per_db():
+    assert memory_redis.get_memory_redis(7) is memory_redis.get_memory_redis(7)
+    assert memory_redis.get_memory_redis(7) is not memory_redis.get_memory_redis(8)
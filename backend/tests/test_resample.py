@@ -0,0 +1,75 @@
+"""周期解析和K线重采样"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import resample
+from resample import DAY_MS, HOUR_MS, MINUTE_MS
+
+
+@pytest.mark.parametrize('timeframe, expected', [
+    ('minute', 'minute'), ('60m', 'hour'), ('1h', 'hour'), ('24h', 'day'),
+    ('240m', '4h'), ('14d', '2w'), ('90m', '90m'),
+])
+def test_normalize_timeframe(timeframe, expected):
+    assert resample.normalize_timeframe(timeframe) == expected
+
+
+@pytest.mark.parametrize('timeframe', ['7x', '0m', '', 'hours'])
+def test_normalize_timeframe_rejects_unknown(timeframe):
+    with pytest.raises(ValueError):
+        resample.normalize_timeframe(timeframe)
+
+
+def test_base_timeframe():
+    assert resample.base_timeframe('15m') == 'minute'
+    assert resample.base_timeframe('4h') == 'hour'
+    assert resample.base_timeframe('1w') == 'day'
+    assert resample.is_native('hour') and not resample.is_native('4h')
+
+
+def test_resample_ohlcv_aggregates_buckets():
+    timestamps = np.arange(8) * HOUR_MS
+    open_ = np.arange(8, dtype=float)
+    high = open_ + 10
+    low = open_ - 10
+    close = open_ + 0.5
+    volume = np.ones(8)
+    starts, o, h, l, c, v = resample.resample_ohlcv(timestamps, open_, high, low, close, volume, 4 * HOUR_MS)
+    assert starts.tolist() == [0, 4 * HOUR_MS]
+    assert o.tolist() == [0, 4]
+    assert h.tolist() == [13, 17]
+    assert l.tolist() == [-10, -6]
+    assert c.tolist() == [3.5, 7.5]
+    assert v.tolist() == [4, 4]
+
+
+def test_weekly_buckets_start_on_monday():
+    # 1970-01-05 是周一
+    timestamps = np.array([4 * DAY_MS, 10 * DAY_MS, 11 * DAY_MS])
+    values = np.ones(3)
+    starts = resample.resample_ohlcv(timestamps, values, values, values, values, values, 7 * DAY_MS)[0]
+    assert starts.tolist() == [4 * DAY_MS, 11 * DAY_MS]
+
+
+def test_resample_rows_per_symbol_descending():
+    rows = []
+    for symbol, base in (('BTC', 100.0), ('ETH', 10.0)):
+        for minute in range(30):
+            price = base + minute
+            rows.append((symbol, datetime(2026, 1, 1, 0, minute), price, price + 1, price - 1, price, 1.0))
+    result = resample.resample_rows(rows, '15m')
+    assert len(result) == 4
+    assert [row[1] for row in result] == sorted((row[1] for row in result), reverse=True)
+    btc = [row for row in result if row[0] == 'BTC']
+    assert btc[-1] == ('BTC', datetime(2026, 1, 1, 0, 0), 100.0, 115.0, 99.0, 114.0, 15.0)
+    assert len(resample.resample_rows(rows, '15m', limit=1)) == 1
+
+
+def test_table_to_kline():
+    table = np.array([[MINUTE_MS, 1, 2, 0.5, 1.5, 3]], dtype=np.float64)
+    kline = resample.table_to_kline(table)
+    assert kline == [[MINUTE_MS, 1.0, 2.0, 0.5, 1.5, 3.0]]
+    assert type(kline[0][0]) is int